@@ -0,0 +1,90 @@
+"""Benchmark pressure levels interpolation on a N96 grid.
+
+Compares plevinterp with the previous implementation, based on
+xr.apply_ufunc(np.interp, ..., vectorize=True), for plev19.
+
+Usage: python benchmarks/bench_plevinterp.py [ntimes]
+"""
+
+import sys
+import time
+
+import numpy as np
+import xarray as xr
+from access_mopper.calc_atmos import plevinterp
+
+NLEV, NY, NX = 38, 145, 192
+PLEV19 = np.array(
+    [
+        100000,
+        92500,
+        85000,
+        70000,
+        60000,
+        50000,
+        40000,
+        30000,
+        25000,
+        20000,
+        15000,
+        10000,
+        7000,
+        5000,
+        3000,
+        2000,
+        1000,
+        500,
+        100,
+    ],
+    dtype=float,
+)
+
+
+def np_interp(var, pmod, plev):
+    lev = var.dims[1]
+    interp = xr.apply_ufunc(
+        np.interp,
+        -1 * plev,
+        -1 * pmod,
+        var,
+        kwargs={"left": np.nan, "right": np.nan},
+        input_core_dims=[["plev"], [lev], [lev]],
+        output_core_dims=[["plev"]],
+        exclude_dims=set((lev,)),
+        vectorize=True,
+        dask="parallelized",
+        output_dtypes=["float32"],
+    )
+    return interp
+
+
+def model_fields(ntimes):
+    rng = np.random.default_rng(0)
+    dims = ("time", "model_theta_level_number", "lat", "lon")
+    surface = 101325 * np.exp(-np.linspace(0, 10, NLEV))
+    pmod = surface[None, :, None, None] * (
+        1 + 0.01 * rng.standard_normal((ntimes, 1, NY, NX))
+    )
+    var = rng.random((ntimes, NLEV, NY, NX)).astype("float32")
+    pmod = xr.DataArray(pmod, dims=dims).chunk({"time": 1})
+    var = xr.DataArray(var, dims=dims).chunk({"time": 1})
+    return var, pmod
+
+
+def main(ntimes):
+    var, pmod = model_fields(ntimes)
+    start = time.perf_counter()
+    new = plevinterp(var, pmod, PLEV19).compute()
+    vectorised = time.perf_counter() - start
+    start = time.perf_counter()
+    old = np_interp(var, pmod, PLEV19).compute()
+    legacy = time.perf_counter() - start
+    diff = np.nanmax(np.abs(new.values - old.transpose(*new.dims).values))
+    print(f"{ntimes} times, {NLEV} levels, {NY}x{NX} grid to plev19")
+    print(f"  np.interp vectorize: {legacy:.3f} s")
+    print(f"  plevinterp:          {vectorised:.3f} s")
+    print(f"  max difference:      {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
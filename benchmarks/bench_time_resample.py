@@ -0,0 +1,54 @@
+"""Benchmark monthly means from 3-hourly data on a numeric time axis.
+
+Compares resample_numeric with the previous cftime based path (decode
+times, xarray resample and CFTimeIndex shift of labels).
+
+Usage: python benchmarks/bench_time_resample.py [years]
+"""
+
+import sys
+import time
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+from access_mopper.calc_time import resample_numeric
+
+NY, NX = 20, 30
+
+
+def three_hourly(years):
+    ntimes = years * 365 * 8
+    tvals = np.arange(1, ntimes + 1) / 8.0
+    attrs = {"units": "days since 1850-01-01", "calendar": "noleap"}
+    return xr.DataArray(
+        da.random.random((ntimes, NY, NX), chunks=(2920, NY, NX)),
+        dims=("time", "lat", "lon"),
+        coords={"time": ("time", tvals, attrs)},
+    )
+
+
+def legacy_resample(var):
+    var = xr.decode_cf(var.to_dataset(name="var"))["var"]
+    vout = var.resample(time="MS", origin="start_day", closed="right").mean()
+    tcoord = xr.CFTimeIndex(vout["time"].values).shift(15, "D")
+    return vout.assign_coords(time=tcoord)
+
+
+def main(years):
+    var = three_hourly(years)
+    start = time.perf_counter()
+    new = resample_numeric(var, "M", "time")
+    graph = time.perf_counter() - start
+    new.compute()
+    numeric = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy_resample(var).compute()
+    legacy = time.perf_counter() - start
+    print(f"{years} years 3-hourly {NY}x{NX} to monthly means")
+    print(f"  cftime resample:  {legacy:.3f} s")
+    print(f"  resample_numeric: {numeric:.3f} s (graph {graph:.3f} s)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
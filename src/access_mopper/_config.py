@@ -4,6 +4,8 @@ import yaml
 
 CONFIG_DIR = os.path.expanduser("~/.mopper")
 CONFIG_PATH = os.path.join(CONFIG_DIR, "user.yml")
+# Grid derived quantities are cached here so they are computed only once
+CACHE_DIR = os.path.join(CONFIG_DIR, "cache")
 
 
 def prompt_user_config():
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains the registry of regular atmosphere grids. Coordinates
+# and bounds of a grid are computed once per process and served to every
+# variable defined on the same grid.
+
+from functools import lru_cache
+from importlib.resources import files as import_files
+
+import numpy as np
+import yaml
+
+# axes registered from files, by axis type and size
+_AXES = {}
+
+
+@lru_cache(maxsize=None)
+def read_atmos_grids():
+    """Reads grids definitions from mopdata/atmos_grids.yaml
+
+    :meta private:
+    """
+    fname = import_files("mopdata").joinpath("atmos_grids.yaml")
+    with fname.open(mode="r") as yfile:
+        data = yaml.safe_load(yfile)
+    return data
+
+
+@lru_cache(maxsize=None)
+def configuration_grid(configuration):
+    """Returns name of atmosphere grid used by configuration, as defined
+    in ACCESS_configurations.yml, or None if not defined.
+
+    :meta private:
+    """
+    fname = import_files("access_mopper").joinpath("ACCESS_configurations.yml")
+    with fname.open(mode="r") as yfile:
+        data = yaml.safe_load(yfile)
+    return data.get(configuration, {}).get("atmos_grid")
+
+
+def axis_bounds(values, latitude=False):
+    """Returns bounds of an axis as midpoints between values, first and
+    last bounds are extrapolated by half a step.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1D array of axis values
+    latitude : bool
+        If True bounds are limited to [-90, 90] (default False)
+
+    Returns
+    -------
+    bounds : numpy.ndarray
+        Axis bounds with shape (size, 2)
+    """
+    values = np.asarray(values, dtype="float64")
+    if values.size == 1:
+        edges = np.array([values[0], values[0]])
+    else:
+        mid = 0.5 * (values[1:] + values[:-1])
+        edges = np.concatenate(
+            [[values[0] - (mid[0] - values[0])], mid, [2 * values[-1] - mid[-1]]]
+        )
+    if latitude:
+        edges = np.clip(edges, -90, 90)
+    return np.stack([edges[:-1], edges[1:]], axis=-1)
+
+
+def _frozen(values, bounds):
+    values = np.array(values, dtype="float64")
+    bounds = np.array(bounds, dtype="float64")
+    values.flags.writeable = False
+    bounds.flags.writeable = False
+    return values, bounds
+
+
+@lru_cache(maxsize=None)
+def grid_axes(name):
+    """Returns axes of a grid defined in mopdata/atmos_grids.yaml
+
+    Parameters
+    ----------
+    name : str
+        Name of grid (e.g. N96)
+
+    Returns
+    -------
+    axes : dict
+        Dictionary of axis name and (values, bounds) tuple, arrays
+        are read-only as they are shared by all variables
+    """
+    try:
+        spec = read_atmos_grids()[name]
+    except KeyError:
+        raise ValueError(f"E: atmosphere grid {name} not defined")
+    axes = {}
+    for axis, (start, step, size) in spec.items():
+        values = start + step * np.arange(size)
+        bounds = axis_bounds(values, latitude=axis.startswith("lat"))
+        axes[axis] = _frozen(values, bounds)
+    return axes
+
+
+def _match(kind, values, grid=None):
+    """Returns registered axis matching values, or None.
+
+    :meta private:
+    """
+    names = [grid] if grid else list(read_atmos_grids())
+    candidates = []
+    for name in names:
+        candidates += [v for k, v in grid_axes(name).items() if k.startswith(kind[:3])]
+    candidates += _AXES.get((kind, values.size), [])
+    for axis in candidates:
+        if axis[0].shape == values.shape and np.allclose(
+            axis[0], values, rtol=0, atol=1e-4
+        ):
+            return axis
+    return None
+
+
+def get_axis(ds, dim, kind, grid=None):
+    """Returns values and bounds of a latitude or longitude axis.
+
+    Axis is served from the registry if it matches a known grid, or an
+    axis already read. Otherwise bounds are read from the file if
+    available, or computed from the axis values, and the axis is
+    registered for the following variables.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset including the axis coordinate
+    dim : str
+        Name of axis coordinate in dataset
+    kind : str
+        Axis type: latitude or longitude
+    grid : str
+        Name of grid to match, by default all defined grids
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Axis values
+    bounds : numpy.ndarray
+        Axis bounds with shape (size, 2)
+    """
+    values = np.asarray(ds[dim].values, dtype="float64")
+    axis = _match(kind, values, grid)
+    if axis is None:
+        bname = ds[dim].attrs.get("bounds")
+        if bname in ds.variables:
+            bnds = ds[bname]
+            # bounds can be concatenated along time by open_mfdataset
+            bnds = bnds.isel({d: 0 for d in bnds.dims[:-1] if d != dim})
+            bounds = bnds.values.reshape(values.size, 2)
+        else:
+            bounds = axis_bounds(values, latitude=(kind == "latitude"))
+        axis = _frozen(values, bounds)
+        _AXES.setdefault((kind, values.size), []).append(axis)
+    return axis
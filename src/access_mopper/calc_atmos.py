@@ -31,14 +31,16 @@
 
 
 # import logging
+from functools import lru_cache
+from importlib.resources import files as import_files
 
 # import click
-# import dask
-# import numpy as np
-# import xarray as xr
-# from metpy.calc import height_to_geopotential
+import numpy as np
+import xarray as xr
+import yaml
+from dask.base import tokenize
+
 # from mopdb.utils import MopException
-# from mopper.calc_utils import get_plev, rename_coord
 
 # Global Variables
 # ----------------------------------------------------------------------
@@ -51,128 +53,184 @@ cp = 1003.5
 p_0 = 100000.0
 g_0 = 9.8067  # gravity constant
 R_e = 6.378e06
+# constants used by metpy.height_to_geopotential()
+G = 6.67430e-11  # gravitational constant
+M_e = 5.9722e24  # Earth mass
+R_mean = 6371008.7714  # Earth mean radius
+
+
+def height_gpheight(hslv, pmod=None, levnum=None, log=False, settings=None):
+    """Returns geopotential height based on model levels height from
+    sea level.
+
+    Geopotential height is calculated directly as
+    G * M_e / g_0 * (1 / R_mean - 1 / (R_mean + h)), with the same
+    constants used by metpy.height_to_geopotential(), as an
+    element-wise lazy operation.
+    If pmod and levnum are passed returns geopotential height
+    interpolated on pressure levels.
+
+    Parameters
+    ----------
+    hslv : xarray.DataArray
+        Height of model levels from sea level dims([time,] lev, lat, lon),
+        see `level_heights` to derive them from orography
+    pmod : Xarray DataArray
+        Air pressure on model levels dims(time, lev, lat, lon), default None
+    levnum : int
+        Number of the pressure levels to load. NB these need to be
+        defined in the '_coordinates.yaml' file as 'plev#'. Default None
+    log : bool
+        If True interpolate linearly in log(pressure) (default False)
+    settings : CalcSettings
+        Settings to find the pressure levels file, if None (default)
+        from click context
+
+    Returns
+    -------
+    gpheight : xarray.DataArray
+        Geopotential height on model or pressure levels
+
+    """
+    with xr.set_options(keep_attrs=True):
+        gpheight = hslv * (G * M_e / (g_0 * R_mean) / (R_mean + hslv))
+    if pmod is not None:
+        if levnum is None:
+            raise ValueError("Pressure levels need to be defined using levnum")
+        tdim = pmod.dims[0]
+        if gpheight.ndim == pmod.ndim - 1:
+            # heights are fixed in time, broadcast without copying data
+            gpheight = gpheight.expand_dims({tdim: pmod[tdim]})
+        elif gpheight.dims[0] != tdim:
+            # check time axis gpheight is same or interpolate
+            gpheight = gpheight.rename({gpheight.dims[0]: tdim})
+            gpheight = gpheight.reindex_like(pmod[tdim], method="nearest")
+        gpheight = plevinterp(gpheight, pmod, levnum, log=log, settings=settings)
+    return gpheight
+
+
+def plevinterp(var, pmod, levnum, log=False, settings=None):
+    """Interpolating var from model levels to pressure levels
+
+    The interpolation is vectorised over whole (time, lat, lon) blocks:
+    for each column the model levels bracketing each pressure level
+    are found with a comparison count (equivalent to searchsorted for
+    monotonic columns) and values are linearly interpolated between
+    them. Blocks are processed in parallel along the time chunks.
+    Pressure levels outside the column range are set to NaN.
+
+    Parameters
+    ----------
+    var : Xarray DataArray
+        The variable to interpolate dims(time, lev, lat, lon)
+    pmod : Xarray DataArray
+        Air pressure on model levels dims(time, lev, lat, lon)
+    levnum : str or array-like
+        Indicates the pressure levels to load, these need to be defined
+        in the '_coordinates.json' file as 'plev#'. Alternatively the
+        pressure levels values in Pa
+    log : bool
+        If True interpolate linearly in log(pressure) (default False)
+    settings : CalcSettings
+        Settings to find the pressure levels file, if None (default)
+        from click context
+
+    Returns
+    -------
+    interp : Xarray DataArray
+        The variable interpolated on pressure levels
+
+    """
+    if isinstance(levnum, (str, int)):
+        from access_mopper.calc_utils import get_plev
+
+        plev = get_plev(levnum, settings=settings)
+    else:
+        plev = np.asarray(levnum, dtype=float)
+    lev = var.dims[1]
+    # if pmod is pressure on rho_level_0 and variable is on rho_level
+    # change name and remove last level
+    pmodlev = pmod.dims[1]
+    if pmodlev == lev + "_0":
+        pmod = pmod.isel({pmodlev: slice(0, -1)})
+    # we can assume lon_0/lat_0 are same as lon/lat for this purpose
+    # if pressure and variable have different coordinates change name
+    if pmod.dims != var.dims:
+        pmod = pmod.rename(dict(zip(pmod.dims, var.dims)))
+        pmod = pmod.reindex_like(var, method="nearest")
+    var = var.chunk({lev: -1})
+    pmod = pmod.chunk({lev: -1})
+    # make vertical coordinate ascending along levels as pressure decreases
+    if log:
+        coord = -np.log(pmod)
+        target = -np.log(plev)
+    else:
+        coord = -pmod
+        target = -plev
+    interp = xr.apply_ufunc(
+        interp_columns,
+        var,
+        coord,
+        kwargs={"target": target},
+        input_core_dims=[[lev], [lev]],
+        output_core_dims=[["plev"]],
+        exclude_dims=set((lev,)),
+        dask="parallelized",
+        output_dtypes=[var.dtype],
+        dask_gufunc_kwargs={"output_sizes": {"plev": len(plev)}},
+        keep_attrs=True,
+    )
+    interp["plev"] = plev
+    interp["plev"] = interp["plev"].assign_attrs(
+        {"units": "Pa", "axis": "Z", "standard_name": "air_pressure", "positive": ""}
+    )
+    dims = list(var.dims)
+    dims[1] = "plev"
+    interp = interp.transpose(*dims)
+    return interp
+
+
+def interp_columns(values, coord, target):
+    """Linear interpolation of many columns at once.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values to interpolate, levels on last axis (..., lev)
+    coord : numpy.ndarray
+        Vertical coordinate of values, ascending along last axis (..., lev)
+    target : numpy.ndarray
+        Vertical coordinate to interpolate to (new_lev)
+
+    Returns
+    -------
+    out : numpy.ndarray
+        Interpolated values (..., new_lev), NaN outside coord range
+
+    :meta private:
+    """
+    # work with levels first, this is the layout of the original
+    # variable so each level is a contiguous block
+    values = np.moveaxis(values, -1, 0)
+    coord = np.moveaxis(coord, -1, 0)
+    nlev = coord.shape[0]
+    target = np.asarray(target).reshape((-1,) + (1,) * (coord.ndim - 1))
+    # index of first level above each target level, as searchsorted
+    upper = np.zeros(target.shape[:1] + coord.shape[1:], dtype=np.int16)
+    for k in range(nlev):
+        upper += coord[k] < target
+    valid = (target >= coord[:1]) & (target <= coord[-1:])
+    upper = np.clip(upper, 1, nlev - 1)
+    z0 = np.take_along_axis(coord, upper - 1, axis=0)
+    z1 = np.take_along_axis(coord, upper, axis=0)
+    v0 = np.take_along_axis(values, upper - 1, axis=0)
+    v1 = np.take_along_axis(values, upper, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = (target - z0) / (z1 - z0)
+    out = np.where(valid, v0 + weight * (v1 - v0), np.nan).astype(values.dtype)
+    return np.moveaxis(out, 0, -1)
 
 
-# @click.pass_context
-# def height_gpheight(ctx, hslv, pmod=None, levnum=None):
-#    """Returns geopotential height based on model levels height from
-#    sea level, using metpy.height_to_geopotential() function
-#
-#    See: https://unidata.github.io/MetPy/latest/api/generated/metpy.calc.height_to_geopotential.html
-#    If pmod and levnum are passed returns geopotential height interpolated on pressure levels.
-#
-#    Parameters
-#    ----------
-#    ctx : click context
-#        Includes obj dict with 'cmor' settings, exp attributes
-#    hslv : xarray.DataArray
-#        Height of model levels from sea level
-#    pmod : Xarray DataArray
-#        Air pressure on model levels dims(lev, lat, lon), default None
-#    levnum : int
-#        Number of the pressure levels to load. NB these need to be
-#        defined in the '_coordinates.yaml' file as 'plev#'. Default None
-#
-#    Returns
-#    -------
-#    gpheight : xarray.DataArray
-#        Geopotential height on model or pressure levels
-#
-#    """
-#
-#    var_log = logging.getLogger(ctx.obj["var_log"])
-#    geopot = height_to_geopotential(hslv)
-#    gpheight_vals = geopot / g_0
-#    gpheight = xr.zeros_like(hslv)
-#    gpheight[:] = gpheight_vals
-#    if pmod is not None:
-#        if levnum is None:
-#            var_log.error("Pressure levels need to be defined using levnum")
-#            raise MopException("Pressure levels need to be defined using levnum")
-#        else:
-#            # check time axis gpheighe is same or interpolate
-#            gpheight, override = rename_coord(pmod, gpheight, 0)
-#            var_log.debug(f"override: {override}")
-#            if override is True:
-#                gpheight = gpheight.reindex_like(pmod, method="nearest")
-#            gpheight = plevinterp(gpheight, pmod, levnum)
-#
-#    return gpheight
-#
-#
-# @click.pass_context
-# def plevinterp(ctx, var, pmod, levnum):
-#    """Interpolating var from model levels to pressure levels
-#
-#    Based on function from Dale Roberts (currently ANU)
-#
-#    Parameters
-#    ----------
-#    ctx : click context
-#        Includes obj dict with 'cmor' settings, exp attributes
-#    var : Xarray DataArray
-#        The variable to interpolate dims(time, lev, lat, lon)
-#    pmod : Xarray DataArray
-#        Air pressure on model levels dims(lev, lat, lon)
-#    levnum : str
-#        Inidcates the pressure levels to load. NB these need to be
-#        defined in the '_coordinates.yaml' file as 'plev#'
-#
-#    Returns
-#    -------
-#    interp : Xarray DataArray
-#        The variable interpolated on pressure levels
-#
-#    """
-#
-#    var_log = logging.getLogger(ctx.obj["var_log"])
-#    # avoid dask warning
-#    dask.config.set(**{"array.slicing.split_large_chunks": True})
-#    plev = get_plev(levnum)
-#    lev = var.dims[1]
-#    # if pmod is pressure on rho_level_0 and variable is on rho_level
-#    # change name and remove last level
-#    pmodlev = pmod.dims[1]
-#    if pmodlev == lev + "_0":
-#        pmod = pmod.isel({pmodlev: slice(0, -1)})
-#        pmod = pmod.rename({pmodlev: lev})
-#    # we can assume lon_0/lat_0 are same as lon/lat for this purpose
-#    # if pressure and variable have different coordinates change name
-#    pmod, override = rename_coord(var, pmod, 2)
-#    pmod, override = rename_coord(var, pmod, 3, override=override)
-#    var_log.debug(f"override: {override}")
-#    if override is True:
-#        pmod = pmod.reindex_like(var, method="nearest")
-#    var_log.debug(f"pmod and var coordinates: {pmod.dims}, {var.dims}")
-#    var = var.chunk({lev: -1})
-#    pmod = pmod.chunk({lev: -1})
-#    # temporarily making pressure values negative so they are in ascending
-#    # order as required by numpy.interp final result it's same and
-#    # we re-assign original plev to interp anyway
-#    interp = xr.apply_ufunc(
-#        np.interp,
-#        -1 * plev,
-#        -1 * pmod,
-#        var,
-#        kwargs={"left": np.nan, "right": np.nan},
-#        input_core_dims=[["plev"], [lev], [lev]],
-#        output_core_dims=[["plev"]],
-#        exclude_dims=set((lev,)),
-#        vectorize=True,
-#        dask="parallelized",
-#        output_dtypes=["float32"],
-#        keep_attrs=True,
-#    )
-#    interp["plev"] = plev
-#    interp["plev"] = interp["plev"].assign_attrs(
-#        {"units": "Pa", "axis": "Z", "standard_name": "air_pressure", "positive": ""}
-#    )
-#    dims = list(var.dims)
-#    dims[1] = "plev"
-#    interp = interp.transpose(*dims)
-#    return interp
-#
-#
 ## Aerosol Calculations
 ## ----------------------------------------------------------------------
 #
@@ -270,3 +328,263 @@ def level_to_height(var, levs=None):
     if levs is not None:
         var = var.isel({zdim_height: slice(int(levs[0]), int(levs[1]))})
     return var
+
+
+def zonal_mean(var, londim=None):
+    """Returns zonal mean of variable on a regular grid, for the *Z
+    tables.
+
+    Cells along a latitude row of a regular grid have the same area,
+    so the area weighted mean is the mean over longitudes, missing
+    values are skipped. The mean is computed lazily chunk by chunk.
+
+    Parameters
+    ----------
+    var : Xarray DataArray
+        Variable dims(time, [lev,] lat, lon)
+    londim : str
+        Name of longitude dimension, default is the first dimension
+        including 'lon' or the last dimension
+
+    Returns
+    -------
+    vout : Xarray DataArray
+        Zonal mean dims(time, [lev,] lat)
+
+    """
+    if londim is None:
+        londim = next((d for d in var.dims if "lon" in d), var.dims[-1])
+    vout = var.mean(dim=londim, skipna=True, keep_attrs=True)
+    return vout
+
+
+# vertical dimensions of UM model levels variables and their type
+MODEL_LEVEL_DIMS = {
+    "model_theta_level_number": "theta",
+    "theta_level_height": "theta",
+    "model_rho_level_number": "rho",
+    "rho_level_height": "rho",
+}
+# number of levels of UM model levels sets, see mopdata/model_levels.yaml
+MODEL_LEVELS = (38, 85)
+
+
+@lru_cache(maxsize=None)
+def get_level_coeffs(levtype, nlev):
+    """Returns hybrid height coefficients of model levels.
+
+    Coefficients are read from mopdata/model_levels.yaml only once for
+    each type and number of levels.
+
+    Parameters
+    ----------
+    levtype : str
+        Type of levels: theta or rho
+    nlev : int
+        Number of model levels: 38 or 85
+
+    Returns
+    -------
+    a : numpy.ndarray
+        Height of levels above sea level over flat surface (m)
+    b : numpy.ndarray
+        Orography term coefficient
+
+    """
+    fname = import_files("mopdata").joinpath("model_levels.yaml")
+    with fname.open(mode="r") as yfile:
+        data = yaml.safe_load(yfile)["levels"]
+    a = np.array(data[f"a_{levtype}_{nlev}"], dtype=float)
+    b = np.array(data[f"b_{levtype}_{nlev}"], dtype=float)
+    a.flags.writeable = False
+    b.flags.writeable = False
+    return a, b
+
+
+def level_heights(orog, nlev, levtype="theta"):
+    """Returns height of model levels from sea level, as
+    a + b * orography.
+
+    The result is lazy if orography is a dask array.
+
+    Parameters
+    ----------
+    orog : Xarray DataArray
+        Surface altitude dims(lat, lon)
+    nlev : int
+        Number of model levels: 38 or 85
+    levtype : str
+        Type of levels: theta or rho (default theta)
+
+    Returns
+    -------
+    hslv : Xarray DataArray
+        Height of model levels from sea level dims(lev, lat, lon)
+
+    """
+    a, b = get_level_coeffs(levtype, nlev)
+    zdim = f"model_{levtype}_level_number"
+    coords = {zdim: np.arange(1, nlev + 1)}
+    a = xr.DataArray(a, dims=zdim, coords=coords)
+    b = xr.DataArray(b, dims=zdim, coords=coords)
+    hslv = a + b * orog
+    hslv = hslv.assign_attrs({"units": "m", "standard_name": "altitude"})
+    return hslv
+
+
+class HybridHeight:
+    """Hybrid height vertical coordinate of UM model levels, as
+    z = a + b * orog
+
+    Coefficients and their bounds are built once from
+    mopdata/model_levels.yaml, altitudes are computed lazily and cached
+    for each orography, so they can be shared by all 3D variables.
+    Theta levels are bounded by rho levels and vice versa, the first
+    bound is at the surface and the top of the last theta level is
+    extrapolated. Use `get_hybrid_height` to get a cached instance.
+
+    Parameters
+    ----------
+    nlev : int
+        Number of model levels: 38 or 85
+    levtype : str
+        Type of levels: theta or rho (default theta)
+
+    """
+
+    def __init__(self, nlev, levtype="theta"):
+        self.nlev = nlev
+        self.levtype = levtype
+        self.zdim = f"model_{levtype}_level_number"
+        self.a, self.b = get_level_coeffs(levtype, nlev)
+        if levtype == "theta":
+            a_half, b_half = get_level_coeffs("rho", nlev)
+            a_top = 2 * self.a[-1] - a_half[-1]
+            a_int = np.concatenate([[0.0], a_half[1:], [a_top]])
+            b_int = np.concatenate([[1.0], b_half[1:], [0.0]])
+        else:
+            a_half, b_half = get_level_coeffs("theta", nlev)
+            a_int = np.concatenate([[0.0], a_half])
+            b_int = np.concatenate([[1.0], b_half])
+        self.a_bnds = np.stack([a_int[:-1], a_int[1:]], axis=1)
+        self.b_bnds = np.stack([b_int[:-1], b_int[1:]], axis=1)
+        self._altitude = {}
+
+    def formula_terms(self, index=None):
+        """Returns the hybrid_height formula terms as named in
+        CMIP6_formula_terms.json, except orography.
+
+        Parameters
+        ----------
+        index : numpy.ndarray
+            Index of the levels to return, default all levels
+
+        Returns
+        -------
+        terms : dict(numpy.ndarray)
+            lev, lev_bnds, b, b_bnds
+
+        """
+        if index is None:
+            index = slice(None)
+        terms = {
+            "lev": self.a[index],
+            "lev_bnds": self.a_bnds[index],
+            "b": self.b[index],
+            "b_bnds": self.b_bnds[index],
+        }
+        return terms
+
+    def altitude(self, orog):
+        """Returns altitude of model levels for orography, the result
+        is cached using the orography content as key.
+
+        Parameters
+        ----------
+        orog : Xarray DataArray
+            Surface altitude dims(lat, lon)
+
+        Returns
+        -------
+        altitude : Xarray DataArray
+            Height of model levels from sea level dims(lev, lat, lon)
+
+        """
+        key = tokenize(orog)
+        if key not in self._altitude:
+            self._altitude[key] = level_heights(orog, self.nlev, self.levtype)
+        return self._altitude[key]
+
+
+@lru_cache(maxsize=None)
+def get_hybrid_height(nlev, levtype="theta"):
+    """Returns the HybridHeight coordinate for the model levels, only
+    one instance is created for each type and number of levels.
+
+    Parameters
+    ----------
+    nlev : int
+        Number of model levels: 38 or 85
+    levtype : str
+        Type of levels: theta or rho (default theta)
+
+    Returns
+    -------
+    hybrid_height : HybridHeight
+
+    """
+    return HybridHeight(nlev, levtype)
+
+
+def get_model_levels(var):
+    """Returns the hybrid height coordinate of a variable on UM model
+    levels, with the index of the variable levels.
+
+    The number of model levels is the one whose level heights match
+    best the variable level heights, or its level numbers if heights
+    are not defined, so variables with a selection of levels are also
+    matched.
+
+    Parameters
+    ----------
+    var : Xarray DataArray
+        Variable, either on model levels numbers or heights (see
+        `level_to_height`)
+
+    Returns
+    -------
+    levels : tuple(str, HybridHeight, numpy.ndarray) or None
+        Vertical dimension, hybrid height coordinate and levels index,
+        or None if variable is not on model levels
+
+    Raises
+    ------
+    ValueError
+        If the variable levels do not match any model levels
+    """
+    zdim = next((d for d in var.dims if d in MODEL_LEVEL_DIMS), None)
+    if zdim is None:
+        return None
+    levtype = MODEL_LEVEL_DIMS[zdim]
+    heights = var.coords.get(f"{levtype}_level_height")
+    numbers = var.coords.get(f"model_{levtype}_level_number")
+    if heights is None and numbers is None:
+        numbers = xr.DataArray(np.arange(1, var.sizes[zdim] + 1))
+    best = None
+    for nlev in MODEL_LEVELS:
+        coord = get_hybrid_height(nlev, levtype)
+        if numbers is not None:
+            index = np.asarray(numbers.values, dtype=int) - 1
+            if index.min() < 0 or index.max() >= nlev:
+                continue
+        else:
+            index = np.abs(coord.a[:, None] - heights.values).argmin(axis=0)
+        if heights is None:
+            error = 0.0
+        else:
+            error = np.abs(coord.a[index] - heights.values).max()
+        if best is None or error < best[0]:
+            best = (error, coord, index)
+    if best is None or best[0] > 1.0:
+        raise ValueError(f"Levels of {zdim} do not match any model levels")
+    return zdim, best[1], best[2]
@@ -29,20 +29,126 @@
 #
 # and open a new issue on github.
 
+from functools import lru_cache
 from importlib.resources import files as import_files
 
 import numpy as np
+import xarray as xr
 import yaml
 
 
+@lru_cache(maxsize=None)
+def read_land_tiles():
+    """Reads land tiles definitions from mopdata/land_tiles.yaml
+
+    :meta private:
+    """
+    fname = import_files("mopdata").joinpath("land_tiles.yaml")
+    with fname.open(mode="r") as yfile:
+        data = yaml.safe_load(yfile)
+    return data
+
+
+def get_tile_groups(model):
+    """Returns tile groups (land cover types) defined for land model,
+    as a dictionary of cmor variable name and list of tiles.
+
+    Parameters
+    ----------
+    model: str
+        Name of land surface model to retrieve tile groups
+
+    Returns
+    -------
+    groups : dict
+        Tile numbers in each group
+
+    """
+    return dict(read_land_tiles()[f"{model}_groups"])
+
+
+def tile_weights(tiles, groups):
+    """Returns the matrix of weights selecting the tiles in each group.
+
+    Parameters
+    ----------
+    tiles : Xarray DataArray
+        Tiles (pseudo_level) coordinate
+    groups : dict
+        Tile number or list of tile numbers for each group
+
+    Returns
+    -------
+    weights : Xarray DataArray
+        Weights dims(group, tiles), 1 for a tile in group, 0 otherwise
+
+    Raises
+    ------
+    Exception
+        tile number must be an integer or list
+    Exception
+        tile number not in pseudo_level
+
+    """
+    weights = np.zeros((len(groups), tiles.size))
+    for n, tilenum in enumerate(groups.values()):
+        if isinstance(tilenum, int):
+            tilenum = [tilenum]
+        elif not isinstance(tilenum, list):
+            raise Exception("E: tile number must be an integer or list")
+        missing = set(tilenum) - set(tiles.values.tolist())
+        if missing:
+            raise Exception(f"E: tile number {missing} not in {tiles.name}")
+        weights[n] = np.isin(tiles.values, tilenum)
+    weights = xr.DataArray(
+        weights,
+        dims=("group", tiles.name),
+        coords={"group": list(groups.keys()), tiles.name: tiles.values},
+    )
+    return weights
+
+
+def aggregate_tiles(tilefrac, groups, landfrac=None):
+    """Calculates the land fraction of several tile groups at once,
+    as a single tensor product of tiles fractions and tile weights.
+
+    Parameters
+    ----------
+    tilefrac : Xarray DataArray
+        Tile fractions dims(time, pseudo_level, lat, lon)
+    groups : dict
+        Tile number or list of tile numbers for each group
+    landfrac : Xarray DataArray
+        Land fraction variable
+
+    Returns
+    -------
+    vout : Xarray Dataset
+        Land fraction of each group
+
+    Raises
+    ------
+    Exception
+        landfrac not defined
+
+    """
+    if landfrac is None:
+        # landfrac = get_ancil_var("land_frac", "fld_s03i395")
+        raise Exception("E: landfrac not defined")
+    pseudo_level = tilefrac.dims[1]
+    weights = tile_weights(tilefrac[pseudo_level], groups)
+    # missing tiles are skipped as in a sum
+    vout = xr.dot(tilefrac.fillna(0), weights, dim=pseudo_level) * landfrac
+    vout = vout.fillna(0).to_dataset(dim="group")
+    return vout
+
+
 def extract_tilefrac(tilefrac, tilenum, landfrac=None):
     """Calculates the land fraction of a specific type: crops, grass,
     etc.
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     tilefrac : Xarray DataArray
         variable
     tilenum : Int or [Int]
@@ -61,31 +167,85 @@ def extract_tilefrac(tilefrac, tilenum, landfrac=None):
         tile number must be an integer or list
 
     """
-    pseudo_level = tilefrac.dims[1]
-    tilefrac = tilefrac.rename({pseudo_level: "pseudo_level"})
-    vout = tilefrac.sel(pseudo_level=tilenum)
-    if isinstance(tilenum, int):
-        vout = tilefrac.sel(pseudo_level=tilenum)
-    elif isinstance(tilenum, list):
-        vout = tilefrac.sel(pseudo_level=tilenum).sum(dim="pseudo_level")
-    else:
-        raise Exception("E: tile number must be an integer or list")
-    if landfrac is None:
-        # landfrac = get_ancil_var("land_frac", "fld_s03i395")
-        raise Exception("E: landfrac not defined")
-    vout = vout * landfrac
-    return vout.fillna(0)
+    vout = aggregate_tiles(tilefrac, {"tilefrac": tilenum}, landfrac=landfrac)
+    return vout["tilefrac"]
 
 
-def calc_topsoil(soilvar):
+@lru_cache(maxsize=None)
+def soil_layer_weights(depth, top=0.0, bottom=None):
+    """Returns the fraction of each soil layer falling between top and
+    bottom depths, layers are defined by their bottom depth.
+
+    Parameters
+    ----------
+    depth : tuple(float)
+        Bottom depth of soil layers (m)
+    top : float
+        Top of depth range (m), default is surface
+    bottom : float
+        Bottom of depth range (m), default is bottom of soil column
+
+    Returns
+    -------
+    weights : numpy.ndarray
+        Weight of each soil layer
+
+    :meta private:
+    """
+    lower = np.array(depth)
+    upper = np.concatenate([[0.0], lower[:-1]])
+    if bottom is None:
+        bottom = lower[-1]
+    overlap = np.minimum(lower, bottom) - np.maximum(upper, top)
+    weights = np.clip(overlap, 0, None) / (lower - upper)
+    weights.flags.writeable = False
+    return weights
+
+
+def soil_integrals(soilvar, ranges, dim="depth"):
+    """Returns the variable integrated over several soil depth ranges,
+    as a single weighted sum over soil levels.
+
+    The variable should be a quantity per layer, as soil moisture
+    content (kg m-2), so that partial layers are weighted by the
+    fraction of their thickness in the depth range.
+
+    Parameters
+    ----------
+    soilvar : Xarray DataArray
+        Variable over soil levels
+    ranges : dict
+        (top, bottom) depths in m for each output, a None bottom is
+        the bottom of the soil column
+    dim : str
+        Name of soil levels dimension (default depth)
+
+    Returns
+    -------
+    vout : Xarray Dataset
+        Variable integrated over each depth range
+
+    """
+    depth = tuple(soilvar[dim].values.tolist())
+    weights = [soil_layer_weights(depth, *r) for r in ranges.values()]
+    weights = xr.DataArray(
+        np.stack(weights),
+        dims=("range", dim),
+        coords={"range": list(ranges.keys())},
+    )
+    vout = xr.dot(soilvar, weights, dim=dim).to_dataset(dim="range")
+    return vout
+
+
+def calc_topsoil(soilvar, depth=0.1):
     """Returns the variable over the first 10cm of soil.
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     soilvar : Xarray DataArray
         Soil moisture over soil levels
+    depth : float
+        Depth of top soil in m (default 0.1)
 
     Returns
     -------
@@ -93,14 +253,8 @@ def calc_topsoil(soilvar):
         Variable defined on top 10cm of soil
 
     """
-    depth = soilvar.depth
-    # find index of bottom depth level including the first 10cm of soil
-    maxlev = np.nanargmin(depth.where(depth >= 0.1).values)
-    # calculate the fraction of maxlev which falls in first 10cm
-    fraction = (0.1 - depth[maxlev - 1]) / (depth[maxlev] - depth[maxlev - 1])
-    topsoil = soilvar.isel(depth=slice(0, maxlev)).sum(dim="depth")
-    topsoil = topsoil + fraction * soilvar.isel(depth=maxlev)
-    return topsoil
+    topsoil = soil_integrals(soilvar, {"topsoil": (0.0, depth)})
+    return topsoil["topsoil"]
 
 
 def calc_landcover(var, model):
@@ -108,10 +262,8 @@ def calc_landcover(var, model):
 
     Parameters
     ----------
-    ctx : click context obj
-        Dictionary including 'cmor' settings and attributes for experiment
     var : list(xarray.DataArray)
-        List of input variables to sum
+        Tiles fraction and land fraction variables, which are multiplied
     model: str
         Name of land surface model to retrieve land tiles definitions
 
@@ -121,11 +273,7 @@ def calc_landcover(var, model):
         Land cover faction variable
 
     """
-    fname = import_files("mopdata").joinpath("land_tiles.yaml")
-    # data = read_yaml(fname)
-    with fname.open(mode="r") as yfile:
-        data = yaml.safe_load(yfile)
-    vegtype = data[model]
+    vegtype = read_land_tiles()[model]
     pseudo_level = var[0].dims[1]
     vout = (var[0] * var[1]).fillna(0)
     vout = vout.rename({pseudo_level: "vegtype"})
@@ -159,7 +307,7 @@ def average_tile(var, tilefrac, landfrac=1.0):
 
     """
     pseudo_level = var.dims[1]
-    vout = var * tilefrac
-    vout = vout.sum(dim=pseudo_level)
+    # missing tiles are skipped as in a sum
+    vout = xr.dot(var.fillna(0), tilefrac.fillna(0), dim=pseudo_level)
     vout = vout * landfrac
     return vout
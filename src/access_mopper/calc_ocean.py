@@ -32,13 +32,15 @@
 
 import logging
 import os
+from functools import lru_cache
 
-import click
 import numpy as np
 import xarray as xr
 from mopdb.utils import MopException
 
-# from mopper.calc_utils import
+from access_mopper.calc_utils import get_settings
+from access_mopper.fixed_fields import get_fixed_fields
+from access_mopper.ocean_supergrid import Supergrid, ZonalBins
 
 # Global Variables
 # ----------------------------------------------------------------------
@@ -54,8 +56,7 @@ R_e = 6.378e06
 # ----------------------------------------------------------------------
 
 
-@click.pass_context
-def overturn_stream(ctx, varlist, sv=False):
+def overturn_stream(varlist, sv=False, settings=None):
     """Returns ocean overturning mass streamfunction.
 
     Calculation is:
@@ -64,14 +65,14 @@ def overturn_stream(ctx, varlist, sv=False):
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     varlist: list( DataArray )
         List of ocean overturning mass streamfunction variables (ty_trans vars)
         From 1-3 if gm and/or submeso are present
     sv: bool
         If True units are sverdrup and they are converted to kg/s
         (default is False)
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -80,7 +81,7 @@ def overturn_stream(ctx, varlist, sv=False):
 
     :meta private:
     """
-    var_log = logging.getLogger(ctx.obj["var_log"])
+    var_log = logging.getLogger(get_settings(settings).var_log)
     londim = varlist[0].dims[3]
     depdim = varlist[0].dims[1]
     var_log.debug(f"Streamfunct lon, dep dims: {londim}, {depdim}")
@@ -126,53 +127,108 @@ def ocean_floor(var):
     return vout
 
 
-def calc_global_ave_ocean(var, rho_dzt, area_t):
-    """Calculate global ocean mass transport.
+def ocean_land_mask(ds, cell="t"):
+    """Returns True over land, where the ocean depth of the cell is
+    missing or not positive.
+
+    :meta private:
+    """
+    depth = ds[f"h{cell}"] if f"h{cell}" in ds else ds["ht"]
+    return depth.isnull() | (depth <= 0)
+
+
+def get_ocean_weights(fname, cell="t", configuration=""):
+    """Returns the static part of the ocean weights for a grid file.
+
+    The cell area is set to 0 over land so the same array can be used
+    both as weight and as ocean mask, for t-cells this is areacello.
+    Values are kept in the fixed fields store of the model
+    configuration and grid, so they are computed only once per grid
+    however many variables and experiments use them.
 
     Parameters
     ----------
-    var : Xarray dataset
-        ocean variable
-    rho_dzt : Xarray dataset
-        density transport
-    area_t : Xarray dataset
-        area transport
+    fname : str
+        Path to the ocean grid file
+    cell : str
+        Type of cell to use: t or u (default t)
+    configuration : str
+        Model configuration for fixed fields store (default '')
 
     Returns
     -------
-    vnew : Xarray dataset
-        global ocean mass transport
+    area : xarray.DataArray
+        Cell area masked over land (lat, lon)
 
     :meta private:
     """
-    mass = rho_dzt * area_t
-    # PP would be better to get the correct dimension from variable and use them
-    # rather than try and except
 
-    try:
-        vnew = var.weighted(mass).mean(
-            dim=("st_ocean", "yt_ocean", "xt_ocean"), skipna=True
-        )
-    except Exception as e:
-        vnew = var.weighted(mass[:, 0, :, :]).mean(dim=("x", "y"), skipna=True)
+    def compute():
+        with xr.open_dataset(fname) as ds:
+            area = ds[f"area_{cell}"]
+            area = xr.where(ocean_land_mask(ds, cell), 0, area.fillna(0)).load()
+        return area
 
-    return vnew
+    name = "areacello" if cell == "t" else f"areacello_{cell}"
+    return get_fixed_fields(configuration, fname).get(name, compute)
+
+
+def global_ave_ocean(var, area, dz=None, tdim="time"):
+    """Returns area or volume weighted global average of an ocean
+    variable.
+
+    The calculation stays lazy: the static weights are broadcast
+    against each time chunk, so only one chunk at a time is loaded.
+    If `dz` is passed the average is volume (or mass) weighted over
+    the vertical and horizontal dimensions, otherwise only the
+    horizontal dimensions are averaged and any vertical dimension is
+    preserved.
+
+    Parameters
+    ----------
+    var : xarray.DataArray
+        Input variable, horizontal dimensions must be the last two
+    area : xarray.DataArray
+        Cell area (lat, lon), 0 over land, see `get_ocean_weights`
+    dz : xarray.DataArray
+        Cell thickness or mass per unit area (ex. rho_dzt) with same
+        dimensions as var (default None)
+    tdim : str
+        Name of time dimension, which is not averaged (default time)
+
+    Returns
+    -------
+    vnew : xarray.DataArray
+        Weighted global average
 
+    :meta private:
+    """
+    hdims = var.dims[-2:]
+    # attach var coordinates to avoid misalignment of float coordinates
+    weights = xr.DataArray(
+        np.asarray(area), dims=hdims, coords={d: var[d] for d in hdims}
+    )
+    dims = hdims
+    if dz is not None:
+        weights = weights * dz.fillna(0)
+        dims = [d for d in var.dims if d != tdim]
+    vnew = var.weighted(weights).mean(dim=dims, skipna=True)
+    return vnew
 
-@click.pass_context
-def calc_global_ave_ocean(ctx, var, rho_dzt):
-    """Returns global average ocean temperature
 
-    NB needs checking
+def calc_global_ave_ocean(var, rho_dzt=None, settings=None):
+    """Returns global average of ocean variable, mass weighted if
+    rho_dzt is passed and area weighted otherwise.
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     var : xarray.DataArray
         Input variable
     rho_dzt: Xarray DataArray
         sea_water_mass_per_unit_area dimensions: (time, depth, lat, lon)
+        (default None)
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -181,34 +237,97 @@ def calc_global_ave_ocean(ctx, var, rho_dzt):
 
     :meta private:
     """
-    fname = f"{ctx.obj['ancils_path']}/{ctx.obj['grid_ocean']}"
-    ds = xr.open_dataset(fname)
-    area_t = ds["area_t"].reindex_like(rho_dzt, method="nearest")
-    mass = rho_dzt * area_t
-    try:
-        vnew = np.average(var, axis=(1, 2, 3), weights=mass)
-    except Exception as e:
-        vnew = np.average(var, axis=(1, 2), weights=mass[:, 0, :, :])
-
+    settings = get_settings(settings)
+    fname = f"{settings.ancils_path}/{settings.grid_ocean}"
+    area_t = get_ocean_weights(fname, configuration=settings.configuration)
+    vnew = global_ave_ocean(var, area_t, dz=rho_dzt)
     return vnew
 
 
-@click.pass_context
-def calc_overt(ctx, varlist, sv=False):
+@lru_cache(maxsize=None)
+def get_zonal_bins(grid, cell="t", dlat=1.0, configuration="", rows=None, cols=None):
+    """Returns the zonal mean operator for a grid, built only once per
+    grid, cell type, bands width and region.
+
+    Grid is either a grid file, with the area of ocean cells from
+    `get_ocean_weights`, or the ocean Supergrid, whose land cells are
+    skipped as their values are missing. Rows and cols are tuples of
+    indices of the region (default all the grid).
+
+    :meta private:
+    """
+    if isinstance(grid, Supergrid):
+        if cell == "t":
+            lat = grid.yt.values
+            area = grid.cell_area("t").values
+        else:
+            # u cells are the north-east corners of t cells
+            lat = grid.yq.values[1:, 1:]
+            area = grid.cell_area("q").values[1:, 1:]
+    else:
+        area = get_ocean_weights(grid, cell=cell, configuration=configuration).values
+        with xr.open_dataset(grid) as ds:
+            lat = ds["geolat_t" if cell == "t" else "geolat_c"].values
+    if rows is not None:
+        lat, area = lat[rows, :], area[rows, :]
+    if cols is not None:
+        lat, area = lat[:, cols], area[:, cols]
+    return ZonalBins(lat, area, dlat=dlat)
+
+
+def calc_zonal_mean_ocean(
+    var, cell="t", dlat=1.0, settings=None, grid=None, rows=None, cols=None
+):
+    """Returns zonal mean of ocean variable over latitude bands.
+
+    Parameters
+    ----------
+    var : xarray.DataArray
+        Input variable, horizontal dimensions must be the last two
+    cell : str
+        Type of cell of variable: t or u (default t)
+    dlat : float
+        Width of latitude bands in degrees (default 1)
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context,
+        used if grid is None
+    grid : Supergrid
+        Ocean supergrid, if None (default) the ocean grid file from
+        settings
+    rows, cols : tuple(int)
+        Indices of the region of the grid selected in var (default
+        all)
+
+    Returns
+    -------
+    vout : xarray.DataArray
+        Zonal mean dims(..., lat)
+
+    """
+    if grid is None:
+        settings = get_settings(settings)
+        grid = f"{settings.ancils_path}/{settings.grid_ocean}"
+        configuration = settings.configuration
+    else:
+        configuration = ""
+    zonal = get_zonal_bins(grid, cell, dlat, configuration, rows, cols)
+    vout = zonal(var)
+    return vout
+
+
+def calc_overt(varlist, sv=False, settings=None):
     """Returns overturning mass streamfunction variable
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     varlist: list( DataArray )
         List of ocean transport variables (ty_trans vars)
         From 1-3 if gm and/or submeso are present
     sv: bool
         If True units are sverdrup and they are converted to kg/s
         (default is False)
-    varlist: list( DataArray )
-        transport components to use to calculate streamfunction
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -216,10 +335,11 @@ def calc_overt(ctx, varlist, sv=False):
         overturning mass streamfunction (time, basin, depth, gridlat) variable
 
     """
-    var_log = logging.getLogger(ctx.obj["var_log"])
+    settings = get_settings(settings)
+    var_log = logging.getLogger(settings.var_log)
     var1 = varlist[0]
     vlat, vlon = var1.dims[2:]
-    mask = get_basin_mask(vlat, vlon)
+    mask = get_basin_mask(vlat, vlon, settings=settings)
     mlat = mask.dims[0]
     mlon = mask.dims[1]
     if [mlat, mlon] != [vlat, vlon]:
@@ -228,34 +348,34 @@ def calc_overt(ctx, varlist, sv=False):
         mask = mask.sel(**{mlat: var1[vlat], mlon: var1[vlon]}, method="nearest")
     var_log.debug(f"Basin mask: {mask}")
     # first calculate for global ocean
-    glb = overturn_stream(varlist)
+    glb = overturn_stream(varlist, settings=settings)
     # atlantic and arctic basin have mask values 2 and 4 #TODO double check this
     var_masked = [v.where(mask.isin([2, 4]), 0) for v in varlist]
-    atl = overturn_stream(var_masked)
+    atl = overturn_stream(var_masked, settings=settings)
     # Indian and Pacific basin are given by mask values 3 and 5 #TODO double check this
     var_masked = [v.where(mask.isin([3, 5]), 0) for v in varlist]
-    ind = overturn_stream(var_masked)
+    ind = overturn_stream(var_masked, settings=settings)
     # now add basin dimension to resulting array
     glb = glb.expand_dims(dim={"basin": ["global_ocean"]}, axis=1)
     atl = atl.expand_dims(dim={"basin": ["atlantic_arctic_ocean"]}, axis=1)
     ind = ind.expand_dims(dim={"basin": ["indian_pacific_ocean"]}, axis=1)
     overt = xr.concat([atl, ind, glb], dim="basin", coords="minimal")
-    if ctx.obj["variable_id"][:5] == "msfty":
+    if settings.variable_id[:5] == "msfty":
         overt = overt.rename({vlat: "gridlat"})
     overt["basin"].attrs["units"] = ""
     return overt
 
 
-@click.pass_context
-def get_areacello(ctx, area_t=None):
-    """Returns areacello
+def get_areacello(area_t=None, settings=None):
+    """Returns areacello, computed only once for each model
+    configuration and ocean grid, see `get_ocean_weights`.
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     area_t: DataArray
         area of t-cells (default None then is read from ancil file)
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -263,16 +383,16 @@ def get_areacello(ctx, area_t=None):
         areacello variable
 
     """
-    fname = f"{ctx.obj['ancils_path']}/{ctx.obj['grid_ocean']}"
-    ds = xr.open_dataset(fname)
-    if area_t is None:
-        area_t = ds.area_t
-    areacello = xr.where(ds.ht.isnull(), 0, ds.area_t)
+    settings = get_settings(settings)
+    fname = f"{settings.ancils_path}/{settings.grid_ocean}"
+    if area_t is not None:
+        with xr.open_dataset(fname) as ds:
+            return xr.where(ocean_land_mask(ds), 0, area_t)
+    areacello = get_ocean_weights(fname, configuration=settings.configuration)
     return areacello
 
 
-@click.pass_context
-def get_basin_mask(ctx, lat, lon):
+def get_basin_mask(lat, lon, settings=None):
     """Returns first level of basin mask from lsmask ancil file.
 
     Lat, lon are used to work out which mask to use tt, uu, ut, tu
@@ -281,12 +401,12 @@ def get_basin_mask(ctx, lat, lon):
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     lat: str
         latitude coordinate name
     lon: str
         longitude coordinate name
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -295,19 +415,24 @@ def get_basin_mask(ctx, lat, lon):
 
     :meta private:
     """
-    var_log = logging.getLogger(ctx.obj["var_log"])
+    settings = get_settings(settings)
+    var_log = logging.getLogger(settings.var_log)
     coords = ["t", "t"]
     if "xu" in lon:
         coords[0] = "u"
     elif "yu" in lat:
         coords[1] = "u"
-    fname = f"{ctx.obj['ancils_path']}/{ctx.obj['mask_ocean']}"
-    if os.path.isfile(fname):
-        ds = xr.open_dataset(fname)
-    else:
+    fname = f"{settings.ancils_path}/{settings.mask_ocean}"
+    if not os.path.isfile(fname):
         var_log.error(f"Ocean mask file {fname} doesn't exists")
         raise MopException(f"Ocean mask file {fname} doesn't exists")
     # based on coords select mask
     mask = f"mask_{''.join(coords)}cell"
-    basin_mask = ds[mask].isel(st_ocean=0).fillna(0)
+
+    def compute():
+        with xr.open_dataset(fname) as ds:
+            return ds[mask].isel(st_ocean=0).fillna(0).load()
+
+    store = get_fixed_fields(settings.configuration, fname)
+    basin_mask = store.get(f"basin_{mask}", compute)
     return basin_mask
@@ -30,12 +30,18 @@
 # and open a new issue on github.
 
 
+import os
 from importlib.resources import files as import_files
 
-import click
 import numpy as np
 import xarray as xr
+import yaml
 from mopdb.utils import MopException, read_yaml
+from scipy.spatial import cKDTree
+
+from access_mopper.calc_utils import get_settings
+from access_mopper.fixed_fields import get_fixed_fields
+from access_mopper.ocean_supergrid import lonlat_to_xyz
 
 # Global Variables
 # ----------------------------------------------------------------------
@@ -51,12 +57,272 @@ R_e = 6.378e06
 # ----------------------------------------------------------------------
 
 
+class TransportSections:
+    """
+    Signed operator to calculate transports across lines.
+
+    Each line is a list of segments along a single row or column of
+    either the x (tx) or y (ty) transport. Segments are grouped by
+    transport component and level selection, for each group only the
+    grid points on the lines are stored, together with a dense signed
+    weight matrix (line, point). All lines are then calculated for all
+    times with one matrix product per group.
+
+    Parameters
+    ----------
+    sections : dict
+        Segments for each line, as defined in transport_lines.yaml
+    names : list(str)
+        Lines to include, in output order (default all sections)
+
+    :meta private:
+    """
+
+    def __init__(self, sections, names=None):
+        if names is None:
+            names = list(sections.keys())
+        self.names = list(names)
+        groups = {}
+        for n, name in enumerate(self.names):
+            if name not in sections:
+                raise MopException(f"Transport line {name} not defined for grid")
+            for seg in sections[name]:
+                key = (
+                    seg["trans"],
+                    tuple(seg.get("levels", ())),
+                    seg.get("positive", False),
+                )
+                points = groups.setdefault(key, {})
+                jj, ii = np.meshgrid(
+                    np.arange(seg["j"][0], seg["j"][1] + 1),
+                    np.arange(seg["i"][0], seg["i"][1] + 1),
+                    indexing="ij",
+                )
+                for point in zip(jj.ravel(), ii.ravel()):
+                    weights = points.setdefault(point, np.zeros(len(self.names)))
+                    weights[n] += seg.get("sign", 1)
+        self.groups = {}
+        for key, points in groups.items():
+            j, i = np.array(list(points.keys())).T
+            weights = np.stack(list(points.values()), axis=1)
+            self.groups[key] = (j, i, weights)
+
+    def __call__(self, tx_trans, ty_trans):
+        """
+        Calculates transports across all lines.
+
+        Dimensions are (time, [level,] y, x), any dimension between
+        time and the horizontal ones is summed.
+
+        Parameters
+        ----------
+        tx_trans : DataArray
+            x transport
+        ty_trans : DataArray
+            y transport
+
+        Returns
+        -------
+        transports : DataArray
+            transports (time, line)
+
+        :meta private:
+        """
+        fields = {"tx": tx_trans, "ty": ty_trans}
+        tdim = tx_trans.dims[0]
+        transports = xr.DataArray(
+            np.zeros((tx_trans.shape[0], len(self.names))),
+            dims=(tdim, "line"),
+            coords={tdim: tx_trans[tdim]},
+        )
+        for (trans, levels, positive), (j, i, weights) in self.groups.items():
+            var = fields[trans]
+            ydim, xdim = var.dims[-2:]
+            if levels:
+                var = var.isel({var.dims[1]: slice(*levels)})
+            points = var.isel(
+                {
+                    ydim: xr.DataArray(j, dims="point"),
+                    xdim: xr.DataArray(i, dims="point"),
+                }
+            ).fillna(0)
+            if positive:
+                points = points.where(points >= 0, 0)
+            w = xr.DataArray(weights, dims=("line", "point"))
+            sumdims = [d for d in points.dims if d != tdim]
+            transports = transports + xr.dot(points, w, dim=sumdims)
+        transports = transports.assign_coords(line=self.names)
+        return transports
+
+
+def find_line_segments(lon, lat, lon1, lat1, lon2, lat2, tree=None):
+    """Returns the staircase of cell faces closest to a line.
+
+    The line ends are located on the grid of T-cell corners (CICE
+    U-cells centres) with a KD-tree, then the path is walked one
+    corner at a time, choosing the neighbour that gets closer to the
+    end point while staying closest to the great circle between the
+    two ends. A step along i crosses the north face of a T-cell (ty),
+    a step along j its east face (tx). The sign is chosen so transports
+    are positive to the left of the line direction, i.e. northward for
+    a west to east line.
+
+    Parameters
+    ----------
+    lon : numpy.ndarray
+        T-cell corners longitudes in degrees (ny, nx), the NE corner of
+        T-cell (j, i) is at (j, i)
+    lat : numpy.ndarray
+        T-cell corners latitudes in degrees (ny, nx)
+    lon1, lat1, lon2, lat2 : float
+        Start and end of line in degrees
+    tree : scipy.spatial.cKDTree
+        KD-tree over corners unit vectors, to be reused across lines
+        (default None, built from lon, lat)
+
+    Returns
+    -------
+    segments : list(dict)
+        Segments in transport_lines.yaml sections format
+
+    :meta private:
+    """
+    ny, nx = lat.shape
+    xyz = lonlat_to_xyz(lon, lat)
+    if tree is None:
+        tree = cKDTree(xyz.reshape(-1, 3))
+    ends = lonlat_to_xyz(np.array([lon1, lon2]), np.array([lat1, lat2]))
+    _, idx = tree.query(ends)
+    (j, i), end = np.unravel_index(idx[0], (ny, nx)), np.unravel_index(idx[1], (ny, nx))
+    normal = np.cross(ends[0], ends[1])
+    normal = normal / np.linalg.norm(normal)
+    steps = []
+    while (j, i) != end:
+        dist = np.dot(xyz[j, i], xyz[end])
+        best = None
+        for dj, di in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            jnext, inext = j + dj, (i + di) % nx
+            if not 0 <= jnext < ny:
+                continue
+            # moving closer to end point means larger dot product
+            if np.dot(xyz[jnext, inext], xyz[end]) <= dist:
+                continue
+            offline = abs(np.dot(xyz[jnext, inext], normal))
+            if best is None or offline < best[0]:
+                best = (offline, dj, di, jnext, inext)
+        if best is None:
+            raise MopException(
+                f"Cannot find a grid path for line {lon1, lat1, lon2, lat2}"
+            )
+        _, dj, di, jnext, inext = best
+        if di == 1:
+            steps.append(("ty", j, inext, 1))
+        elif di == -1:
+            steps.append(("ty", j, i, -1))
+        elif dj == 1:
+            steps.append(("tx", jnext, i, -1))
+        else:
+            steps.append(("tx", j, i, 1))
+        j, i = jnext, inext
+    # merge consecutive steps along the same row or column
+    segments = []
+    for trans, j, i, sign in steps:
+        pos = {"i": int(i), "j": int(j)}
+        fixed, vary = ("j", "i") if trans == "ty" else ("i", "j")
+        last = segments[-1] if segments else {}
+        if (
+            last.get("trans") == trans
+            and last["sign"] == sign
+            and last[fixed][0] == pos[fixed]
+            and pos[vary] in (last[vary][0] - 1, last[vary][1] + 1)
+        ):
+            last[vary] = [min(last[vary][0], pos[vary]), max(last[vary][1], pos[vary])]
+        else:
+            segments.append(
+                {"trans": trans, "i": [pos["i"]] * 2, "j": [pos["j"]] * 2, "sign": sign}
+            )
+    return segments
+
+
+def load_line_segments(gridpath, lon, lat, lines):
+    """Returns segments for lines defined by their end points,
+    searching the grid only for lines not already cached for the
+    grid file.
+
+    Cached segments are saved as a yaml file in the fixed fields store
+    of the grid, which is keyed by the grid file content, see
+    `access_mopper.fixed_fields`.
+
+    Parameters
+    ----------
+    gridpath : str
+        Path of grid file used as cache key
+    lon : numpy.ndarray
+        T-cell corners longitudes in degrees (ny, nx)
+    lat : numpy.ndarray
+        T-cell corners latitudes in degrees (ny, nx)
+    lines : dict
+        End points for each line, as ice_lines in transport_lines.yaml
+
+    Returns
+    -------
+    sections : dict
+        Segments for each line
+
+    :meta private:
+    """
+    store = get_fixed_fields("", gridpath)
+    fname = os.path.join(store.path, "transport_lines.yaml")
+    sections = {}
+    if os.path.isfile(fname):
+        with open(fname, "r") as yfile:
+            sections = yaml.safe_load(yfile) or {}
+    missing = {k: v for k, v in lines.items() if k not in sections}
+    if missing:
+        tree = cKDTree(lonlat_to_xyz(lon, lat).reshape(-1, 3))
+        for name, ends in missing.items():
+            sections[name] = find_line_segments(
+                lon, lat, ends["lon1"], ends["lat1"], ends["lon2"], ends["lat2"], tree
+            )
+        os.makedirs(store.path, exist_ok=True)
+        tmpname = f"{fname}.{os.getpid()}.tmp"
+        with open(tmpname, "w") as yfile:
+            yaml.safe_dump(sections, yfile, default_flow_style=None)
+        os.replace(tmpname, fname)
+    return sections
+
+
+def offset_streamfunction(psi, trans):
+    """Returns streamfunction offset by a transport time series.
+
+    Parameters
+    ----------
+    psi : DataArray
+        Streamfunction, time must be the first dimension
+    trans : DataArray
+        Transport (time)
+
+    Returns
+    -------
+    psi : DataArray
+        Offset streamfunction, attributes are preserved
+
+    :meta private:
+    """
+    offset = xr.DataArray(trans.data, dims=psi.dims[:1])
+    with xr.set_options(keep_attrs=True):
+        psi = psi + offset
+    return psi
+
+
 class IceTransportCalculations:
     """
     Functions to calculate mass transports.
 
     Parameters
     ----------
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -66,20 +332,89 @@ class IceTransportCalculations:
     :meta private:
     """
 
-    @click.pass_context
-    def __init__(self, ctx):
+    def __init__(self, settings=None):
+        settings = get_settings(settings)
         fname = import_files("mopdata").joinpath("transport_lines.yaml")
         self.yaml_data = read_yaml(fname)["lines"]
 
-        self.gridfile = xr.open_dataset(
-            f"{ctx.obj['ancils_path']}/" + f"{ctx.obj['grid_ice']}"
-        )
+        self.gridpath = f"{settings.ancils_path}/{settings.grid_ice}"
+        self.gridfile = xr.open_dataset(self.gridpath)
         self.lines = self.yaml_data["sea_lines"]
         self.ice_lines = self.yaml_data["ice_lines"]
+        self.sea_line_ends = self.yaml_data["sea_line_ends"]
+        self._sections = {}
 
     def __del__(self):
         self.gridfile.close()
 
+    def get_sections(self, names, shape):
+        """
+         Returns the transport operator for a list of lines on the grid
+         identified by its horizontal shape. Operators are built only
+         once per grid and list of lines.
+         Segments defined in transport_lines.yaml for the grid are used
+         first, lines not defined there, as all lines on grids without
+         sections, are found on the grid from their end points.
+
+
+         Parameters
+         ----------
+         names : list(str)
+             lines to include
+         shape : tuple(int, int)
+             horizontal (ny, nx) shape of the transport variables
+
+         Returns
+         -------
+         sections : TransportSections
+
+        :meta private:
+        """
+        key = (tuple(names), tuple(shape))
+        if key not in self._sections:
+            grids = {tuple(v): k for k, v in self.yaml_data["grids"].items()}
+            grid = grids.get(tuple(shape))
+            sections = dict(self.yaml_data["sections"].get(grid, {}))
+            ends = {
+                k: v
+                for k, v in {**self.sea_line_ends, **self.ice_lines[0]}.items()
+                if k in names and k not in sections
+            }
+            if ends:
+                sections.update(self.find_sections(ends))
+            self._sections[key] = TransportSections(sections, names)
+        return self._sections[key]
+
+    def find_sections(self, lines):
+        """
+         Returns segments for lines defined by their end points on the
+         ice grid, see `load_line_segments`. Levels and positive options
+         of a line are applied to all its segments.
+
+
+         Parameters
+         ----------
+         lines : dict
+             End points and options for each line
+
+         Returns
+         -------
+         sections : dict
+             Segments for each line
+
+        :meta private:
+        """
+        lon = self.gridfile.ulon
+        lat = self.gridfile.ulat
+        if "rad" in lat.attrs.get("units", ""):
+            lon = np.degrees(lon)
+            lat = np.degrees(lat)
+        sections = load_line_segments(self.gridpath, lon.values, lat.values, lines)
+        for name, ends in lines.items():
+            options = {k: v for k, v in ends.items() if k in ("levels", "positive")}
+            sections[name] = [{**seg, **options} for seg in sections[name]]
+        return sections
+
     def get_grid_cell_length(self, xy):
         """
          Select the hun or hue variable from the opened gridfile depending on whether
@@ -108,60 +443,6 @@ class IceTransportCalculations:
 
         return L
 
-    def transAcrossLine(self, var, i_start, i_end, j_start, j_end):
-        """Calculates the mass trasport across a line either
-         i_start=i_end and the line goes from j_start to j_end or
-         j_start=j_end and the line goes from i_start to i_end.
-         var is either the x or y mass transport depending on the line.
-
-
-         Parameters
-         ----------
-         var : DataArray
-             variable extracted from Xarray dataset
-         i_start: int
-             xt_ocean axis position
-         i_end: int
-             xt_ocean axis position
-         j_start: int
-             yu_ocean axis position
-         j_end: int
-             yu_ocean axis position
-
-
-         Returns
-         -------
-         transports : DataArray
-
-        :meta private:
-        """
-        # PP is it possible to generalise this? as I'm sure I have to do the same in main
-        # code to work out correct coordinates
-        if "yt_ocean" in var:
-            y_ocean = "yt_ocean"
-            x_ocean = "xu_ocean"
-        else:
-            y_ocean = "yu_ocean"
-            x_ocean = "xt_ocean"
-
-        # could we try to make this a sel lat lon values?
-        if i_start == i_end or j_start == j_end:
-            try:
-                # sum each axis apart from time (3d)
-                # trans = var.isel(yu_ocean=slice(271, 271+1), xt_ocean=slice(292, 300+1))
-                trans = var[..., j_start : j_end + 1, i_start : i_end + 1].sum(
-                    dim=["st_ocean", f"{y_ocean}", f"{x_ocean}"]
-                )  # 4D
-            except Exception as e:
-                trans = var[..., j_start : j_end + 1, i_start : i_end + 1].sum(
-                    dim=[f"{y_ocean}", f"{x_ocean}"]
-                )  # 3D
-
-            return trans
-        else:
-            raise Exception("""ERROR: Transport across a line needs to
-                be calculated for a single value of i or j""")
-
     def lineTransports(self, tx_trans, ty_trans):
         """
          Calculates the mass transports across the ocn straits.
@@ -177,74 +458,13 @@ class IceTransportCalculations:
 
          Returns
          -------
-         trans : Datarray
+         transports : DataArray
+             transports (time, line)
 
         :meta private:
         """
-        # PP these are all hardcoded need to change this to be dependent on grid!!!
-        # initialise array
-        transports = np.zeros([len(tx_trans.time), len(self.lines)])
-
-        # 0 barents opening
-        transports[:, 0] = self.transAcrossLine(ty_trans, 292, 300, 271, 271)
-        transports[:, 0] += self.transAcrossLine(tx_trans, 300, 300, 260, 271)
-
-        # 1 bering strait
-        transports[:, 1] = self.transAcrossLine(ty_trans, 110, 111, 246, 246)
-
-        # 2 canadian archipelago
-        transports[:, 2] = self.transAcrossLine(ty_trans, 206, 212, 285, 285)
-        transports[:, 2] += self.transAcrossLine(tx_trans, 235, 235, 287, 288)
-
-        # 3 denmark strait
-        transports[:, 3] = self.transAcrossLine(tx_trans, 249, 249, 248, 251)
-        transports[:, 3] += self.transAcrossLine(ty_trans, 250, 255, 247, 247)
-
-        # 4 drake passage
-        transports[:, 4] = self.transAcrossLine(tx_trans, 212, 212, 32, 49)
-
-        # 5 english channel
-        # Is unresolved by the access model
-
-        # 6 pacific equatorial undercurrent
-        # specified down to 350m not the whole depth
-        tx_trans_ma = tx_trans.where(tx_trans[:, 0:25, :] >= 0)
-        transports[:, 6] = self.transAcrossLine(tx_trans_ma, 124, 124, 128, 145)
-
-        # 7 faroe scotland channel
-        transports[:, 7] = self.transAcrossLine(ty_trans, 273, 274, 238, 238)
-        transports[:, 7] += self.transAcrossLine(tx_trans, 274, 274, 232, 238)
-
-        # 8 florida bahamas strait
-        transports[:, 8] = self.transAcrossLine(ty_trans, 200, 205, 192, 192)
-
-        # 9 fram strait
-        transports[:, 9] = self.transAcrossLine(tx_trans, 267, 267, 279, 279)
-        transports[:, 9] += self.transAcrossLine(ty_trans, 268, 284, 278, 278)
-
-        # 10 iceland faroe channel
-        transports[:, 10] = self.transAcrossLine(ty_trans, 266, 268, 243, 243)
-        transports[:, 10] += self.transAcrossLine(tx_trans, 268, 268, 240, 243)
-        transports[:, 10] += self.transAcrossLine(ty_trans, 269, 272, 239, 239)
-        transports[:, 10] += self.transAcrossLine(tx_trans, 272, 272, 239, 239)
-
-        # 11 indonesian throughflow
-        transports[:, 11] = self.transAcrossLine(tx_trans, 31, 31, 117, 127)
-        transports[:, 11] += self.transAcrossLine(ty_trans, 35, 36, 110, 110)
-        transports[:, 11] += self.transAcrossLine(ty_trans, 43, 44, 110, 110)
-        transports[:, 11] += self.transAcrossLine(tx_trans, 46, 46, 111, 112)
-        transports[:, 11] += self.transAcrossLine(ty_trans, 47, 57, 113, 113)
-
-        # 12 mozambique channel
-        transports[:, 12] = self.transAcrossLine(ty_trans, 320, 323, 91, 91)
-
-        # 13 taiwan luzon straits
-        transports[:, 13] = self.transAcrossLine(ty_trans, 38, 39, 190, 190)
-        transports[:, 13] += self.transAcrossLine(tx_trans, 40, 40, 184, 188)
-
-        # 14 windward passage
-        transports[:, 14] = self.transAcrossLine(ty_trans, 205, 206, 185, 185)
-
+        sections = self.get_sections(self.lines, tx_trans.shape[-2:])
+        transports = sections(tx_trans, ty_trans)
         return transports
 
     def iceTransport(self, ice_thickness, vel, xy):
@@ -269,7 +489,7 @@ class IceTransportCalculations:
 
         :meta private:
         """
-        L = self.gridfile(xy)
+        L = self.get_grid_cell_length(xy)
         ice_mass = ice_density * ice_thickness * vel * L
 
         return ice_mass
@@ -295,7 +515,7 @@ class IceTransportCalculations:
 
         :meta private:
         """
-        L = self.gridfile(xy)
+        L = self.get_grid_cell_length(xy)
         snow_mass = snow_density * snow_thickness * vel * L
 
         return snow_mass
@@ -321,7 +541,7 @@ class IceTransportCalculations:
 
         :meta private:
         """
-        L = self.gridfile(xy)
+        L = self.get_grid_cell_length(xy)
         ice_area = ice_fraction * vel * L
 
         return ice_area
@@ -345,24 +565,9 @@ class IceTransportCalculations:
 
         :meta private:
         """
-        transports = np.zeros([len(tx_trans.time), len(self.lines)])
-
-        # PP these are all hardcoded need to change this to be dependent on grid!!!
-        # 0 fram strait
-        transports[:, 0] = self.transAcrossLine(tx_trans, 267, 267, 279, 279)
-        transports[:, 0] += self.transAcrossLine(ty_trans, 268, 284, 278, 278)
-
-        # 1 canadian archipelago
-        transports[:, 1] = self.transAcrossLine(ty_trans, 206, 212, 285, 285)
-        transports[:, 1] += self.transAcrossLine(tx_trans, 235, 235, 287, 288)
-
-        # 2 barents opening
-        transports[:, 2] = self.transAcrossLine(ty_trans, 292, 300, 271, 271)
-        transports[:, 2] += self.transAcrossLine(tx_trans, 300, 300, 260, 271)
-
-        # 3 bering strait
-        transports[:, 3] = self.transAcrossLine(ty_trans, 110, 111, 246, 246)
-
+        names = list(self.ice_lines[0].keys())
+        sections = self.get_sections(names, tx_trans.shape[-2:])
+        transports = sections(tx_trans, ty_trans)
         return transports
 
     def icelineTransports(self, ice_thickness, velx, vely):
@@ -449,7 +654,9 @@ class IceTransportCalculations:
 
     def msftbarot(self, psiu, tx_trans):
         """
-        Calculates the drake trans
+        Offsets the barotropic streamfunction by the drake passage
+        transport at each time. The offset is broadcast along the time
+        axis, so it stays lazy for dask arrays.
 
 
         Parameters
@@ -466,12 +673,9 @@ class IceTransportCalculations:
 
         :meta private:
         """
-        # PP these are all hardcoded need to change this to be dependent on grid!!!
-        drake_trans = self.transAcrossLine(tx_trans, 212, 212, 32, 49)
-        # loop over times
-        for i, trans in enumerate(drake_trans):
-            # offset psiu by the drake passage transport at that time
-            psiu[i, :] = psiu[i, :] + trans
+        sections = self.get_sections(["drake_passage"], tx_trans.shape[-2:])
+        drake_trans = sections(tx_trans, tx_trans).isel(line=0)
+        psiu = offset_streamfunction(psiu, drake_trans)
         return psiu
 
 
@@ -481,6 +685,8 @@ class SeaIceCalculations:
 
     Parameters
     ----------
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -490,14 +696,12 @@ class SeaIceCalculations:
     :meta private:
     """
 
-    @click.pass_context
-    def __init__(self, ctx):
+    def __init__(self, settings=None):
+        settings = get_settings(settings)
         fname = import_files("mopdata").joinpath("transport_lines.yaml")
         self.yaml_data = read_yaml(fname)["lines"]
 
-        self.gridfile = xr.open_dataset(
-            f"{ctx.obj['ancil_path']}/" + f"{ctx.obj['grid_ice']}"
-        )
+        self.gridfile = xr.open_dataset(f"{settings.ancils_path}/{settings.grid_ice}")
         self.lines = self.yaml_data["sea_lines"]
         self.ice_lines = self.yaml_data["ice_lines"]
 
@@ -505,42 +709,148 @@ class SeaIceCalculations:
         self.gridfile.close()
 
 
-def calc_hemi_seaice(invar, carea, hemi, extent=False):
-    """Calculate seaice properties (volume, area and extent) over
-    hemisphere.
+def hemi_weights(carea, lat):
+    """Returns grid cell area masked for each hemisphere.
+
+    This depends only on the grid, so it can be calculated once and
+    passed to `calc_hemi_seaice` for all variables and times.
+
+    Parameters
+    ----------
+    carea : Xarray DataArray
+        Grid cell area (lat, lon)
+    lat : Xarray DataArray or numpy.ndarray
+        Cells latitude, either 2D (lat, lon) or 1D (lat)
+
+    Returns
+    -------
+    weights : xarray DataArray
+        Cell area over each hemisphere (hemi, lat, lon), loaded in memory
+
+    """
+    lat = np.asarray(lat)
+    if lat.ndim == 1:
+        lat = np.broadcast_to(lat[:, None], carea.shape)
+    north = lat >= 0.0
+    area = np.nan_to_num(np.asarray(carea))
+    weights = xr.DataArray(
+        np.stack([np.where(north, area, 0), np.where(north, 0, area)]),
+        dims=("hemi", *carea.dims),
+        coords={"hemi": ["n", "s"]},
+    )
+    return weights
+
+
+def get_hemi_weights(settings=None):
+    """Returns grid cell area masked for each hemisphere for the ice
+    grid, see `hemi_weights`.
+
+    Weights are built from the tarea and tlat variables of the ice grid
+    file and kept in the fixed fields store of the model configuration
+    and grid, so they are computed only once per grid.
+
+    Parameters
+    ----------
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
+
+    Returns
+    -------
+    weights : xarray DataArray
+        Cell area over each hemisphere (hemi, lat, lon)
+
+    :meta private:
+    """
+    settings = get_settings(settings)
+    fname = f"{settings.ancils_path}/{settings.grid_ice}"
+
+    def compute():
+        with xr.open_dataset(fname) as ds:
+            lat = ds.tlat.values
+            if "rad" in ds.tlat.attrs.get("units", ""):
+                lat = np.degrees(lat)
+            return hemi_weights(ds.tarea.load(), lat)
+
+    store = get_fixed_fields(settings.configuration, fname)
+    return store.get("hemi_weights", compute)
+
+
+def calc_hemi_seaice(
+    aice,
+    hi=None,
+    hs=None,
+    carea=None,
+    lat=None,
+    weights=None,
+    threshold=0.15,
+    settings=None,
+):
+    """Calculate seaice properties (area, extent, volume and snow
+    volume) over both hemispheres in one pass.
+
+    All the quantities are stacked and integrated with a single
+    weighted sum over the horizontal dimensions, so input variables are
+    read only once and the calculation stays lazy.
+    Results are in SI units: m2 for area and extent, m3 for volumes.
 
     Parameters
     ----------
-    invar : Xarray DataArray
-        Variable to process, either fraction (aice) or volume (hi)
+    aice : Xarray DataArray
+        Sea ice fraction (time, lat, lon)
+    hi : Xarray DataArray
+        Sea ice volume per unit grid cell area (default None)
+    hs : Xarray DataArray
+        Snow volume per unit grid cell area (default None)
     carea : Xarray DataArray
-        Grid cell area
-    hemi : str
-            Assigning the hemisphere to calculate, either 'north' or'south'.
-    extent : bool
-        True if calculaitng extent: tarea as extent and var (aice) as filter.
+        Grid cell area, only used if weights is None. If not passed
+        either, weights are taken from the ice grid, see
+        `get_hemi_weights`
+    lat : Xarray DataArray
+        Cells latitude, only used with carea. If not passed
+        either aice TLAT coordinate or latitude dimension is used
+    weights : Xarray DataArray
+        Cell area over each hemisphere, see `hemi_weights` (default None)
+    threshold : float
+        Minimum sea ice fraction for a cell to count in extent
+        (default 0.15)
+    settings : CalcSettings
+        Calculation settings, only used if both weights and carea are
+        None. If None (default) from click context
 
     Returns
     -------
-    vout : xarray DataArray
-        Sum of property over selected hemisphere
+    vout : xarray Dataset
+        Sum of properties over each hemisphere: siarean, siareas,
+        siextentn, siextents, sivoln, sivols, sisnvoln, sisnvols
 
     """
-    vlat = invar.dims[1]
-    # if calculating extent sum carea and aice is used as filter
-    # with volume and area invar is multiplied by carea first
-    if extent:
-        var = tarea.where(invar <= 1.0 and invar >= 0.15, drop=True)
-    else:
-        var = invar * tarea
-    if hemi == "north":
-        var = var.sel(vlat >= 0.0)
-    elif hemi == "south":
-        var = var.sel(vlat < 0.0)
-    else:
-        mop_log.error(f"invalid hemisphere: {hemi}")
-        raise MopException(f"invalid hemisphere: {hemi}")
-    vout = var.sum()
+    hdims = aice.dims[-2:]
+    if weights is None and carea is None:
+        weights = get_hemi_weights(settings)
+    elif weights is None:
+        if lat is None:
+            lat = aice["TLAT"] if "TLAT" in aice.coords else aice[hdims[0]]
+        weights = hemi_weights(carea, lat)
+    weights = xr.DataArray(
+        weights.values, dims=("hemi", *hdims), coords={"hemi": weights["hemi"]}
+    )
+    fields = {
+        "siarea": aice,
+        "siextent": ((aice >= threshold) & (aice <= 1.0)).astype(aice.dtype),
+        "sivol": hi,
+        "sisnvol": hs,
+    }
+    fields = {k: v for k, v in fields.items() if v is not None}
+    stacked = xr.concat(
+        [v.drop_vars(v.coords).fillna(0) for v in fields.values()],
+        dim="quantity",
+    )
+    total = xr.dot(stacked, weights, dim=hdims)
+    vout = xr.Dataset()
+    for n, name in enumerate(fields.keys()):
+        for hemi in ["n", "s"]:
+            vout[f"{name}{hemi}"] = total.isel(quantity=n).sel(hemi=hemi, drop=True)
+    vout = vout.assign_coords({aice.dims[0]: aice[aice.dims[0]]})
     return vout
 
 
@@ -567,6 +877,10 @@ def maskSeaIce(var, aice):
 def sithick(hi, aice):
     """Calculate seaice thickness.
 
+    Cells with seaice fraction below 1e-3 are masked rather than
+    dropped, so the output has the same shape as the input and no
+    values need to be computed to build it.
+
     Parameters
     ----------
     hi : Xarray dataset
@@ -581,21 +895,22 @@ def sithick(hi, aice):
 
     :meta private:
     """
-    aice = aice.where(aice > 1e-3, drop=True)
-    vout = hi / aice
+    vout = hi / aice.where(aice > 1e-3)
     return vout
 
 
 def sisnconc(sisnthick):
-    """Calculate seas ice?
+    """Calculate snow area fraction from snow thickness.
 
     Parameters
     ----------
     sisnthick : Xarray dataset
+        snow thickness
 
     Returns
     -------
     vout : Xarray dataset
+        snow area fraction
 
     :meta private:
     """
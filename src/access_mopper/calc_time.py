@@ -0,0 +1,1124 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains a collection of functions to resample time series
+# defined on numeric time axes (as read with decode_times=False).
+# Times are handled as integer seconds from the start of the calendar,
+# so no cftime objects are created.
+#
+# To propose new calculations and/or update to existing ones see documentation:
+#
+# and open a new issue on github.
+
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import xarray as xr
+
+# Global Variables
+# ----------------------------------------------------------------------
+
+UNIT_SECONDS = {
+    "seconds": 1,
+    "minutes": 60,
+    "hours": 3600,
+    "days": 86400,
+}
+FREQ_SECONDS = {"s": 1, "m": 60, "min": 60, "h": 3600, "D": 86400}
+MONTH_DAYS = {
+    "noleap": np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    "all_leap": np.array([31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    "360_day": np.full(12, 30),
+}
+CALENDARS = {
+    "365_day": "noleap",
+    "366_day": "all_leap",
+    "gregorian": "standard",
+}
+# calendar of time axes without a calendar attribute, as in CF conventions
+DEFAULT_CALENDAR = "standard"
+# days from 0000-01-01 of 1582-10-15, first day of the Gregorian calendar
+# in the standard calendar, earlier dates are Julian
+GREGORIAN_START = 578101
+# ----------------------------------------------------------------------
+
+
+def calendar_name(calendar):
+    """Returns the CF name of a calendar, ignoring case and aliases as
+    gregorian or 365_day.
+
+    :meta private:
+    """
+    calendar = calendar.lower()
+    return CALENDARS.get(calendar, calendar)
+
+
+def _gregorian_days(year, month, day):
+    # days from civil algorithm, shifted so the year starts in March
+    y = year - (month <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (month + 9 - 12 * (month > 2)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe + 60
+
+
+def _julian_days(year, month, day):
+    # same as _gregorian_days with a leap year every 4 years, shifted
+    # so 1582-10-04 is the day before GREGORIAN_START
+    y = year - (month <= 2)
+    doy = (153 * (month + 9 - 12 * (month > 2)) + 2) // 5 + day - 1
+    return y * 365 + y // 4 + doy + 58
+
+
+def days_from_date(year, month, day, calendar):
+    """Returns number of days from 0000-01-01 in calendar.
+
+    Parameters
+    ----------
+    year, month, day : int or numpy.ndarray
+        Date components
+    calendar : str
+        CF calendar, case is ignored. In the standard (gregorian)
+        calendar dates before 1582-10-15 are Julian, as in cftime
+
+    Returns
+    -------
+    days : int or numpy.ndarray
+
+    Raises
+    ------
+    ValueError
+        If the calendar is not supported
+
+    """
+    calendar = calendar_name(calendar)
+    year, month, day = (np.asarray(x, dtype="int64") for x in (year, month, day))
+    if calendar == "proleptic_gregorian":
+        return _gregorian_days(year, month, day)
+    if calendar == "julian":
+        return _julian_days(year, month, day)
+    if calendar == "standard":
+        days = _gregorian_days(year, month, day)
+        julian = days < GREGORIAN_START
+        if np.any(julian):
+            days = np.where(julian, _julian_days(year, month, day), days)[()]
+        return days
+    if calendar not in MONTH_DAYS:
+        raise ValueError(f"Calendar {calendar} not supported")
+    ndays = MONTH_DAYS[calendar]
+    start = np.concatenate([[0], np.cumsum(ndays)])
+    return year * start[-1] + start[month - 1] + day - 1
+
+
+def _gregorian_date(days):
+    z = days - 60
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 - 12 * (mp > 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def _julian_date(days):
+    z = days - 58
+    era = z // 1461
+    doe = z - era * 1461
+    yoe = (doe - doe // 1460) // 365
+    doy = doe - 365 * yoe
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 - 12 * (mp > 9)
+    year = yoe + era * 4 + (month <= 2)
+    return year, month, day
+
+
+def date_from_days(days, calendar):
+    """Returns (year, month, day) from number of days since 0000-01-01,
+    inverse of `days_from_date`.
+
+    Parameters
+    ----------
+    days : int or numpy.ndarray
+        Days from start of calendar
+    calendar : str
+        CF calendar, case is ignored
+
+    Returns
+    -------
+    year, month, day : numpy.ndarray
+
+    Raises
+    ------
+    ValueError
+        If the calendar is not supported
+
+    """
+    calendar = calendar_name(calendar)
+    days = np.asarray(days, dtype="int64")
+    if calendar == "proleptic_gregorian":
+        return _gregorian_date(days)
+    if calendar == "julian":
+        return _julian_date(days)
+    if calendar == "standard":
+        date = _gregorian_date(days)
+        julian = days < GREGORIAN_START
+        if np.any(julian):
+            date = tuple(
+                np.where(julian, j, g)[()] for j, g in zip(_julian_date(days), date)
+            )
+        return date
+    if calendar not in MONTH_DAYS:
+        raise ValueError(f"Calendar {calendar} not supported")
+    ndays = MONTH_DAYS[calendar]
+    start = np.concatenate([[0], np.cumsum(ndays)])
+    year, doy = np.divmod(days, start[-1])
+    month = np.searchsorted(start, doy, side="right")
+    day = doy - start[month - 1] + 1
+    return year, month, day
+
+
+def parse_time_units(units, calendar):
+    """Returns the length of the time unit and its reference time, in
+    seconds from the start of the calendar.
+
+    Parameters
+    ----------
+    units : str
+        CF time units, as 'days since 1850-01-01 00:00:00'
+    calendar : str
+        CF calendar
+
+    Returns
+    -------
+    unit : int
+        Length of time unit in seconds
+    ref : int
+        Reference time in seconds from start of calendar
+
+    Raises
+    ------
+    ValueError
+        If units cannot be parsed
+
+    """
+    match = re.match(
+        r"\s*(\w+)\s+since\s+(-?\d+)-(\d+)-(\d+)"
+        r"(?:[ T](\d+):(\d+)(?::(\d+(?:\.\d*)?))?)?",
+        units,
+    )
+    if match is None or match[1] not in UNIT_SECONDS:
+        raise ValueError(f"Time units {units} not supported")
+    year, month, day = (int(x) for x in match.groups()[1:4])
+    hour, minute, sec = (float(x or 0) for x in match.groups()[4:])
+    ref = days_from_date(year, month, day, calendar) * 86400
+    ref += int(round(hour * 3600 + minute * 60 + sec))
+    return UNIT_SECONDS[match[1]], int(ref)
+
+
+def parse_frequency(rfrq):
+    """Returns number and unit of a resample frequency, as '3h' or
+    '10Y'.
+
+    :meta private:
+    """
+    match = re.fullmatch(r"(\d*)(s|min|m|h|D|ME|M|YE|Y)", rfrq)
+    if match is None:
+        raise ValueError(f"Resample frequency {rfrq} not supported")
+    return int(match[1] or 1), match[2][0] if match[2] in ("ME", "YE") else match[2]
+
+
+def time_seconds(time, units, calendar):
+    """Returns time values as integer seconds from start of calendar.
+
+    :meta private:
+    """
+    unit, ref = parse_time_units(units, calendar)
+    return ref + np.rint(np.asarray(time, dtype="float64") * unit).astype("int64")
+
+
+def time_bins(time, units, calendar, rfrq, origin=None):
+    """Assigns each time value to a resample interval.
+
+    Intervals are closed on the right, so values at the end of an
+    interval, as for accumulations, belong to it. Intervals of
+    fixed length start at midnight of the first day, months and years
+    follow the calendar.
+
+    Parameters
+    ----------
+    time : numpy.ndarray
+        Numeric time values
+    units : str
+        CF time units
+    calendar : str
+        CF calendar
+    rfrq : str
+        Resample frequency: s, min, h, D with an optional multiplier
+        (e.g. 30min, 3h, 10D), M or Y with optional multiplier
+    origin : int
+        Start of fixed length intervals in seconds from start of
+        calendar, default is midnight of the first day
+
+    Returns
+    -------
+    key : numpy.ndarray(int64)
+        Interval key for each time value, increasing with time
+    start : numpy.ndarray(int64)
+        Start of each time value interval, in seconds
+    end : numpy.ndarray(int64)
+        End of each time value interval, in seconds
+
+    """
+    return second_bins(time_seconds(time, units, calendar), calendar, rfrq, origin)
+
+
+def second_bins(sec, calendar, rfrq, origin=None):
+    """Same as `time_bins` for times in seconds from start of calendar.
+
+    :meta private:
+    """
+    nfrq, tunit = parse_frequency(rfrq)
+    # subtract 1s so an interval end belongs to the previous interval
+    sec = sec - 1
+    if tunit in FREQ_SECONDS:
+        width = nfrq * FREQ_SECONDS[tunit]
+        if origin is None:
+            origin = (sec[0] + 1) // 86400 * 86400
+        key = (sec - origin) // width
+        start = origin + key * width
+        return key, start, start + width
+    year, month, _ = date_from_days(sec // 86400, calendar)
+    if tunit == "M":
+        key = (year * 12 + month - 1) // nfrq
+        y0, m0 = np.divmod(key * nfrq, 12)
+        y1, m1 = np.divmod((key + 1) * nfrq, 12)
+    else:
+        key = year // nfrq
+        y0, m0 = key * nfrq, 0
+        y1, m1 = (key + 1) * nfrq, 0
+    start = days_from_date(y0, m0 + 1, 1, calendar) * 86400
+    end = days_from_date(y1, m1 + 1, 1, calendar) * 86400
+    return key, start, end
+
+
+def resample_time_axis(time, rfrq):
+    """Returns the resample intervals for a numeric time axis.
+
+    Parameters
+    ----------
+    time : xarray.DataArray
+        Numeric time coordinate with units and calendar attributes
+    rfrq : str
+        Resample frequency, see `time_bins`
+
+    Returns
+    -------
+    bins : xarray.DataArray
+        Interval key of each input time value
+    tcoord : xarray.DataArray
+        Centre of each interval, with the same attributes as time
+    bounds : xarray.DataArray
+        Intervals bounds dims(time, bnds)
+
+    """
+    tdim = time.dims[0]
+    units = time.attrs["units"]
+    calendar = time.attrs.get("calendar", DEFAULT_CALENDAR)
+    key, start, end = time_bins(time.values, units, calendar, rfrq)
+    _, index = np.unique(key, return_index=True)
+    unit, ref = parse_time_units(units, calendar)
+    bounds = np.stack([start[index], end[index]], axis=1)
+    bounds = (bounds - ref) / unit
+    tcoord = xr.DataArray(bounds.mean(axis=1), dims=tdim, attrs=time.attrs)
+    tcoord.attrs["bounds"] = f"{tdim}_bnds"
+    tcoord = tcoord.assign_coords({tdim: tcoord})
+    bounds = xr.DataArray(
+        bounds, dims=(tdim, "bnds"), coords={tdim: tcoord}, name=f"{tdim}_bnds"
+    )
+    bins = xr.DataArray(key, dims=tdim, name="bins")
+    return bins, tcoord, bounds
+
+
+def reduce_intervals(data, index, stats, axis=0):
+    """Reduces consecutive intervals of an array along axis, missing
+    values are skipped.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Input array
+    index : numpy.ndarray
+        Start index of each interval
+    stats : str
+        mean, min, max or sum
+    axis : int
+        Axis to reduce (default 0)
+
+    Returns
+    -------
+    out : numpy.ndarray
+        One value for each interval along axis
+
+    :meta private:
+    """
+    if stats in ("min", "max"):
+        ufunc = np.fmin if stats == "min" else np.fmax
+        return ufunc.reduceat(data, index, axis=axis)
+    if np.issubdtype(data.dtype, np.floating):
+        valid = ~np.isnan(data)
+        data = np.where(valid, data, 0)
+    else:
+        valid = np.ones(data.shape, dtype=bool)
+    total = np.add.reduceat(data, index, axis=axis)
+    if stats == "sum":
+        return total
+    count = np.add.reduceat(valid, index, axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = total / count
+    if np.issubdtype(data.dtype, np.floating):
+        out = out.astype(data.dtype, copy=False)
+    return out
+
+
+def align_chunks(data, index, axis):
+    """Rechunks a dask array so each chunk along axis contains only
+    whole intervals, chunks are kept close to their original size.
+
+    Returns
+    -------
+    data : dask.array.Array
+        Rechunked array
+    block_index : list(numpy.ndarray)
+        Start index of intervals within each chunk
+
+    :meta private:
+    """
+    size = max(data.chunks[axis][0], 1)
+    edges = [0]
+    while True:
+        n = np.searchsorted(index, edges[-1] + size)
+        if n >= index.size:
+            break
+        edges.append(int(index[n]))
+    edges.append(data.shape[axis])
+    data = data.rechunk({axis: tuple(np.diff(edges))})
+    block_index = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        block = index[(index >= start) & (index < end)]
+        block_index.append(block - start)
+    return data, block_index
+
+
+def resample_numeric(var, rfrq, tdim, stats="mean"):
+    """Resamples variable on numeric time axis.
+
+    Intervals are consecutive along time, so each is reduced in place
+    and dask chunks are aligned to intervals edges, with no shuffling
+    of data between chunks.
+    Output time values are the centre of each interval, use
+    `resample_time_axis` to get the intervals bounds.
+
+    Parameters
+    ----------
+    var : xarray.DataArray
+        Variable to resample, time coordinate needs units and calendar
+        attributes
+    rfrq : str
+        Resample frequency, see `time_bins`
+    tdim : str
+        Name of time dimension
+    stats : str
+        The reducing function: mean, min, max, sum (default mean)
+
+    Returns
+    -------
+    vout : xarray.DataArray
+        The resampled variable
+
+    Raises
+    ------
+    ValueError
+        If stats is not valid or time is not monotonic
+
+    """
+    valid_stats = ["mean", "min", "max", "sum"]
+    if stats not in valid_stats:
+        raise ValueError(f"{stats} not in valid list: {valid_stats}.")
+    bins, tcoord, _ = resample_time_axis(var[tdim], rfrq)
+    key = bins.values
+    if np.any(np.diff(key) < 0):
+        raise ValueError(f"{tdim} axis is not monotonic")
+    index = np.flatnonzero(np.diff(key, prepend=key[0] - 1))
+    axis = var.get_axis_num(tdim)
+    data = var.data
+    if isinstance(data, np.ndarray):
+        data = reduce_intervals(data, index, stats, axis=axis)
+    else:
+        data, block_index = align_chunks(data, index, axis)
+        chunks = list(data.chunks)
+        chunks[axis] = tuple(b.size for b in block_index)
+
+        def reduce_block(block, block_id=None):
+            return reduce_intervals(block, block_index[block_id[axis]], stats, axis)
+
+        dtype = data.dtype
+        if stats == "mean" and not np.issubdtype(dtype, np.floating):
+            dtype = np.dtype("float64")
+        data = data.map_blocks(reduce_block, chunks=tuple(chunks), dtype=dtype)
+    coords = {k: v for k, v in var.coords.items() if tdim not in v.dims}
+    coords[tdim] = tcoord
+    vout = xr.DataArray(
+        data, dims=var.dims, coords=coords, name=var.name, attrs=var.attrs
+    )
+    return vout
+
+
+def interval_stats(data, index, stats, axis=0):
+    """Returns the partial statistics needed by stats for consecutive
+    intervals of data along axis, interval axis is moved first.
+
+    :meta private:
+    """
+    data = np.moveaxis(np.asarray(data), axis, 0)
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype("float64")
+    partial = {}
+    if stats in ("mean", "sum"):
+        valid = ~np.isnan(data)
+        partial["sum"] = np.add.reduceat(np.where(valid, data, 0), index, axis=0)
+        partial["count"] = np.add.reduceat(valid, index, axis=0)
+    else:
+        partial[stats] = reduce_intervals(data, index, stats, axis=0)
+    return partial
+
+
+def combine_stats(acc, partial):
+    """Combines two sets of partial statistics for the same interval.
+
+    :meta private:
+    """
+    if acc is None:
+        return partial
+    combine = {"sum": np.add, "count": np.add, "min": np.fmin, "max": np.fmax}
+    return {k: combine[k](v, partial[k]) for k, v in acc.items()}
+
+
+def finish_stats(acc, stats):
+    """Returns the final statistic from partial statistics.
+
+    :meta private:
+    """
+    if stats != "mean":
+        return acc[stats]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return acc["sum"] / acc["count"]
+
+
+class StreamResample:
+    """Resamples a variable read one file at a time, in time order.
+
+    Only partial statistics (sum and count, or min, or max) of the
+    interval still open at the end of a file are kept, intervals
+    straddling two files are completed with the next file. Completed
+    intervals are returned as soon as they are closed, so memory use
+    does not depend on the length of the time series.
+    Intervals are the same as in `resample_numeric`.
+
+    Parameters
+    ----------
+    rfrq : str
+        Resample frequency, see `time_bins`
+    stats : str
+        The reducing function: mean, min, max, sum (default mean)
+    tdim : str
+        Name of time dimension (default time)
+
+    Raises
+    ------
+    ValueError
+        If stats is not valid
+
+    """
+
+    def __init__(self, rfrq, stats="mean", tdim="time"):
+        valid_stats = ["mean", "min", "max", "sum"]
+        if stats not in valid_stats:
+            raise ValueError(f"{stats} not in valid list: {valid_stats}.")
+        parse_frequency(rfrq)
+        self.rfrq = rfrq
+        self.stats = stats
+        self.tdim = tdim
+        self.template = None
+        self.origin = None
+        self.last = None
+        self._open = None
+
+    def update(self, var):
+        """Adds the next block of the time series.
+
+        Parameters
+        ----------
+        var : xarray.DataArray
+            Variable for the next block of times, loaded in memory if
+            lazy, time coordinate needs units and calendar attributes
+
+        Returns
+        -------
+        vout : xarray.Dataset or None
+            Intervals completed by this block with their time bounds,
+            None if no interval was completed or block is empty
+
+        Raises
+        ------
+        ValueError
+            If time is not increasing across blocks
+
+        """
+        if var.sizes[self.tdim] == 0:
+            return None
+        time = var[self.tdim]
+        if self.template is None:
+            self.template = var.isel({self.tdim: 0}, drop=True)
+            self.attrs = dict(time.attrs)
+            self.calendar = time.attrs.get("calendar", DEFAULT_CALENDAR)
+            self.axis = var.get_axis_num(self.tdim)
+        sec = time_seconds(time.values, time.attrs["units"], self.calendar)
+        if np.any(np.diff(sec) <= 0) or (self.last is not None and sec[0] <= self.last):
+            raise ValueError(f"{self.tdim} is not increasing")
+        if self.origin is None:
+            self.origin = sec[0] // 86400 * 86400
+        self.last = sec[-1]
+        key, start, end = second_bins(sec, self.calendar, self.rfrq, self.origin)
+        index = np.flatnonzero(np.diff(key, prepend=key[0] - 1))
+        partial = interval_stats(var.values, index, self.stats, axis=self.axis)
+        intervals = [
+            (key[i], start[i], end[i], {k: v[n] for k, v in partial.items()})
+            for n, i in enumerate(index)
+        ]
+        done = []
+        if self._open is not None:
+            okey, ostart, oend, oacc = self._open
+            if okey == intervals[0][0]:
+                k, s, e, acc = intervals[0]
+                intervals[0] = (k, s, e, combine_stats(oacc, acc))
+            else:
+                done.append(self._open)
+        # last interval is complete only if the last value is at its end
+        if sec[-1] == intervals[-1][2]:
+            self._open = None
+        else:
+            k, s, e, acc = intervals.pop()
+            self._open = (k, s, e, {n: v.copy() for n, v in acc.items()})
+        done.extend(intervals)
+        return self.output(done)
+
+    def close(self):
+        """Returns the last interval, even if incomplete.
+
+        Returns
+        -------
+        vout : xarray.Dataset or None
+            Last interval with its time bounds
+
+        """
+        done = [] if self._open is None else [self._open]
+        self._open = None
+        return self.output(done)
+
+    def output(self, done):
+        """Builds dataset with completed intervals.
+
+        :meta private:
+        """
+        if not done:
+            return None
+        unit, ref = parse_time_units(self.attrs["units"], self.calendar)
+        bounds = (np.array([[d[1], d[2]] for d in done]) - ref) / unit
+        data = np.stack([finish_stats(d[3], self.stats) for d in done])
+        data = np.moveaxis(data, 0, self.axis)
+        tcoord = xr.DataArray(bounds.mean(axis=1), dims=self.tdim, attrs=self.attrs)
+        tcoord.attrs["bounds"] = f"{self.tdim}_bnds"
+        vout = self.template.expand_dims({self.tdim: tcoord}, axis=self.axis)
+        vout = vout.assign_coords({self.tdim: tcoord})
+        dtype = self.template.dtype
+        if self.stats == "mean":
+            dtype = np.result_type(dtype, np.float32)
+        vout = vout.copy(data=data.astype(dtype, copy=False))
+        vout = vout.to_dataset(name=self.template.name or "var")
+        vout[f"{self.tdim}_bnds"] = ((self.tdim, "bnds"), bounds)
+        return vout
+
+
+def stream_resample(files, varname, rfrq, stats="mean", tdim="time", nsteps=None):
+    """Resamples a variable from a list of files in time order,
+    yielding completed intervals as they are closed, see
+    `StreamResample`.
+
+    Files are read nsteps times at a time, so memory use is one block
+    of nsteps times plus one open interval. By default whole files are
+    read.
+
+    Parameters
+    ----------
+    files : list(str)
+        Input files in time order
+    varname : str
+        Name of variable to resample
+    rfrq : str
+        Resample frequency, see `time_bins`
+    stats : str
+        The reducing function: mean, min, max, sum (default mean)
+    tdim : str
+        Name of time dimension (default time)
+    nsteps : int
+        Number of times read at a time (default None, whole file)
+
+    Yields
+    ------
+    vout : xarray.Dataset
+        Completed intervals with their time bounds
+
+    """
+    resampler = StreamResample(rfrq, stats=stats, tdim=tdim)
+    for fname in files:
+        with xr.open_dataset(fname, decode_times=False) as ds:
+            var = ds[varname]
+            ntimes = var.sizes[tdim]
+            step = nsteps or max(ntimes, 1)
+            for start in range(0, max(ntimes, 1), step):
+                block = var.isel({tdim: slice(start, start + step)}).load()
+                vout = resampler.update(block)
+                if vout is not None:
+                    yield vout
+    vout = resampler.close()
+    if vout is not None:
+        yield vout
+
+
+class Climatology:
+    """Builds climatologies incrementally from a time series read one
+    file at a time, in time order.
+
+    With diurnal=True values are grouped by month and hour of the day,
+    as for the monthly mean diurnal cycle (1hrCM) tables, otherwise by
+    month. With multiyear=False each month of each year is a separate
+    group, and groups are returned as soon as their month is complete,
+    with multiyear=True months are averaged over all years and
+    returned by `close`.
+    Only sums and counts for each group are kept, they can be saved
+    with `save` and a run resumed with `Climatology.load`.
+
+    Parameters
+    ----------
+    diurnal : bool
+        If True group by hour of the day (default True)
+    multiyear : bool
+        If True average each month over all years (default False)
+    nhours : int
+        Number of intervals in a day for diurnal cycle (default 24)
+    tdim : str
+        Name of time dimension (default time)
+
+    """
+
+    def __init__(self, diurnal=True, multiyear=False, nhours=24, tdim="time"):
+        self.diurnal = diurnal
+        self.multiyear = multiyear
+        self.nhours = nhours if diurnal else 1
+        self.tdim = tdim
+        self.template = None
+        self.last = None
+        self.first_year = None
+        self.acc = {}
+        self.bounds = {}
+
+    def group_keys(self, sec):
+        """Returns group key, start and end of each value sub-interval,
+        and month index.
+
+        :meta private:
+        """
+        sec = sec - 1
+        days = sec // 86400
+        year, month, _ = date_from_days(days, self.calendar)
+        mindex = year * 12 + month - 1
+        if self.diurnal:
+            width = 86400 // self.nhours
+            hour = (sec % 86400) // width
+            start = days * 86400 + hour * width
+            end = start + width
+        else:
+            hour = np.zeros_like(year)
+            start = days_from_date(year, month, 1, self.calendar) * 86400
+            y1, m1 = np.divmod(mindex + 1, 12)
+            end = days_from_date(y1, m1 + 1, 1, self.calendar) * 86400
+        group = mindex % 12 if self.multiyear else mindex
+        return group * self.nhours + hour, start, end, mindex
+
+    def update(self, var):
+        """Adds the next block of the time series.
+
+        Parameters
+        ----------
+        var : xarray.DataArray
+            Variable for one file, time coordinate needs units and
+            calendar attributes
+
+        Returns
+        -------
+        vout : xarray.Dataset or None
+            Groups completed by this block, None if none was completed,
+            block is empty or multiyear is True
+
+        Raises
+        ------
+        ValueError
+            If time is not increasing across blocks
+
+        """
+        if var.sizes[self.tdim] == 0:
+            return None
+        time = var[self.tdim]
+        if self.template is None:
+            self.template = var.isel({self.tdim: 0}, drop=True)
+            self.attrs = dict(time.attrs)
+            self.calendar = time.attrs.get("calendar", DEFAULT_CALENDAR)
+        sec = time_seconds(time.values, time.attrs["units"], self.calendar)
+        last = self.last
+        if np.any(np.diff(sec) <= 0) or (last is not None and sec[0] <= last):
+            raise ValueError(f"{self.tdim} is not increasing")
+        self.last = int(sec[-1])
+        key, start, end, mindex = self.group_keys(sec)
+        if self.first_year is None:
+            self.first_year = int(mindex[0] // 12)
+        order = np.argsort(key, kind="stable")
+        keys, index = np.unique(key[order], return_index=True)
+        data = var.transpose(self.tdim, ...).values[order]
+        partial = interval_stats(data, index, "mean")
+        for n, k in enumerate(keys.tolist()):
+            acc = {s: v[n].copy() for s, v in partial.items()}
+            self.acc[k] = combine_stats(self.acc.get(k), acc)
+            sel = order[index[n] : index[n + 1] if n + 1 < keys.size else None]
+            first, last = start[sel].min(), end[sel].max()
+            if k in self.bounds:
+                first = min(first, self.bounds[k][0])
+                last = max(last, self.bounds[k][1])
+            self.bounds[k] = (int(first), int(last))
+        if self.multiyear:
+            return None
+        # groups of months before the last one are complete
+        done = [k for k in self.acc if k // self.nhours < mindex[-1]]
+        return self.output(done)
+
+    def close(self):
+        """Returns all groups still open.
+
+        Returns
+        -------
+        vout : xarray.Dataset or None
+            Climatology for the remaining groups
+
+        """
+        return self.output(list(self.acc))
+
+    def output(self, done):
+        """Builds dataset for completed groups and removes them from
+        accumulators.
+
+        :meta private:
+        """
+        if not done:
+            return None
+        done = sorted(done)
+        data = np.stack([finish_stats(self.acc.pop(k), "mean") for k in done])
+        bounds = np.array([self.bounds.pop(k) for k in done], dtype="int64")
+        group, hour = np.divmod(np.array(done), self.nhours)
+        if self.multiyear:
+            group = group + self.first_year * 12
+        year, month = np.divmod(group, 12)
+        mstart = days_from_date(year, month + 1, 1, self.calendar) * 86400
+        y1, m1 = np.divmod(group + 1, 12)
+        mend = days_from_date(y1, m1 + 1, 1, self.calendar) * 86400
+        if self.diurnal:
+            width = 86400 // self.nhours
+            middle = (mend - mstart) // 86400 // 2 * 86400
+            tvalues = mstart + middle + hour * width + width // 2
+        else:
+            tvalues = (mstart + mend) / 2
+        unit, ref = parse_time_units(self.attrs["units"], self.calendar)
+        tcoord = xr.DataArray((tvalues - ref) / unit, dims=self.tdim, attrs=self.attrs)
+        tcoord.attrs.pop("bounds", None)
+        tcoord.attrs["climatology"] = "climatology_bnds"
+        vout = self.template.expand_dims({self.tdim: tcoord})
+        vout = vout.assign_coords({self.tdim: tcoord})
+        dtype = np.result_type(self.template.dtype, np.float32)
+        vout = vout.copy(data=data.astype(dtype, copy=False))
+        vout = vout.to_dataset(name=self.template.name or "var")
+        vout["climatology_bnds"] = ((self.tdim, "bnds"), (bounds - ref) / unit)
+        return vout
+
+    def save(self, fname):
+        """Saves accumulators to a netCDF file, to resume the
+        climatology with `Climatology.load`.
+
+        Parameters
+        ----------
+        fname : str
+            Output file path
+
+        """
+        keys = sorted(self.acc)
+        dims = ("group",) + self.template.dims
+        ds = xr.Dataset(
+            {
+                "sum": (dims, np.stack([self.acc[k]["sum"] for k in keys])),
+                "count": (dims, np.stack([self.acc[k]["count"] for k in keys])),
+                "bounds": (("group", "bnds"), [self.bounds[k] for k in keys]),
+                "template": self.template,
+            },
+            coords={"group": keys},
+            attrs={
+                "diurnal": int(self.diurnal),
+                "multiyear": int(self.multiyear),
+                "nhours": self.nhours,
+                "tdim": self.tdim,
+                "last": self.last,
+                "first_year": self.first_year,
+                "name": self.template.name or "var",
+            },
+        )
+        for k, v in self.attrs.items():
+            ds["group"].attrs[f"time_{k}"] = v
+        ds.to_netcdf(fname)
+
+    @classmethod
+    def load(cls, fname):
+        """Returns climatology builder from accumulators saved with
+        `save`.
+
+        Parameters
+        ----------
+        fname : str
+            Path of saved accumulators
+
+        Returns
+        -------
+        clim : Climatology
+
+        """
+        with xr.open_dataset(fname, decode_times=False) as ds:
+            ds = ds.load()
+        attrs = ds.attrs
+        clim = cls(
+            diurnal=bool(attrs["diurnal"]),
+            multiyear=bool(attrs["multiyear"]),
+            nhours=int(attrs["nhours"]),
+            tdim=attrs["tdim"],
+        )
+        clim.template = ds["template"].rename(attrs["name"])
+        clim.attrs = {
+            k[5:]: v for k, v in ds["group"].attrs.items() if k.startswith("time_")
+        }
+        clim.calendar = clim.attrs.get("calendar", DEFAULT_CALENDAR)
+        clim.last = int(attrs["last"])
+        clim.first_year = int(attrs["first_year"])
+        for n, k in enumerate(ds["group"].values.tolist()):
+            clim.acc[k] = {
+                "sum": ds["sum"].values[n],
+                "count": ds["count"].values[n],
+            }
+            clim.bounds[k] = tuple(int(b) for b in ds["bounds"].values[n])
+        return clim
+
+
+def date_seconds(date, calendar, end=False):
+    """Returns seconds from start of calendar of a date as 'YYYY',
+    'YYYY-MM' or 'YYYY-MM-DD'.
+
+    Parameters
+    ----------
+    date : str or int
+        Date, a partial date refers to the start of the year or month
+    calendar : str
+        CF calendar
+    end : bool
+        If True returns the end of the period a partial date refers to,
+        so '1859' ends on 1860-01-01 (default False)
+
+    Returns
+    -------
+    sec : int
+
+    Raises
+    ------
+    ValueError
+        If date cannot be parsed
+
+    """
+    match = re.fullmatch(r"(-?\d+)(?:-(\d{1,2}))?(?:-(\d{1,2}))?", str(date).strip())
+    if match is None:
+        raise ValueError(f"Date {date} should be YYYY, YYYY-MM or YYYY-MM-DD")
+    year, month, day = int(match[1]), int(match[2] or 1), int(match[3] or 1)
+    days = days_from_date(year, month, day, calendar)
+    if end:
+        if match[3]:
+            days += 1
+        elif match[2]:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            days = days_from_date(year, month, 1, calendar)
+        else:
+            days = days_from_date(year + 1, 1, 1, calendar)
+    return int(days) * 86400
+
+
+def range_seconds(time_range, calendar):
+    """Returns start and end of a time range, as (start, end) dates, in
+    seconds from start of calendar. Start or end can be None.
+
+    :meta private:
+    """
+    start, end = time_range
+    start = -np.inf if start is None else date_seconds(start, calendar)
+    end = np.inf if end is None else date_seconds(end, calendar, end=True)
+    return start, end
+
+
+def find_time(ds):
+    """Returns name of time coordinate in dataset, or None.
+
+    :meta private:
+    """
+    for name in ds.coords:
+        if ds[name].attrs.get("axis") == "T" or "since" in ds[name].attrs.get(
+            "units", ""
+        ):
+            return name
+    return None
+
+
+@lru_cache(maxsize=None)
+def _time_coverage(fname, mtime):
+    with xr.open_dataset(fname, decode_times=False) as ds:
+        tdim = find_time(ds)
+        if tdim is None:
+            return None
+        time = ds[tdim]
+        bname = time.attrs.get("bounds")
+        values = ds[bname].values if bname in ds.variables else time.values
+        if values.size == 0:
+            return None
+        calendar = time.attrs.get("calendar", DEFAULT_CALENDAR)
+        sec = time_seconds(values, time.attrs["units"], calendar)
+        return int(sec.min()), int(sec.max()), calendar, bname in ds.variables
+
+
+def time_coverage(fname):
+    """Returns time coverage of a file, from its time bounds if
+    available. The file is read only once per process unless it is
+    modified.
+
+    Parameters
+    ----------
+    fname : str
+        Path of file
+
+    Returns
+    -------
+    coverage : tuple or None
+        (start, end, calendar, bounds) with start and end in seconds
+        from start of calendar and bounds True if coverage is from time
+        bounds, None if file has no time axis
+
+    """
+    return _time_coverage(os.path.abspath(fname), os.stat(fname).st_mtime)
+
+
+def filter_files(files, time_range):
+    """Returns files including times inside a time range, using only
+    the time coordinate of each file.
+
+    Parameters
+    ----------
+    files : list(str)
+        Input files
+    time_range : tuple
+        (start, end) dates as 'YYYY[-MM[-DD]]', end is inclusive and
+        either can be None
+
+    Returns
+    -------
+    files : list(str)
+        Files overlapping time range, files without a time axis are
+        always included
+
+    """
+    selected = []
+    for fname in files:
+        coverage = time_coverage(fname)
+        if coverage is None:
+            selected.append(fname)
+            continue
+        first, last, calendar, bounds = coverage
+        start, end = range_seconds(time_range, calendar)
+        # an upper bound equal to range start does not overlap it
+        if first < end and (last > start if bounds else last >= start):
+            selected.append(fname)
+    return selected
+
+
+def time_indexer(ds, time_range, tdim=None):
+    """Returns indexer selecting times inside a time range, times are
+    not decoded.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset read with decode_times=False
+    time_range : tuple
+        (start, end) dates, see `filter_files`
+    tdim : str
+        Name of time dimension (default found from coordinates attributes)
+
+    Returns
+    -------
+    indexer : dict
+        Dictionary of time dimension and slice, empty if dataset has no
+        time axis
+
+    """
+    tdim = tdim or find_time(ds)
+    if tdim is None or tdim not in ds.dims:
+        return {}
+    time = ds[tdim]
+    calendar = time.attrs.get("calendar", DEFAULT_CALENDAR)
+    start, end = range_seconds(time_range, calendar)
+    sec = time_seconds(time.values, time.attrs["units"], calendar)
+    i0, i1 = np.searchsorted(sec, [start, end], side="left")
+    return {tdim: slice(int(i0), int(i1))}
@@ -28,12 +28,16 @@
 
 import json
 import logging
+from functools import lru_cache
 
-import click
 import numpy as np
 import xarray as xr
 from mopdb.utils import MopException
 
+from access_mopper.calc_time import resample_numeric
+from access_mopper.dataclasses import CalcSettings
+from access_mopper.fixed_fields import get_fixed_fields
+
 # Global Variables
 # ----------------------------------------------------------------------
 
@@ -48,8 +52,18 @@ R_e = 6.378e06
 # ----------------------------------------------------------------------
 
 
-@click.pass_context
-def time_resample(ctx, var, rfrq, tdim, sample="down", stats="mean"):
+def get_settings(settings=None):
+    """Returns settings, or the settings from the current click context
+    if None, so click commands keep working unchanged.
+
+    :meta private:
+    """
+    if settings is None:
+        settings = CalcSettings.from_context()
+    return settings
+
+
+def time_resample(var, rfrq, tdim, sample="down", stats="mean", settings=None):
     """
     Resamples the input variable to the specified frequency using
     specified statistic.
@@ -59,13 +73,14 @@ def time_resample(ctx, var, rfrq, tdim, sample="down", stats="mean"):
     closed = 'right'
     This puts the time label to the start of the interval and
     offset is applied to get a centered time label.
+    If the time axis is numeric (not decoded) downsampling uses
+    `calc_time.resample_numeric`, which labels each interval with its
+    centre without creating cftime objects.
     The `rfrq` valid lables are described here:
     https://pandas.pydata.org/pandas-docs/stable/user_guide/timeseries.html#period-aliases
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     var : xarray.DataArray
         Variable to resample.
     rfrq : str
@@ -78,6 +93,8 @@ def time_resample(ctx, var, rfrq, tdim, sample="down", stats="mean"):
     stats : str
         The reducing function to follow resample: mean, min, max, sum.
         (default mean)
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -92,7 +109,8 @@ def time_resample(ctx, var, rfrq, tdim, sample="down", stats="mean"):
         If the sample parameter is not 'up' or 'down'.
 
     """
-    var_log = logging.getLogger(ctx.obj["var_log"])
+    settings = get_settings(settings)
+    var_log = logging.getLogger(settings.var_log)
     if not isinstance(var, xr.DataArray):
         raise MopException("'var' must be a valid Xarray DataArray")
     valid_stats = ["mean", "min", "max", "sum"]
@@ -112,7 +130,13 @@ def time_resample(ctx, var, rfrq, tdim, sample="down", stats="mean"):
         "Y": [6, "M"],
         "10Y": [5, "Y"],
     }
-    if sample == "down":
+    if sample == "down" and np.issubdtype(var[tdim].dtype, np.number):
+        try:
+            vout = resample_numeric(var, rfrq, tdim, stats=stats)
+        except Exception as e:
+            var_log.error(f"Resample error: {e}")
+            raise MopException(f"{e}")
+    elif sample == "down":
         try:
             vout = var.resample({tdim: rfrq}, origin="start_day", closed="right")
             method = getattr(vout, stats)
@@ -158,8 +182,7 @@ def add_axis(var, name, value):
     return var
 
 
-@click.pass_context
-def sum_vars(ctx, varlist):
+def sum_vars(varlist):
     """Returns sum of all variables in list
     Parameters
     ----------
@@ -179,17 +202,16 @@ def sum_vars(ctx, varlist):
     return varout
 
 
-@click.pass_context
-def rename_coord(ctx, var1, var2, ndim, override=False):
+def rename_coord(var1, var2, ndim, override=False, settings=None):
     """If coordinates in ndim position are different, renames var2
     coordinates as var1.
 
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     :meta private:
     """
-    var_log = logging.getLogger(ctx.obj["var_log"])
+    var_log = logging.getLogger(get_settings(settings).var_log)
     coord1 = var1.dims[ndim]
     coord2 = var2.dims[ndim]
     if coord1 != coord2:
@@ -201,65 +223,84 @@ def rename_coord(ctx, var1, var2, ndim, override=False):
     return var2, override
 
 
-@click.pass_context
-def get_ancil_var(ctx, ancil, varname):
-    """Opens the ancillary file and get varname
+def get_ancil_var(ancil, varname, settings=None):
+    """Opens the ancillary file and get varname, the variable is
+    read only once for each model configuration and ancillary file.
 
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
+    ancil : str
+        Setting naming the ancillary file, one of CalcSettings.ANCILS
+    varname : str
+        Name of variable in ancillary file
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
-    ctx : click context obj
-        Dictionary including 'cmor' settings and attributes for experiment
-        Automatically passed
     var : Xarray DataArray
         selected variable from ancil file
 
+    Raises
+    ------
+    MopException
+        If ancil is not an ancillary file setting
+
     :meta private:
     """
-    f = xr.open_dataset(f"{ctx.obj['ancil_path']}/" + f"{ctx.obj[ancil]}")
-    var = f[varname]
-
+    settings = get_settings(settings)
+    try:
+        fname = settings.ancil_file(ancil)
+    except KeyError:
+        raise MopException(
+            f"Unknown ancillary file {ancil}, expected one of {settings.ANCILS}"
+        )
+
+    def compute():
+        with xr.open_dataset(fname) as f:
+            return f[varname].load()
+
+    var = get_fixed_fields(settings.configuration, fname).get(varname, compute)
     return var
 
 
-@click.pass_context
-def get_plev(ctx, levnum):
+def get_plev(levnum, settings=None):
     """Read pressure levels from .._coordinate.json file
 
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
-
-    Returns
-    -------
-    ctx : click context obj
-        Dictionary including 'cmor' settings and attributes for experiment
-        Automatically passed
     levnum : str
         Indicates pressure levels to load, corresponds to plev#levnum axis
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
+
+    :meta private:
+    """
+    settings = get_settings(settings)
+    fpath = f"{settings.tpath}/{settings._AXIS_ENTRY_FILE}"
+    plev = np.array(read_plev(fpath, levnum), dtype=float)
+    return plev
+
+
+@lru_cache(maxsize=None)
+def read_plev(fpath, levnum):
+    """Returns pressure levels from coordinate file, the file is read
+    only once for each set of levels.
 
     :meta private:
     """
-    fpath = f"{ctx.obj['tpath']}/{ctx.obj['_AXIS_ENTRY_FILE']}"
     with open(fpath, "r") as jfile:
         data = json.load(jfile)
     axis_dict = data["axis_entry"]
-    plev = np.array(axis_dict[f"plev{levnum}"]["requested"])
-    plev = plev.astype(float)
+    plev = tuple(float(p) for p in axis_dict[f"plev{levnum}"]["requested"])
     return plev
 
 
-@click.pass_context
-def K_degC(ctx, var, inverse=False):
+def K_degC(var, inverse=False, settings=None):
     """Converts temperature from/to K to/from degC.
 
     Parameters
     ----------
-    ctx : click context
-        Includes obj dict with 'cmor' settings, exp attributes
     var : Xarray DataArray
         temperature array
+    settings : CalcSettings
+        Calculation settings, if None (default) from click context
 
     Returns
     -------
@@ -267,7 +308,7 @@ def K_degC(ctx, var, inverse=False):
         temperature array in degrees Celsius or Kelvin if inverse is True
 
     """
-    var_log = logging.getLogger(ctx.obj["var_log"])
+    var_log = logging.getLogger(get_settings(settings).var_log)
     if not inverse and "K" in var.units:
         var_log.info("temp in K, converting to degC")
         vout = var - 273.15
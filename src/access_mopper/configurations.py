@@ -3,15 +3,19 @@ import json
 import operator
 import os
 from dataclasses import dataclass
+from functools import partial
 
 import cmor
 import numpy as np
-import xarray as xr
 
-from .calc_atmos import level_to_height
+from . import ocean_supergrid
+from .atmos_grids import axis_bounds, configuration_grid, get_axis
+from .calc_atmos import get_model_levels, level_to_height, zonal_mean
 from .calc_land import average_tile, calc_landcover, calc_topsoil, extract_tilefrac
 from .dataclasses import CMIP6_Experiment
-from .ocean_supergrid import ocean_grid
+from .regions import region_indexers
+from .selection import open_selection, vertical_dims
+from .sites import extract_sites, get_site_index
 
 # Supported operators
 OPERATORS = {
@@ -21,6 +25,8 @@ OPERATORS = {
     "/": operator.truediv,
     "**": operator.pow,
 }
+# UM surface altitude, orography term of the hybrid height coordinate
+OROGRAPHY = "fld_s00i033"
 
 
 @dataclass
@@ -71,15 +77,40 @@ def get_mapping(compound_name):
     return data[cmor_name]
 
 
-def cmorise(file_paths, compound_name, cmor_dataset_json, mip_table):
+def cmorise(
+    file_paths,
+    compound_name,
+    cmor_dataset_json,
+    mip_table,
+    region=None,
+    time_range=None,
+    level_range=None,
+    orography=None,
+    sites=None,
+):
     cmor_name = compound_name.split(".")[1]
-
-    # Open the matching files with xarray
-    ds = xr.open_mfdataset(file_paths, combine="by_coords", decode_times=False)
-
-    # Extract required variables and coordinates
     mapping = get_mapping(compound_name=compound_name)
+    with resources.files("access_mopper.cmor_tables").joinpath(mip_table).open() as f:
+        table_dims = json.load(f)["variable_entry"][cmor_name]["dimensions"].split()
+    # site tables (CFsubhr, Esubhr) need the (lat, lon) of their sites
+    site_table = "site" in table_dims
+    if site_table and sites is None:
+        raise ValueError(f"Sites (lat, lon) are required for {compound_name}")
+
+    # Open the matching files with xarray, selecting on each file the
+    # region (name or (lat_min, lat_max, lon_min, lon_max)), the time
+    # range ((start, end) as YYYY[-MM[-DD]]) and the levels range
+    # ((min, max) values) so only the selection is read
+    ds = open_selection(
+        file_paths,
+        time_range=time_range,
+        variables=mapping["model_variables"],
+        region=region,
+        level_range=level_range,
+        zdims=vertical_dims(mapping),
+    )
 
+    # Extract required variables and coordinates
     if mapping["calculation"]["type"] == "direct":
         access_var = mapping["calculation"]["formula"]
         variable_units = mapping["units"]
@@ -96,6 +127,7 @@ def cmorise(file_paths, compound_name, cmor_dataset_json, mip_table):
             "calc_landcover": calc_landcover,
             "calc_topsoil": calc_topsoil,
             "average_tile": average_tile,
+            "zonal_mean": zonal_mean,
         }
         try:
             context = {**access_vars, **OPERATORS, **custom_functions}
@@ -106,19 +138,60 @@ def cmorise(file_paths, compound_name, cmor_dataset_json, mip_table):
     dim_mapping = mapping["dimensions"]
     axes = {dim_mapping.get(axis, axis): axis for axis in var.dims}
 
-    data = var.values
-    lat_axis = axes.pop("latitude")
-    lat = ds[lat_axis].values
-    lat_bnds = ds[ds[lat_axis].attrs["bounds"]].values
-    lon_axis = axes.pop("longitude")
-    lon = ds[lon_axis].values
-    lon_bnds = ds[ds[lon_axis].attrs["bounds"]].values
-
-    # Convert time to numeric values
+    # values at sites are taken from the nearest grid points, only the
+    # rows and columns of these points are read
+    if site_table:
+        site_lat, site_lon = np.asarray(sites, dtype="float64").reshape(-1, 2).T
+        lat_axis = axes.pop("latitude")
+        lon_axis = axes.pop("longitude")
+        site_index = get_site_index(
+            tuple(ds[lat_axis].values.tolist()), tuple(ds[lon_axis].values.tolist())
+        )
+        var = extract_sites(
+            var, site_index, site_lat, site_lon, ydim=lat_axis, xdim=lon_axis
+        )
+
+    # model levels are written on the hybrid height axis, see HybridHeight.
+    # Its orography term is read from the orography files (path or
+    # pattern) if passed, otherwise from the input files
+    levels = get_model_levels(var)
+    if levels is not None:
+        zdim, hybrid, index = levels
+        axes = {k: v for k, v in axes.items() if v != zdim}
+        if OROGRAPHY in ds:
+            orog = ds[OROGRAPHY]
+        else:
+            orog = open_selection(
+                orography or file_paths, variables=[OROGRAPHY], region=region
+            )[OROGRAPHY]
+        orog = orog.isel({d: 0 for d in orog.dims[:-2]})
+        if site_table:
+            orog = extract_sites(orog, site_index, site_lat, site_lon)
+        orog = orog.values
+
+    if not site_table:
+        # latitude and longitude are served by the grids registry
+        with open(cmor_dataset_json) as f:
+            grid = configuration_grid(json.load(f).get("source_id", ""))
+        lat_axis = axes.pop("latitude")
+        lat, lat_bnds = get_axis(ds, lat_axis, "latitude", grid)
+        # zonal means (*Z tables) have no longitude axis
+        lon_axis = axes.pop("longitude", None)
+        if lon_axis is not None:
+            lon, lon_bnds = get_axis(ds, lon_axis, "longitude", grid)
+
+    # Convert time to numeric values, instantaneous time (time1) of
+    # sub-hourly tables has no bounds
     time_axis = axes.pop("time")
+    time_entry = next((d for d in table_dims if d.startswith("time")), "time")
     time_numeric = ds[time_axis].values
     time_units = ds[time_axis].attrs["units"]
-    time_bnds = ds[ds[time_axis].attrs["bounds"]].values
+    try:
+        time_bnds = ds[ds[time_axis].attrs["bounds"]].values
+    except KeyError:
+        time_bnds = axis_bounds(time_numeric)
+    if time_entry == "time1":
+        time_bnds = None
     # TODO: Check that the calendar is the same than the one defined in the model.json
     # Convert if not.
     # calendar = ds[time_axis].attrs["calendar"]
@@ -134,23 +207,73 @@ def cmorise(file_paths, compound_name, cmor_dataset_json, mip_table):
     cmor.dataset_json(cmor_dataset_json)
     current_dir = os.path.dirname(os.path.abspath(__file__))
     mip_table = os.path.join(current_dir, "cmor_tables", mip_table)
-    cmor.load_table(mip_table)
+    table_id = cmor.load_table(mip_table)
 
     cmor_axes = []
     # Define CMOR axes
-    cmorLat = cmor.axis(
-        "latitude", coord_vals=lat, cell_bounds=lat_bnds, units="degrees_north"
-    )
-    cmor_axes.append(cmorLat)
-    cmorLon = cmor.axis(
-        "longitude", coord_vals=lon, cell_bounds=lon_bnds, units="degrees_east"
-    )
-    cmor_axes.append(cmorLon)
+    if site_table:
+        # sites are an index axis with their coordinates from the grids table
+        cmorSite = cmor.axis("site", coord_vals=var["site"].values, units="1")
+        with (
+            resources.files("access_mopper.cmor_tables")
+            .joinpath("CMIP6_grids.json")
+            .open("r") as file
+        ):
+            grid_table_id = cmor.load_table(file)
+        cmor.set_table(grid_table_id)
+        grid_id = cmor.grid(
+            axis_ids=np.array([cmorSite]), latitude=site_lat, longitude=site_lon
+        )
+        cmor.set_table(table_id)
+        cmor_axes.append(grid_id)
+    else:
+        cmorLat = cmor.axis(
+            "latitude", coord_vals=lat, cell_bounds=lat_bnds, units="degrees_north"
+        )
+        cmor_axes.append(cmorLat)
+        if lon_axis is not None:
+            cmorLon = cmor.axis(
+                "longitude", coord_vals=lon, cell_bounds=lon_bnds, units="degrees_east"
+            )
+            cmor_axes.append(cmorLon)
     cmorTime = cmor.axis(
-        "time", coord_vals=time_numeric, cell_bounds=time_bnds, units=time_units
+        time_entry, coord_vals=time_numeric, cell_bounds=time_bnds, units=time_units
     )
     cmor_axes.append(cmorTime)
 
+    if levels is not None:
+        # rho levels (alevhalf) have no bounds
+        terms = hybrid.formula_terms(index)
+        half = hybrid.levtype == "rho"
+        cmorLev = cmor.axis(
+            "hybrid_height_half" if half else "hybrid_height",
+            coord_vals=terms["lev"],
+            cell_bounds=None if half else terms["lev_bnds"],
+            units="m",
+        )
+        cmor_axes.append(cmorLev)
+        cmor.zfactor(
+            zaxis_id=cmorLev,
+            zfactor_name="b",
+            axis_ids=[cmorLev],
+            units="",
+            zfactor_values=terms["b"],
+            zfactor_bounds=None if half else terms["b_bnds"],
+        )
+        if site_table:
+            orog_axes = [grid_id]
+        elif lon_axis is None:
+            orog_axes = [cmorLat]
+        else:
+            orog_axes = [cmorLat, cmorLon]
+        cmor.zfactor(
+            zaxis_id=cmorLev,
+            zfactor_name="orog",
+            axis_ids=orog_axes,
+            units="m",
+            zfactor_values=orog,
+        )
+
     if axes:
         for axis, dim in axes.items():
             coord_vals = var[dim].values
@@ -167,7 +290,11 @@ def cmorise(file_paths, compound_name, cmor_dataset_json, mip_table):
     # Define CMOR variable
     cmorVar = cmor.variable(cmor_name, variable_units, cmor_axes, positive=positive)
 
-    # Write data to CMOR
+    # Write data to CMOR, sites data in the order of the axes
+    if site_table:
+        data = var.transpose("site", time_axis, ...).values
+    else:
+        data = var.values
     cmor.write(cmorVar, data, ntimes_passed=len(time_numeric))
 
     # Finalize and save the file
@@ -177,15 +304,48 @@ def cmorise(file_paths, compound_name, cmor_dataset_json, mip_table):
     cmor.close()
 
 
-def cmorise_ocean(file_paths, compound_name, cmor_dataset_json, mip_table):
+def cmorise_ocean(
+    file_paths,
+    compound_name,
+    cmor_dataset_json,
+    mip_table,
+    region=None,
+    time_range=None,
+    level_range=None,
+):
     mip_name, cmor_name = compound_name.split(".")
+    mapping = get_mapping(compound_name=compound_name)
+    # the ocean grid is loaded when first used, not on import
+    ocean_grid = ocean_supergrid.ocean_grid
+
+    # Region is selected on the tripolar grid T cells, the same indices
+    # apply to U cells
+    rows, cols = slice(None), slice(None)
+    indexers = {}
+    if region is not None:
+        indexers = region_indexers(
+            ocean_grid.yt.values, ocean_grid.xt.values, region, "y", "x"
+        )
+        rows, cols = indexers["y"], indexers["x"]
+        indexers = {
+            "yt_ocean": rows,
+            "yu_ocean": rows,
+            "xt_ocean": cols,
+            "xu_ocean": cols,
+        }
 
-    # Open the matching files with xarray
-    ds = xr.open_mfdataset(file_paths, combine="by_coords", decode_times=False)
+    # Open the matching files with xarray, see cmorise for selections.
+    # Axes of tiles not written by land only processors are from the grid
+    ds = open_selection(
+        file_paths,
+        time_range=time_range,
+        axes=ocean_grid.mom_axes(),
+        indexers=indexers,
+        level_range=level_range,
+        zdims=vertical_dims(mapping),
+    )
 
     # Extract required variables and coordinates
-    mapping = get_mapping(compound_name=compound_name)
-
     if mapping["calculation"]["type"] == "direct":
         access_var = mapping["calculation"]["formula"]
         variable_units = mapping["units"]
@@ -196,12 +356,24 @@ def cmorise_ocean(file_paths, compound_name, cmor_dataset_json, mip_table):
         formula = mapping["calculation"]["formula"]
         variable_units = mapping["units"]
         positive = mapping["positive"]
+        # imported here as calc_ocean depends on mopdb
+        from .calc_ocean import calc_zonal_mean_ocean
+
+        # zonal mean bins are cached per region, as indices tuples
+        zrows, zcols = None, None
+        if region is not None:
+            ny, nx = ocean_grid.xt.shape
+            zrows = tuple(np.arange(ny)[rows].tolist())
+            zcols = tuple(np.arange(nx)[cols].tolist())
         custom_functions = {
             "level_to_height": lambda x: x,
             "extract_tilefrac": extract_tilefrac,
             "calc_landcover": calc_landcover,
             "calc_topsoil": calc_topsoil,
             "average_tile": average_tile,
+            "calc_zonal_mean_ocean": partial(
+                calc_zonal_mean_ocean, grid=ocean_grid, rows=zrows, cols=zcols
+            ),
         }
         try:
             context = {**access_vars, **OPERATORS, **custom_functions}
@@ -212,21 +384,32 @@ def cmorise_ocean(file_paths, compound_name, cmor_dataset_json, mip_table):
     dim_mapping = mapping["dimensions"]
     axes = {dim_mapping.get(axis, axis): axis for axis in var.dims}
 
-    i_axis = axes.pop("longitude")
-    i_axis = ds[i_axis].values
-    j_axis = axes.pop("latitude")
-    j_axis = ds[j_axis].values
-    x = np.arange(i_axis.size, dtype="float")
-    x_bnds = np.array([[x_ - 0.5, x_ + 0.5] for x_ in x])
-    y = np.arange(j_axis.size, dtype="float")
-    y_bnds = np.array([[y_ - 0.5, y_ + 0.5] for y_ in y])
-
-    data = var.values
-    lat = ocean_grid.lat
-    lat_bnds = ocean_grid.lat_bnds
-
-    lon = ocean_grid.lon
-    lon_bnds = ocean_grid.lon_bnds
+    # zonal means (*Z tables) are on latitude bands, without the i/j grid
+    zonal = "longitude" not in axes
+    if zonal:
+        lat_axis = axes.pop("latitude")
+        lat = var[lat_axis].values
+        lat_bnds = axis_bounds(lat, latitude=True)
+    else:
+        i_axis = axes.pop("longitude")
+        i_axis = ds[i_axis].values
+        j_axis = axes.pop("latitude")
+        j_axis = ds[j_axis].values
+        x = np.arange(i_axis.size, dtype="float")
+        y = np.arange(j_axis.size, dtype="float")
+        if region is not None:
+            # keep indices of the full grid
+            x = np.arange(ocean_grid.xt.shape[1], dtype="float")[cols]
+            y = np.arange(ocean_grid.xt.shape[0], dtype="float")[rows]
+        x_bnds = np.array([[x_ - 0.5, x_ + 0.5] for x_ in x])
+        y_bnds = np.array([[y_ - 0.5, y_ + 0.5] for y_ in y])
+
+        ocean_grid.t_cells()
+        lat = ocean_grid.lat[rows][:, cols]
+        lat_bnds = ocean_grid.lat_bnds[rows][:, cols]
+
+        lon = ocean_grid.lon[rows][:, cols]
+        lon_bnds = ocean_grid.lon_bnds[rows][:, cols]
 
     # Convert time to numeric values
     time_axis = axes.pop("time")
@@ -247,32 +430,33 @@ def cmorise_ocean(file_paths, compound_name, cmor_dataset_json, mip_table):
 
     cmor.dataset_json(cmor_dataset_json)
 
-    # First, load the grids table to set up x and y axes and the lat-long grid
-    with (
-        resources.files("access_mopper.cmor_tables")
-        .joinpath("CMIP6_grids.json")
-        .open("r") as file
-    ):
-        grid_table_id = cmor.load_table(file)
-    cmor.set_table(grid_table_id)
-
     cmor_axes = []
-    # Define CMOR axes
-    yaxis_id = cmor.axis(
-        table_entry="j_index", units="1", coord_vals=y, cell_bounds=y_bnds
-    )
-    xaxis_id = cmor.axis(
-        table_entry="i_index", units="1", coord_vals=x, cell_bounds=x_bnds
-    )
-
-    grid_id = cmor.grid(
-        axis_ids=np.array([yaxis_id, xaxis_id]),
-        latitude=lat,
-        longitude=lon,
-        latitude_vertices=lat_bnds,
-        longitude_vertices=lon_bnds,
-    )
-    cmor_axes.append(grid_id)
+    if not zonal:
+        # First, load the grids table to set up x and y axes and the lat-long grid
+        with (
+            resources.files("access_mopper.cmor_tables")
+            .joinpath("CMIP6_grids.json")
+            .open("r") as file
+        ):
+            grid_table_id = cmor.load_table(file)
+        cmor.set_table(grid_table_id)
+
+        # Define CMOR axes
+        yaxis_id = cmor.axis(
+            table_entry="j_index", units="1", coord_vals=y, cell_bounds=y_bnds
+        )
+        xaxis_id = cmor.axis(
+            table_entry="i_index", units="1", coord_vals=x, cell_bounds=x_bnds
+        )
+
+        grid_id = cmor.grid(
+            axis_ids=np.array([yaxis_id, xaxis_id]),
+            latitude=lat,
+            longitude=lon,
+            latitude_vertices=lat_bnds,
+            longitude_vertices=lon_bnds,
+        )
+        cmor_axes.append(grid_id)
 
     # Now, load the Omon table to set up the time axis and variable
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -280,6 +464,11 @@ def cmorise_ocean(file_paths, compound_name, cmor_dataset_json, mip_table):
     omon_table_id = cmor.load_table(mip_table)
     cmor.set_table(omon_table_id)
 
+    if zonal:
+        cmorLat = cmor.axis(
+            "latitude", coord_vals=lat, cell_bounds=lat_bnds, units="degrees_north"
+        )
+        cmor_axes.append(cmorLat)
     cmorTime = cmor.axis(
         "time", coord_vals=time_numeric, cell_bounds=time_bnds, units=time_units
     )
@@ -302,7 +491,10 @@ def cmorise_ocean(file_paths, compound_name, cmor_dataset_json, mip_table):
     cmorVar = cmor.variable(cmor_name, variable_units, cmor_axes, positive=positive)
 
     # Write data to CMOR
-    data = np.moveaxis(data, 0, -1)
+    if zonal:
+        data = var.transpose(lat_axis, time_axis, *axes.values()).values
+    else:
+        data = np.moveaxis(var.values, 0, -1)
     cmor.write(cmorVar, data, ntimes_passed=len(time_numeric))
 
     # Finalize and save the file
@@ -1,6 +1,7 @@
 import importlib.resources as resources
 import json
 from dataclasses import dataclass, field
+from typing import ClassVar
 
 import yaml
 
@@ -104,3 +105,61 @@ class CMIP6_Experiment(ACCESS_Experiment):
         "<variable_id><table><source_id><experiment_id><_member_id><grid_label>"
     )
     license: str = "CMIP6 model data produced by CSIRO is licensed under a Creative Commons Attribution-ShareAlike 4.0 International License (https://creativecommons.org/licenses/). Consult https://pcmdi.llnl.gov/CMIP6/TermsOfUse for terms of use governing CMIP6 output, including citation requirements and proper acknowledgment.  Further information about this data, including some limitations, can be found via the further_info_url (recorded as a global attribute in this file). The data producers and data providers make no warranty, either express or implied, including, but not limited to, warranties of merchantability and fitness for a particular purpose. All liabilities arising from the supply of the information (including any liability arising in negligence) are excluded to the fullest extent permitted by law."
+
+
+@dataclass
+class CalcSettings:
+    """Settings needed by derived variables calculations.
+
+    Plain picklable container, so calculations can run in dask tasks,
+    worker processes and notebooks without a click context.
+    """
+
+    configuration: str = ""
+    ancils_path: str = ""
+    grid_ocean: str = ""
+    grid_ice: str = ""
+    mask_ocean: str = ""
+    land_frac: str = ""
+    tpath: str = ""
+    _AXIS_ENTRY_FILE: str = "CMIP6_coordinate.json"
+    variable_id: str = ""
+    var_log: str = "access_mopper"
+    # settings naming an ancillary file in ancils_path
+    ANCILS: ClassVar[tuple] = ("grid_ocean", "grid_ice", "mask_ocean", "land_frac")
+
+    def ancil_file(self, key):
+        """Returns path of the ancillary file named by setting key.
+
+        Parameters
+        ----------
+        key : str
+            One of ANCILS
+
+        Returns
+        -------
+        fname : str
+
+        Raises
+        ------
+        KeyError
+            If key is not an ancillary file setting
+        """
+        if key not in self.ANCILS:
+            raise KeyError(key)
+        return f"{self.ancils_path}/{getattr(self, key)}"
+
+    @classmethod
+    def from_context(cls, ctx=None):
+        """Returns settings from a click context obj dictionary, by
+        default from the current click context.
+        """
+        if ctx is None:
+            import click
+
+            ctx = click.get_current_context()
+        obj = dict(ctx.obj)
+        if "ancils_path" not in obj and "ancil_path" in obj:
+            obj["ancils_path"] = obj["ancil_path"]
+        names = cls.__dataclass_fields__.keys()
+        return cls(**{k: v for k, v in obj.items() if k in names})
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains the store for fixed fields (fx, Ofx, Efx variables
+# and weights derived from ancillary files). Fields are computed once for
+# a model configuration and grid and then read from CACHE_DIR by any
+# other experiment using the same configuration and grid.
+
+import hashlib
+import os
+from functools import lru_cache
+
+import xarray as xr
+
+from access_mopper._config import CACHE_DIR
+
+# Global Variables
+# ----------------------------------------------------------------------
+
+# Version of the stored fields, part of the store path. Bump it whenever
+# the code computing any stored field changes its result (e.g. a new
+# land mask for areacello), so fields saved by earlier versions are not
+# reused. Stores of older versions can be safely deleted.
+# 2: areacello masked over land
+STORE_VERSION = 2
+# ----------------------------------------------------------------------
+
+
+@lru_cache(maxsize=None)
+def _file_hash(path, size, mtime):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def grid_hash(path):
+    """Returns md5 hash of a grid or ancillary file content, so the same
+    grid is recognised whatever its path. The file is read only once
+    per process unless it is modified.
+
+    Parameters
+    ----------
+    path : str
+        Path of grid file
+
+    Returns
+    -------
+    md5 : str
+        Hash of file content
+
+    """
+    stat = os.stat(path)
+    return _file_hash(os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+
+class FixedFields:
+    """Store of fixed fields for a model configuration and grid.
+
+    Fields are looked up in memory first, then in the store directory
+    CACHE_DIR/fx/v<STORE_VERSION>/<configuration>/<grid hash>, and only
+    computed if missing, after which they are saved for later experiments.
+    STORE_VERSION must be bumped whenever the computation of a stored
+    field changes, otherwise fields computed by the previous code are
+    read instead.
+
+    Parameters
+    ----------
+    configuration : str
+        Model configuration, as in ACCESS_configurations.yml
+    gridpath : str
+        Path of grid or ancillary file the fields are derived from
+    cache_dir : str
+        Root directory of the store (default CACHE_DIR)
+
+    """
+
+    def __init__(self, configuration, gridpath, cache_dir=None):
+        self.configuration = configuration or "default"
+        self.gridpath = gridpath
+        self.path = os.path.join(
+            cache_dir or CACHE_DIR,
+            "fx",
+            f"v{STORE_VERSION}",
+            self.configuration,
+            grid_hash(gridpath),
+        )
+        self._fields = {}
+
+    def fname(self, name):
+        """Returns path of file storing field.
+
+        :meta private:
+        """
+        return os.path.join(self.path, f"{name}.nc")
+
+    def __contains__(self, name):
+        return name in self._fields or os.path.isfile(self.fname(name))
+
+    def get(self, name, compute=None):
+        """Returns fixed field, computing and storing it if not yet
+        available.
+
+        Parameters
+        ----------
+        name : str
+            Name of field
+        compute : callable
+            Function with no arguments returning the field as an Xarray
+            DataArray, called only if field is not in store
+
+        Returns
+        -------
+        field : xarray.DataArray
+            Fixed field loaded in memory
+
+        Raises
+        ------
+        KeyError
+            If field is not in store and compute is None
+
+        """
+        if name not in self._fields:
+            fname = self.fname(name)
+            if os.path.isfile(fname):
+                with xr.open_dataarray(fname) as da:
+                    field = da.load()
+            elif compute is None:
+                raise KeyError(f"{name} not in fixed fields store {self.path}")
+            else:
+                field = compute().load().rename(name)
+                os.makedirs(self.path, exist_ok=True)
+                # write to temporary file first so readers never see
+                # a partial file
+                tmpname = f"{fname}.{os.getpid()}.tmp"
+                field.to_netcdf(tmpname)
+                os.replace(tmpname, fname)
+            self._fields[name] = field
+        return self._fields[name]
+
+
+@lru_cache(maxsize=None)
+def get_fixed_fields(configuration, gridpath):
+    """Returns the fixed fields store for configuration and grid file,
+    one store is created per process.
+
+    Parameters
+    ----------
+    configuration : str
+        Model configuration, as in ACCESS_configurations.yml
+    gridpath : str
+        Path of grid or ancillary file the fields are derived from
+
+    Returns
+    -------
+    store : FixedFields
+
+    """
+    return FixedFields(configuration, gridpath)
@@ -1,5 +1,10 @@
 import numpy as np
 import xarray as xr
+from scipy.sparse import csr_matrix
+
+from access_mopper.fixed_fields import get_fixed_fields
+
+R_EARTH = 6.371e6  # MOM radius of the Earth (m)
 
 
 class Supergrid(object):
@@ -23,38 +28,297 @@ class Supergrid(object):
         self.xv = self.supergrid["x"][::2, 1::2]
         self.yv = self.supergrid["y"][::2, 1::2]
 
+    def subcell_area(self):
+        """Returns area of supergrid sub-cells, from the supergrid area
+        variable or, if missing, as the sum of the two spherical
+        triangles of each sub-cell, with great circle edges.
+        """
+        if "area" in self.supergrid:
+            return self.supergrid["area"].values.astype("float64")
+        xyz = lonlat_to_xyz(self.supergrid["x"].values, self.supergrid["y"].values)
+        sw, se = xyz[:-1, :-1], xyz[:-1, 1:]
+        ne, nw = xyz[1:, 1:], xyz[1:, :-1]
+        area = triangle_area(sw, se, ne) + triangle_area(sw, ne, nw)
+        return area * R_EARTH**2
+
+    def is_tripolar(self):
+        """Returns True if the northern row is a tripolar fold, mirrored
+        around its middle.
+        """
+        y = self.supergrid["y"].values
+        return np.allclose(y[-1], y[-1, ::-1]) and np.ptp(y[-1]) > 0
+
+    def padded_t_points(self):
+        """Returns latitude and longitude of t points padded with one
+        point on each side, so they surround all q points: across the
+        cyclic longitude, on the southern edge and on the northern edge
+        or, on a tripolar grid, across the fold.
+        """
+        fold = self.is_tripolar()
+        padded = []
+        for sub, t in ((self.supergrid["y"], self.yt), (self.supergrid["x"], self.xt)):
+            sub, t = sub.values, t.values
+            # t points across the fold are the mirror image of the last row
+            north = t[-1, ::-1] if fold else sub[-1, 1::2]
+            rows = np.concatenate([sub[:1, 1::2], t, north[None]], axis=0)
+            padded.append(np.concatenate([rows[:, -1:], rows, rows[:, :1]], axis=1))
+        return tuple(padded)
+
+    def compute_areas(self):
+        """Returns areas of T, U, V and Q cells summing the supergrid
+        sub-cells each cell is made of.
+
+        T cells are made of 2x2 sub-cells, U, V and Q cells straddle
+        T cell edges: along x the grid is periodic, along y cells on
+        the southern edge are half cells and on a tripolar grid cells
+        on the northern fold are completed with their mirror image.
+        """
+        area = self.subcell_area()
+        fold = self.is_tripolar()
+        # sum sub-cells pairs along y: centred (T, U) or edge (V, Q)
+        rows_c = area[0::2] + area[1::2]
+        rows_e = np.zeros((area.shape[0] // 2 + 1, area.shape[1]))
+        rows_e[:-1] += area[0::2]
+        rows_e[1:] += area[1::2]
+        if fold:
+            rows_e[-1] += area[-1, ::-1]
+        areas = {}
+        for cell, rows in zip("tuvq", (rows_c, rows_c, rows_e, rows_e)):
+            if cell in "tv":
+                areas[cell] = rows[:, 0::2] + rows[:, 1::2]
+            else:
+                # edge cells along x wrap around, last column repeats first
+                edges = rows[:, 0::2] + np.roll(rows, 1, axis=1)[:, 0::2]
+                areas[cell] = np.concatenate([edges, edges[:, :1]], axis=1)
+        return areas
+
+    def cell_area(self, cell="t"):
+        """Returns area of cells: t, u, v or q (corners).
+
+        Areas are computed once for a supergrid and stored in the fixed
+        fields store, so later runs read them from disk.
+
+        Parameters
+        ----------
+        cell : str
+            Type of cell (default t)
+
+        Returns
+        -------
+        area : xarray.DataArray
+            Cell area in m2 with same shape as cell centres
+        """
+        store = get_fixed_fields("supergrid", self.supergrid_file)
+        name = f"area_{cell}"
+        if name not in store:
+            for k, v in self.compute_areas().items():
+                store.get(f"area_{k}", lambda: xr.DataArray(v, dims=("ny", "nx")))
+        area = store.get(name)
+        area.attrs["units"] = "m2"
+        return area
+
+    def cell_bounds(self, cell="t"):
+        """Returns latitude and longitude of the vertices of cells: t
+        or q (corners).
+
+        Vertices are ordered counter-clockwise SW, SE, NE, NW, as CMOR
+        expects, and longitudes are in [0, 360). Vertices of q cells are
+        the t points around them, see `padded_t_points`, so bounds have
+        the same shape as the cell centres. As areas, bounds are
+        computed once for a supergrid and stored in the fixed fields
+        store.
+
+        Parameters
+        ----------
+        cell : str
+            Type of cell (default t)
+
+        Returns
+        -------
+        lat_bnds : xarray.DataArray
+            Latitude of cell vertices (ny, nx, 4)
+        lon_bnds : xarray.DataArray
+            Longitude of cell vertices (ny, nx, 4)
+
+        Raises
+        ------
+        ValueError
+            If cell is not t or q
+        """
+        if cell not in ("t", "q"):
+            raise ValueError(f"E: bounds of {cell} cells not supported, only t or q")
+        store = get_fixed_fields("supergrid", self.supergrid_file)
+        # vertices of t cells are the q points and vice versa
+        if cell == "t":
+            corners = (self.yq.values, self.xq.values)
+        else:
+            corners = self.padded_t_points()
+        bounds = []
+        for name, values in zip(("lat", "lon"), corners):
+            if name == "lon":
+                values = (values + 360) % 360
+
+            def compute():
+                vertices = np.stack(
+                    [
+                        values[:-1, :-1],  # SW corner
+                        values[:-1, 1:],  # SE corner
+                        values[1:, 1:],  # NE corner
+                        values[1:, :-1],  # NW corner
+                    ],
+                    axis=-1,
+                )
+                return xr.DataArray(vertices, dims=("ny", "nx", "vertices"))
+
+            bounds.append(store.get(f"{name}_vertices_{cell}", compute))
+        return tuple(bounds)
+
+    def mom_axes(self):
+        """Returns the 1D axes of MOM output on the grid, as MOM defines
+        them: longitudes along the first row and latitudes along the
+        column at a quarter of the grid, t cells and u cells (north-east
+        corners).
+
+        Returns
+        -------
+        axes : dict
+            Dictionary of dimension (xt_ocean, yt_ocean, xu_ocean,
+            yu_ocean) and values
+        """
+        ni = self.xt.shape[1]
+        return {
+            "xt_ocean": self.xt.values[0],
+            "yt_ocean": self.yt.values[:, ni // 4],
+            "xu_ocean": self.xq.values[1, 1:],
+            "yu_ocean": self.yq.values[1:, ni // 4 + 1],
+        }
+
     def t_cells(self):
         self.lat = self.yt.values
-        self.lat_bnds = np.zeros((*self.yt.shape, 4))
-        self.lat_bnds[..., 0] = self.yq[1:, :-1]  # SW corner
-        self.lat_bnds[..., 1] = self.yq[1:, 1:]  # SE corner
-        self.lat_bnds[..., 2] = self.yq[:-1, 1:]  # NE corner
-        self.lat_bnds[..., 3] = self.yq[:-1, :-1]  # NW corner
-
         self.lon = (self.xt.values + 360) % 360
-        self.xq = (self.xq + 360) % 360
-        self.lon_bnds = np.zeros((*self.xt.shape, 4))
-        self.lon_bnds[..., 0] = self.xq[1:, :-1]  # SW corner
-        self.lon_bnds[..., 1] = self.xq[1:, 1:]  # SE corner
-        self.lon_bnds[..., 2] = self.xq[:-1, 1:]  # NE corner
-        self.lon_bnds[..., 3] = self.xq[:-1, :-1]  # NW corner
+        lat_bnds, lon_bnds = self.cell_bounds("t")
+        self.lat_bnds = lat_bnds.values
+        self.lon_bnds = lon_bnds.values
+        self.area = self.cell_area("t").values
 
     def q_cells(self):
         self.lat = self.yq.values
-        self.lat_bnds = np.zeros((*self.yt.shape, 4))
-        self.lat_bnds[..., 0] = self.yt[1:, :-1]  # SW corner
-        self.lat_bnds[..., 1] = self.yt[1:, 1:]  # SE corner
-        self.lat_bnds[..., 2] = self.yt[:-1, 1:]  # NE corner
-        self.lat_bnds[..., 3] = self.yt[:-1, :-1]  # NW corner
-
         self.lon = (self.xq.values + 360) % 360
-        self.xt = (self.xt + 360) % 360
-        self.lon_bnds = np.zeros((*self.xq.shape, 4))
-        self.lon_bnds[..., 0] = self.xt[1:, :-1]  # SW corner
-        self.lon_bnds[..., 1] = self.xt[1:, 1:]  # SE corner
-        self.lon_bnds[..., 2] = self.xt[:-1, 1:]  # NE corner
-        self.lon_bnds[..., 3] = self.xt[:-1, :-1]  # NW corner
+        lat_bnds, lon_bnds = self.cell_bounds("q")
+        self.lat_bnds = lat_bnds.values
+        self.lon_bnds = lon_bnds.values
+        self.area = self.cell_area("q").values
+
+
+class ZonalBins:
+    """Zonal mean operator for the tripolar ocean grid.
+
+    Cells are assigned to latitude bands by their centre latitude and
+    the band means are area weighted. The (band, cell) weights are
+    stored once as a sparse matrix, so for each block of the input
+    the zonal mean is a single sparse matrix product and the full
+    field is never materialised. Missing values are skipped.
+
+    Parameters
+    ----------
+    lat : numpy.ndarray
+        Latitude of cell centres (lat, lon)
+    area : numpy.ndarray
+        Cell area (lat, lon), 0 over land, see
+        `access_mopper.calc_ocean.get_ocean_weights`
+    dlat : float
+        Width of latitude bands in degrees (default 1)
+
+    """
+
+    def __init__(self, lat, area, dlat=1.0):
+        nbands = int(round(180 / dlat))
+        edges = np.linspace(-90, 90, nbands + 1)
+        lat = np.asarray(lat, dtype="float64").ravel()
+        area = np.nan_to_num(np.asarray(area, dtype="float64").ravel())
+        band = np.clip(np.digitize(lat, edges) - 1, 0, nbands - 1)
+        cells = np.flatnonzero((area > 0) & np.isfinite(lat))
+        self.weights = csr_matrix(
+            (area[cells], (band[cells], cells)), shape=(nbands, lat.size)
+        )
+        self.lat = (edges[:-1] + edges[1:]) / 2
+        self.lat_bnds = np.stack([edges[:-1], edges[1:]], axis=1)
+
+    def reduce(self, values):
+        """Returns the zonal mean of a block with horizontal dimensions
+        last.
+
+        :meta private:
+        """
+        shape = values.shape[:-2]
+        values = values.reshape(-1, values.shape[-2] * values.shape[-1]).T
+        valid = np.isfinite(values)
+        total = self.weights @ np.where(valid, values, 0)
+        norm = self.weights @ valid
+        with np.errstate(invalid="ignore", divide="ignore"):
+            zmean = total / norm
+        return zmean.T.reshape(shape + (-1,)).astype(values.dtype, copy=False)
+
+    def __call__(self, var):
+        """Returns zonal mean of variable.
+
+        Parameters
+        ----------
+        var : xarray.DataArray
+            Input variable, horizontal dimensions must be the last two
+
+        Returns
+        -------
+        vout : xarray.DataArray
+            Zonal mean dims(..., lat)
+
+        """
+        hdims = list(var.dims[-2:])
+        if var.chunks is not None:
+            var = var.chunk({d: -1 for d in hdims})
+        vout = xr.apply_ufunc(
+            self.reduce,
+            var,
+            input_core_dims=[hdims],
+            output_core_dims=[["lat"]],
+            dask="parallelized",
+            output_dtypes=[var.dtype],
+            dask_gufunc_kwargs={"output_sizes": {"lat": self.lat.size}},
+            keep_attrs=True,
+        )
+        vout = vout.assign_coords(lat=("lat", self.lat, {"units": "degrees_north"}))
+        return vout
+
+
+def lonlat_to_xyz(lon, lat):
+    """Returns cartesian coordinates on the unit sphere, last axis, of
+    longitudes and latitudes in degrees.
+    """
+    lon = np.radians(np.asarray(lon, dtype="float64"))
+    lat = np.radians(np.asarray(lat, dtype="float64"))
+    return np.stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)],
+        axis=-1,
+    )
+
+
+def triangle_area(a, b, c):
+    """Returns area of spherical triangles on the unit sphere from the
+    cartesian coordinates of their vertices, last axis.
+    """
+    det = np.abs(np.einsum("...i,...i", a, np.cross(b, c)))
+    dot = 1 + np.einsum("...i,...i", a, b)
+    dot += np.einsum("...i,...i", b, c) + np.einsum("...i,...i", c, a)
+    return 2 * np.arctan2(det, dot)
 
 
 grid_filepath = "/home/romain/PROJECTS/ACCESS-MOPPeR/grids/access-om2/input_20201102/mom_025deg/ocean_hgrid.nc"
-ocean_grid = Supergrid(grid_filepath)
+
+
+def __getattr__(name):
+    # build the default grid only when first used
+    if name == "ocean_grid":
+        global ocean_grid
+        ocean_grid = Supergrid(grid_filepath)
+        return ocean_grid
+    raise AttributeError(f"module {__name__} has no attribute {name}")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains the functions to define a region, horizontal or
+# vertical, as index selections on the model grid, so only the region is
+# read from the input files.
+
+from functools import lru_cache
+from importlib.resources import files as import_files
+
+import numpy as np
+import xarray as xr
+import yaml
+
+
+@lru_cache(maxsize=None)
+def read_regions():
+    """Reads named regions from mopdata/regions.yaml
+
+    :meta private:
+    """
+    fname = import_files("mopdata").joinpath("regions.yaml")
+    with fname.open(mode="r") as yfile:
+        data = yaml.safe_load(yfile)
+    return data
+
+
+def get_region(region):
+    """Returns region bounding box.
+
+    Parameters
+    ----------
+    region : str or sequence
+        Name of region defined in mopdata/regions.yaml or bounding box
+        as (lat_min, lat_max, lon_min, lon_max)
+
+    Returns
+    -------
+    box : tuple
+        (lat_min, lat_max, lon_min, lon_max)
+    """
+    if isinstance(region, str):
+        try:
+            region = read_regions()[region]
+        except KeyError:
+            raise ValueError(f"E: region {region} not defined")
+    if len(region) != 4 or region[0] > region[1]:
+        raise ValueError(
+            f"E: region {region} should be (lat_min, lat_max, lon_min, lon_max)"
+        )
+    return tuple(float(x) for x in region)
+
+
+def lon_in_range(lon, lon_min, lon_max):
+    """Returns mask of longitudes inside range, range can cross the
+    0 meridian.
+
+    :meta private:
+    """
+    if lon_max - lon_min >= 360:
+        return np.ones(np.shape(lon), dtype=bool)
+    return (np.asarray(lon) - lon_min) % 360 <= (lon_max - lon_min) % 360
+
+
+def index_selection(mask):
+    """Returns selection of True values of a 1D mask: a slice if they
+    are contiguous, otherwise an array of indices. Indices of a periodic
+    axis crossing the end of the axis start after the gap.
+
+    :meta private:
+    """
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        raise ValueError("E: region does not include any grid point")
+    gaps = np.flatnonzero(np.diff(idx) > 1)
+    if gaps.size == 0:
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    if gaps.size == 1 and idx[0] == 0 and idx[-1] == mask.size - 1:
+        return np.roll(idx, -(gaps[0] + 1))
+    return idx
+
+
+def region_indexers(lat, lon, region, ydim, xdim):
+    """Returns indexers selecting region on a grid.
+
+    For regular grids latitude and longitude are selected
+    independently, for curvilinear grids the selection is the smallest
+    rectangle of indices including all grid points inside the region.
+
+    Parameters
+    ----------
+    lat : numpy.ndarray
+        Latitude of grid centres, 1D or 2D
+    lon : numpy.ndarray
+        Longitude of grid centres, same dimensions as lat
+    region : str or sequence
+        Region name or bounding box, see get_region
+    ydim : str
+        Name of y dimension
+    xdim : str
+        Name of x dimension
+
+    Returns
+    -------
+    indexers : dict
+        Dictionary of dimension and slice or array of indices, to pass
+        to Dataset.isel
+    """
+    lat_min, lat_max, lon_min, lon_max = get_region(region)
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    inlat = (lat >= lat_min) & (lat <= lat_max)
+    inlon = lon_in_range(lon, lon_min, lon_max)
+    if lat.ndim == 1:
+        rows, cols = inlat, inlon
+    else:
+        mask = inlat & inlon
+        rows, cols = mask.any(axis=1), mask.any(axis=0)
+    return {ydim: index_selection(rows), xdim: index_selection(cols)}
+
+
+def coord_indexers(ds, region):
+    """Returns indexers selecting region for all the regular latitude
+    and longitude dimensions of a dataset, as lat and lat_v for UM
+    output.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset, only its coordinates are read
+    region : str or sequence
+        Region name or bounding box, see get_region
+
+    Returns
+    -------
+    indexers : dict
+        Dictionary of dimension and slice or array of indices
+    """
+    lat_min, lat_max, lon_min, lon_max = get_region(region)
+    indexers = {}
+    for dim in ds.dims:
+        if dim not in ds.coords:
+            continue
+        coord = ds[dim]
+        name = coord.attrs.get("standard_name", dim)
+        units = coord.attrs.get("units", "")
+        if name.startswith("lat") or units == "degrees_north":
+            values = coord.values
+            indexers[dim] = index_selection((values >= lat_min) & (values <= lat_max))
+        elif name.startswith("lon") or units == "degrees_east":
+            indexers[dim] = index_selection(
+                lon_in_range(coord.values, lon_min, lon_max)
+            )
+    return indexers
+
+
+def level_indexers(ds, level_range, zdims=None):
+    """Returns indexers selecting levels with values inside a range,
+    inclusive, for the vertical dimensions of a dataset.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset, only its coordinates are read
+    level_range : tuple
+        (min, max) values of vertical coordinate, as model level
+        numbers, pressure or depth in the coordinate units
+    zdims : list(str)
+        Vertical dimensions, by default coordinates with axis Z or
+        positive attribute, in which case dimensions without levels in
+        range (as soil depth for model levels) are left unselected
+
+    Returns
+    -------
+    indexers : dict
+        Dictionary of dimension and slice or array of indices
+    """
+    guessed = zdims is None
+    if guessed:
+        zdims = [
+            d
+            for d in ds.dims
+            if d in ds.coords
+            and (ds[d].attrs.get("axis") == "Z" or "positive" in ds[d].attrs)
+        ]
+    low, high = min(level_range), max(level_range)
+    indexers = {}
+    for dim in zdims:
+        if dim in ds.coords:
+            values = ds[dim].values
+            mask = (values >= low) & (values <= high)
+            if guessed and not mask.any():
+                continue
+            indexers[dim] = index_selection(mask)
+    return indexers
+
+
+def subset(ds, indexers):
+    """Applies indexers to the dimensions available in dataset, used as
+    preprocess function when opening files. Longitudes of a region
+    crossing the end of the axis are made monotonic.
+
+    :meta private:
+    """
+    indexers = {k: v for k, v in indexers.items() if k in ds.dims}
+    ds = ds.isel(indexers)
+    for dim, sel in indexers.items():
+        if isinstance(sel, slice) or dim not in ds.coords:
+            continue
+        coord = ds[dim]
+        if coord.attrs.get("units") == "degrees_east" or dim.startswith("lon"):
+            shift = np.unwrap(coord.values, period=360) - coord.values
+            ds = ds.assign_coords({dim: coord.copy(data=coord.values + shift)})
+            bname = coord.attrs.get("bounds")
+            if bname in ds.variables:
+                shift = xr.DataArray(shift, dims=dim)
+                ds[bname] = ds[bname] + shift
+    return ds
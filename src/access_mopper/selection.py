@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains the opening of the input files of a variable with
+# the selection of region, times and levels applied to each file, so
+# only the selection is read.
+
+import glob
+import os
+import re
+from functools import partial
+
+import xarray as xr
+
+from access_mopper.calc_time import filter_files, time_indexer
+from access_mopper.regions import coord_indexers, level_indexers, subset
+from access_mopper.tar_reader import is_tar_path, open_tar_dataset
+from access_mopper.tile_reader import is_tile_file, open_tiled_dataset
+from access_mopper.um_reader import is_um_file, open_um_dataset
+
+# names of time and horizontal dimensions in mappings listing dimensions
+# without their axis
+NOT_VERTICAL = re.compile(r"^(time|lat|lon|(grid_)?[xy][tu]_ocean$|n[ij]$)")
+
+
+def select(
+    ds, indexers=None, region=None, time_range=None, level_range=None, zdims=None
+):
+    """Selects region, times and levels from a file dataset before its
+    variables are read, used as preprocess function when opening files.
+
+    :meta private:
+    """
+    indexers = dict(indexers or {})
+    if region is not None:
+        indexers.update(coord_indexers(ds, region))
+    if time_range is not None:
+        indexers.update(time_indexer(ds, time_range))
+    if level_range is not None:
+        indexers.update(level_indexers(ds, level_range, zdims))
+    return subset(ds, indexers)
+
+
+def open_selection(file_paths, time_range=None, variables=None, axes=None, **kwargs):
+    """Opens files lazily, after discarding files outside time range,
+    selecting region, times and levels on each file so only the
+    selection is read. For UM files only the fields in variables (by
+    default all) are opened, for MOM tile files axes are the global
+    axes of missing tiles, see `open_tiles`. See `select` for the other
+    arguments.
+
+    :meta private:
+    """
+    if isinstance(file_paths, (str, os.PathLike)):
+        if is_tar_path(file_paths):
+            file_paths = [str(file_paths)]
+        else:
+            file_paths = sorted(glob.glob(str(file_paths)))
+    preprocess = partial(select, time_range=time_range, **kwargs)
+    # netCDF members of tar archives (archive.tar::pattern) are read in
+    # place, members outside the time range are dropped after reading
+    # only their time axis
+    if file_paths and all(is_tar_path(f) for f in file_paths):
+        return open_tar_dataset(file_paths, preprocess, decode_times=False)
+    # UM fieldsfiles and PP files are read directly, records outside the
+    # selection are never read
+    if file_paths and all(is_um_file(f) for f in file_paths):
+        ds = open_um_dataset(list(file_paths), variables=variables)
+        return select(ds, time_range=time_range, **kwargs)
+    # MOM tile files are stitched lazily, without mppnccombine
+    if file_paths and all(is_tile_file(f) for f in file_paths):
+        ds = open_tiled_dataset(file_paths, axes=axes)
+        return select(ds, time_range=time_range, **kwargs)
+    if time_range is not None:
+        file_paths = filter_files(file_paths, time_range)
+        if not file_paths:
+            raise ValueError(f"No input files for time range {time_range}")
+    return xr.open_mfdataset(
+        file_paths, combine="by_coords", decode_times=False, preprocess=preprocess
+    )
+
+
+def vertical_dims(mapping):
+    """Returns model vertical dimensions from a variable mapping, or None
+    if the mapping has none.
+
+    Mappings list dimensions either as a dictionary of dimension and
+    axis, or as a list of dimension names, in which case dimensions
+    which are not time, latitude or longitude by name are vertical.
+
+    :meta private:
+    """
+    dims = mapping["dimensions"]
+    if isinstance(dims, dict):
+        zdims = [
+            d
+            for d, axis in dims.items()
+            if axis not in ("time", "latitude", "longitude")
+        ]
+    else:
+        zdims = [d for d in dims if not NOT_VERTICAL.match(d)]
+    return zdims or None
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains the extraction of values at fixed sites, as for the
+# sub-hourly site tables (CFsubhr, Esubhr), from the nearest grid point.
+
+from functools import lru_cache
+
+import numpy as np
+import xarray as xr
+from scipy.spatial import cKDTree
+
+from access_mopper.ocean_supergrid import R_EARTH, Supergrid, lonlat_to_xyz
+
+
+class SiteIndex:
+    """Nearest grid point index over the centres of a grid.
+
+    The KD-tree is built on the cartesian coordinates of the grid
+    centres on the unit sphere, where the nearest point by chord is also
+    the nearest by great circle distance, so longitude wrapping and
+    poles need no special treatment.
+
+    Parameters
+    ----------
+    lat : numpy.ndarray
+        Latitude of grid centres, 1D for regular grids or 2D for
+        curvilinear grids
+    lon : numpy.ndarray
+        Longitude of grid centres, same dimensions as lat
+    """
+
+    def __init__(self, lat, lon):
+        lat = np.asarray(lat)
+        lon = np.asarray(lon)
+        if lat.ndim == 1:
+            lon, lat = np.meshgrid(lon, lat)
+        self.shape = lat.shape
+        self.tree = cKDTree(lonlat_to_xyz(lon.ravel(), lat.ravel()))
+
+    def query(self, site_lat, site_lon):
+        """Returns indexes of the grid points nearest to sites, all sites
+        are resolved with one query.
+
+        Parameters
+        ----------
+        site_lat : array_like
+            Latitude of sites
+        site_lon : array_like
+            Longitude of sites
+
+        Returns
+        -------
+        j : numpy.ndarray
+            Index along y (latitude) of nearest points
+        i : numpy.ndarray
+            Index along x (longitude) of nearest points
+        distance : numpy.ndarray
+            Great circle distance of sites from nearest points (m)
+        """
+        chord, idx = self.tree.query(lonlat_to_xyz(site_lon, site_lat))
+        distance = 2 * R_EARTH * np.arcsin(np.minimum(chord / 2, 1))
+        j, i = np.unravel_index(idx, self.shape)
+        return j, i, distance
+
+
+@lru_cache(maxsize=None)
+def get_site_index(lat, lon):
+    """Returns site index for a regular grid, built once per process
+    for each grid.
+
+    Parameters
+    ----------
+    lat : tuple
+        Latitude axis of grid
+    lon : tuple
+        Longitude axis of grid
+
+    Returns
+    -------
+    index : SiteIndex
+    """
+    return SiteIndex(np.array(lat, dtype="float64"), np.array(lon, dtype="float64"))
+
+
+@lru_cache(maxsize=None)
+def get_ocean_site_index(supergrid_file):
+    """Returns site index for T cells of the ocean tripolar grid
+    defined by supergrid file.
+
+    Parameters
+    ----------
+    supergrid_file : str
+        Path of MOM supergrid file (ocean_hgrid.nc)
+
+    Returns
+    -------
+    index : SiteIndex
+    """
+    grid = Supergrid(supergrid_file)
+    return SiteIndex(grid.yt.values, grid.xt.values)
+
+
+def extract_sites(var, index, site_lat, site_lon, ydim=None, xdim=None):
+    """Returns variable at the grid points nearest to sites.
+
+    Only the rows and columns including a site are read from the
+    variable, with orthogonal indexing which xarray passes to the
+    lazy backend, then sites are selected from this subset. The time
+    dimension and its chunks are left unchanged.
+
+    Parameters
+    ----------
+    var : xarray.DataArray
+        Variable with y and x as last two dimensions
+    index : SiteIndex
+        Site index of variable grid
+    site_lat : array_like
+        Latitude of sites
+    site_lon : array_like
+        Longitude of sites
+    ydim : str
+        Name of y dimension (default second to last dimension)
+    xdim : str
+        Name of x dimension (default last dimension)
+
+    Returns
+    -------
+    vout : xarray.DataArray
+        Variable with y and x dimensions replaced by site, site
+        coordinates and distance from grid points as coordinates
+    """
+    ydim = ydim or var.dims[-2]
+    xdim = xdim or var.dims[-1]
+    j, i, distance = index.query(site_lat, site_lon)
+    rows, jpos = np.unique(j, return_inverse=True)
+    cols, ipos = np.unique(i, return_inverse=True)
+    subset = var.isel({ydim: rows, xdim: cols})
+    vout = subset.isel(
+        {ydim: xr.DataArray(jpos, dims="site"), xdim: xr.DataArray(ipos, dims="site")}
+    )
+    vout = vout.drop_vars([ydim, xdim], errors="ignore")
+    vout = vout.assign_coords(
+        site=np.arange(len(j)),
+        site_lat=("site", np.asarray(site_lat, dtype="float64")),
+        site_lon=("site", np.asarray(site_lon, dtype="float64")),
+        distance=("site", distance, {"units": "m"}),
+    )
+    vout.attrs = var.attrs
+    return vout
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains a reader for netCDF files archived in tar files. The
+# offset and size of each member are indexed once, then members are
+# opened in place from a memory map of the archive, so only the byte
+# ranges used are read and nothing is extracted to disk.
+
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import tarfile
+from functools import lru_cache
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from access_mopper._config import CACHE_DIR
+
+# separates archive path and member name or pattern in an input path
+TAR_SEP = "::"
+
+
+def _index_fname(path, cache_dir):
+    """Returns path of file storing archive index, archives are too big
+    to hash so the key is their path, size and modification time.
+
+    :meta private:
+    """
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime}"
+    md5 = hashlib.md5(key.encode()).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, "tar", f"{md5}.json")
+
+
+class TarArchive:
+    """Index of the members of an uncompressed tar archive and in place
+    access to their content.
+
+    The index (member name to data offset and size) is built reading
+    only the tar headers and saved in CACHE_DIR/tar, so later runs do
+    not scan the archive again.
+
+    Parameters
+    ----------
+    path : str
+        Path of tar archive
+    cache_dir : str
+        Root directory of the index store (default CACHE_DIR)
+
+    Raises
+    ------
+    ValueError
+        If archive is compressed, as members cannot be read in place
+    """
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        fname = _index_fname(path, cache_dir)
+        if os.path.isfile(fname):
+            with open(fname) as f:
+                self.members = json.load(f)
+        else:
+            self.members = self.build_index()
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+            tmpname = f"{fname}.{os.getpid()}.tmp"
+            with open(tmpname, "w") as f:
+                json.dump(self.members, f)
+            os.replace(tmpname, fname)
+        self._mmap = None
+
+    def build_index(self):
+        """Returns dictionary of member name and (offset, size) of its
+        data, reading only the tar headers.
+
+        :meta private:
+        """
+        try:
+            tar = tarfile.open(self.path, mode="r:")
+        except tarfile.ReadError:
+            raise ValueError(f"E: {self.path} is not an uncompressed tar archive")
+        with tar:
+            return {m.name: [m.offset_data, m.size] for m in tar if m.isfile()}
+
+    def names(self, pattern="*"):
+        """Returns sorted names of members matching a glob pattern."""
+        return sorted(fnmatch.filter(self.members, pattern))
+
+    def view(self, name):
+        """Returns read-only view of a member content, pages are read from
+        disk only when accessed.
+
+        Parameters
+        ----------
+        name : str
+            Member name
+
+        Returns
+        -------
+        view : numpy.ndarray
+            Bytes of member, without copy
+        """
+        offset, size = self.members[name]
+        # the archive is mapped once and stays mapped while views exist
+        if self._mmap is None:
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return np.frombuffer(self._mmap, dtype="u1", count=size, offset=offset)
+
+    def open_dataset(self, name, **kwargs):
+        """Opens a netCDF member in place as a lazy Dataset.
+
+        Parameters
+        ----------
+        name : str
+            Member name
+        kwargs : dict
+            Passed to xarray.open_dataset, as decode_times
+
+        Returns
+        -------
+        ds : xarray.Dataset
+        """
+        nc = netCDF4.Dataset(name, mode="r", memory=self.view(name))
+        kwargs.setdefault("chunks", {})
+        return xr.open_dataset(xr.backends.NetCDF4DataStore(nc), **kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_archive(path):
+    """Returns archive index, one per archive and process.
+
+    Parameters
+    ----------
+    path : str
+        Path of tar archive
+
+    Returns
+    -------
+    archive : TarArchive
+    """
+    return TarArchive(path)
+
+
+def is_tar_path(path):
+    """Returns True if path refers to tar archive members, as
+    archive.tar::output*/ocean/ocean_month.nc
+
+    :meta private:
+    """
+    return TAR_SEP in str(path)
+
+
+def tar_members(paths):
+    """Returns (archive, member name) of the members matching a list of
+    archive.tar::pattern paths, in order.
+
+    Parameters
+    ----------
+    paths : list(str)
+        Paths as archive.tar::pattern, pattern is a glob pattern of
+        member names
+
+    Returns
+    -------
+    members : list(tuple)
+    """
+    members = []
+    for path in paths:
+        tarpath, pattern = str(path).split(TAR_SEP, 1)
+        archive = get_archive(tarpath)
+        members.extend((archive, name) for name in archive.names(pattern))
+    return members
+
+
+def open_tar_dataset(paths, preprocess=None, **kwargs):
+    """Opens netCDF members of tar archives in place and combines them
+    by coordinates, as xarray.open_mfdataset does for files.
+
+    Parameters
+    ----------
+    paths : list(str)
+        Paths as archive.tar::pattern, see `tar_members`
+    preprocess : callable
+        Function applied to each member dataset before combining, members
+        with an empty time selection are skipped
+    kwargs : dict
+        Passed to xarray.open_dataset
+
+    Returns
+    -------
+    ds : xarray.Dataset
+
+    Raises
+    ------
+    ValueError
+        If no member matches paths
+    """
+    parts = []
+    for archive, name in tar_members(paths):
+        ds = archive.open_dataset(name, **kwargs)
+        if preprocess is not None:
+            ds = preprocess(ds)
+        if all(ds.sizes.values()):
+            parts.append(ds)
+    if not parts:
+        raise ValueError(f"E: no archive members selected from {paths}")
+    if len(parts) == 1:
+        return parts[0]
+    return xr.combine_by_coords(
+        parts, data_vars="minimal", coords="minimal", compat="override"
+    )
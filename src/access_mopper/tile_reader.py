@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains a reader for the per-processor tile files written by
+# FMS models (MOM5), as ocean_month.nc.0000, ocean_month.nc.0001, ...
+# Tiles are stitched lazily into global arrays using the
+# domain_decomposition attribute of their axes, as mppnccombine does, so
+# each dask chunk is read from one tile file.
+
+import re
+from collections import defaultdict
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+TILE_SUFFIX = re.compile(r"\.(\d{4,})$")
+
+
+def is_tile_file(path):
+    """Returns True if file name ends with a tile number, as .0003
+
+    :meta private:
+    """
+    return TILE_SUFFIX.search(str(path)) is not None
+
+
+def tile_position(ds):
+    """Returns position of tile in the global domain, as dictionary of
+    decomposed dimension and (start, end) 0-based global indices, and
+    the global size of each decomposed dimension.
+
+    The domain_decomposition attribute of an axis is
+    [global start, global end, local start, local end], 1-based.
+
+    :meta private:
+    """
+    position, sizes = {}, {}
+    for dim in ds.dims:
+        if dim in ds.variables and "domain_decomposition" in ds[dim].attrs:
+            gstart, gend, lstart, lend = ds[dim].attrs["domain_decomposition"]
+            position[dim] = (int(lstart) - 1, int(lend))
+            sizes[dim] = int(gend) - int(gstart) + 1
+    return position, sizes
+
+
+def block_layout(extents, size):
+    """Returns (start, end) of the blocks of a decomposed dimension over
+    its global size: the tiles extents, with the gaps left by missing
+    tiles (land only processors) split in blocks of the most common
+    tile size.
+
+    :meta private:
+    """
+    extents = sorted(extents)
+    lengths = [end - start for start, end in extents]
+    step = max(set(lengths), key=lengths.count)
+    blocks, pos = [], 0
+    for start, end in extents + [(size, size)]:
+        while pos < start:
+            blocks.append((pos, min(pos + step, start)))
+            pos = blocks[-1][1]
+        if start < size:
+            blocks.append((start, end))
+            pos = end
+    return blocks
+
+
+def _stitch(var, tiles, dims, starts, ends, prefix=()):
+    """Concatenates tiles of a variable along decomposed dimensions,
+    missing tiles (land only processors) are filled with NaN.
+
+    :meta private:
+    """
+    dim = dims[len(prefix)]
+    blocks = []
+    for start, end in zip(starts[dim], ends[dim]):
+        key = prefix + (start,)
+        if len(key) < len(dims):
+            blocks.append(_stitch(var, tiles, dims, starts, ends, key))
+        elif key in tiles:
+            blocks.append(tiles[key])
+        else:
+            shape = list(var.shape)
+            for d, s in zip(dims, key):
+                i = starts[d].index(s)
+                shape[var.get_axis_num(d)] = ends[d][i] - s
+            blocks.append(da.full(shape, np.nan, dtype=np.result_type(var.dtype, "f4")))
+    return da.concatenate(blocks, axis=var.get_axis_num(dim))
+
+
+def open_tiles(files, decode_times=False, axes=None):
+    """Opens the tile files of one output file as a lazy Dataset on the
+    global domain, without combining them first.
+
+    Tiles of land only processors are not written, so their blocks are
+    filled with NaN and their axis values taken from the global axes.
+
+    Parameters
+    ----------
+    files : list(str)
+        Tile files of one output file, as ocean_month.nc.0000, ...
+    decode_times : bool
+        Passed to xarray.open_dataset (default False)
+    axes : dict
+        Global values of decomposed dimensions, as xt_ocean, needed
+        only if tiles are missing, see `Supergrid.mom_axes` (default
+        None)
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        Dataset on global domain, each dask chunk of a decomposed
+        variable is read from one tile file
+
+    Raises
+    ------
+    ValueError
+        If files have no domain decomposition, or tiles are missing
+        and the global values of their axes are not passed
+    """
+    tiles = [
+        xr.open_dataset(f, decode_times=decode_times, chunks={}) for f in sorted(files)
+    ]
+    positions = [tile_position(ds) for ds in tiles]
+    sizes = positions[0][1]
+    if not sizes:
+        raise ValueError(f"E: {files[0]} has no domain decomposition")
+    # blocks along each dimension, from the tiles extents
+    edges = defaultdict(set)
+    for position, _ in positions:
+        for dim, edge in position.items():
+            edges[dim].add(edge)
+    blocks = {d: block_layout(e, sizes[d]) for d, e in edges.items()}
+    starts = {d: [s for s, _ in b] for d, b in blocks.items()}
+    ends = {d: [e for _, e in b] for d, b in blocks.items()}
+    # global axes, filled from the tiles including them
+    coords = {}
+    for dim in sizes:
+        coord = tiles[0][dim]
+        values = np.full(sizes[dim], np.nan, dtype=np.result_type(coord.dtype, "f4"))
+        for ds, (position, _) in zip(tiles, positions):
+            start, end = position[dim]
+            values[start:end] = ds[dim].values
+        missing = np.isnan(values)
+        if missing.any():
+            if axes is None or dim not in axes:
+                raise ValueError(
+                    f"E: {dim} of missing tiles of {files[0]} not defined, "
+                    + "pass the global axes"
+                )
+            values[missing] = np.asarray(axes[dim])[missing]
+        attrs = {k: v for k, v in coord.attrs.items() if k != "domain_decomposition"}
+        coords[dim] = (dim, values, attrs)
+    data_vars = {}
+    for name, var in tiles[0].data_vars.items():
+        dims = [d for d in var.dims if d in sizes]
+        if not dims:
+            data_vars[name] = var
+            continue
+        data = {
+            tuple(position[d][0] for d in dims): ds[name].data
+            for ds, (position, _) in zip(tiles, positions)
+        }
+        data = _stitch(var, data, dims, starts, ends)
+        data_vars[name] = (var.dims, data, var.attrs)
+    out = xr.Dataset(data_vars, coords=coords)
+    for name, coord in tiles[0].coords.items():
+        if name not in out.coords and not set(coord.dims) & set(sizes):
+            out = out.assign_coords({name: coord})
+    out.attrs = {k: v for k, v in tiles[0].attrs.items() if k != "NumFilesInSet"}
+    return out
+
+
+def open_tiled_dataset(files, decode_times=False, axes=None):
+    """Opens tile files of one or more output files, as a series of
+    ocean_month.nc.XXXX files, concatenating output files by time.
+
+    Parameters
+    ----------
+    files : list(str)
+        Tile files
+    decode_times : bool
+        Passed to xarray.open_dataset (default False)
+    axes : dict
+        Global values of decomposed dimensions, see `open_tiles`
+        (default None)
+
+    Returns
+    -------
+    ds : xarray.Dataset
+    """
+    groups = defaultdict(list)
+    for f in files:
+        groups[TILE_SUFFIX.sub("", str(f))].append(f)
+    parts = [open_tiles(groups[k], decode_times, axes) for k in sorted(groups)]
+    if len(parts) == 1:
+        return parts[0]
+    return xr.combine_by_coords(
+        parts, data_vars="minimal", coords="minimal", compat="override"
+    )
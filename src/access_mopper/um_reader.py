@@ -0,0 +1,619 @@
+#!/usr/bin/env python
+# Copyright 2024 ARC Centre of Excellence for Climate Extremes
+# author: Paola Petrelli <paola.petrelli@utas.edu.au>
+# author: Sam Green <sam.green@unsw.edu.au>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# This is the ACCESS Model Output Post Processor, derived from the APP4
+# originally written for CMIP5 by Peter Uhe and dapted for CMIP6 by Chloe Mackallah
+# ( https://doi.org/10.5281/zenodo.7703469 )
+#
+# last updated 10/10/2024
+#
+# This file contains a reader for UM fieldsfiles and PP files. The lookup
+# headers of a file are indexed once, then fields are exposed as lazy
+# dask arrays, with one task per record, named as in um2nc output
+# (fld_s03i236), so only the records used are read from the file.
+
+import os
+import warnings
+from functools import lru_cache
+
+import dask
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from access_mopper.calc_atmos import MODEL_LEVELS, get_level_coeffs
+from access_mopper.calc_time import days_from_date
+
+# Global Variables
+# ----------------------------------------------------------------------
+
+# lookup header names, 45 integers followed by 19 reals (UMDP F3)
+LOOKUP_INT = [
+    "lbyr", "lbmon", "lbdat", "lbhr", "lbmin", "lbsec",
+    "lbyrd", "lbmond", "lbdatd", "lbhrd", "lbmind", "lbsecd",
+    "lbtim", "lbft", "lblrec", "lbcode", "lbhem", "lbrow", "lbnpt", "lbext",
+    "lbpack", "lbrel", "lbfc", "lbcfc", "lbproc", "lbvc", "lbrvc", "lbexp",
+    "lbegin", "lbnrec", "lbproj", "lbtyp", "lblev", "lbrsvd1", "lbrsvd2",
+    "lbrsvd3", "lbrsvd4", "lbsrce", "lbuser1", "lbuser2", "lbuser3",
+    "lbuser4", "lbuser5", "lbuser6", "lbuser7",
+]  # fmt: skip
+LOOKUP_REAL = [
+    "bulev", "bhulev", "brsvd3", "brsvd4", "bdatum", "bacc", "blev", "brlev",
+    "bhlev", "bhrlev", "bplat", "bplon", "bgor", "bzy", "bdy", "bzx", "bdx",
+    "bmdi", "bmks",
+]  # fmt: skip
+# calendar from fixed header word 8 and from lbtim IC digit
+FF_CALENDARS = {1: "proleptic_gregorian", 2: "360_day", 3: "noleap"}
+PP_CALENDARS = {1: "proleptic_gregorian", 2: "360_day", 4: "noleap"}
+# level dimension by lbvc, model levels (65) are named by their type,
+# see `model_level_type`
+LEVEL_DIMS = {
+    1: "height",
+    2: "depth",
+    8: "pressure",
+}
+# offset of P points from the grid origin (-90, 0) in grid spacings, by
+# grid staggering (fixed header word 9): New Dynamics (3) P points are
+# on the origin, ENDGame (6) P points are at the cells centre. PP files
+# have no fixed header and are New Dynamics, as ACCESS-ESM1.5
+P_GRID_OFFSET = {3: 0.0, 6: 0.5}
+TIME_UNITS = "days since 0001-01-01 00:00:00"
+# name suffix of fields by lbproc, as um2nc
+LBPROC_SUFFIX = {4096: "_min", 8192: "_max"}
+# ----------------------------------------------------------------------
+
+
+def is_um_file(path):
+    """Returns True if file is a UM fieldsfile or PP file, from its
+    first bytes, rather than a netCDF file.
+
+    :meta private:
+    """
+    with open(path, "rb") as f:
+        start = f.read(8)
+    if start[:3] == b"CDF" or start[:4] == b"\x89HDF":
+        return False
+    ff_version = int.from_bytes(start, "big", signed=True)
+    reclen = int.from_bytes(start[:4], "big")
+    return ff_version in (3, 20) or reclen in (256, 512)
+
+
+def _ff_lookup(path):
+    """Returns lookup table and calendar of a fieldsfile, headers are
+    64-bit words.
+
+    :meta private:
+    """
+    with open(path, "rb") as f:
+        fixed = np.fromfile(f, dtype=">i8", count=256)
+        start, length, count = fixed[149:152]
+        f.seek((start - 1) * 8)
+        words = np.fromfile(f, dtype=">i8", count=length * count)
+    words = words.reshape(count, length)[:, :64]
+    # unused entries at the end of the table are filled with -99
+    words = words[words[:, 28] > 0]
+    reals = words[:, 45:].view(">f8")
+    calendar = FF_CALENDARS.get(int(fixed[7]), "proleptic_gregorian")
+    staggering = int(fixed[8]) if int(fixed[8]) in P_GRID_OFFSET else 3
+    return words[:, :45], reals, words[:, 28] * 8, 8, calendar, staggering
+
+
+def _pp_lookup(path):
+    """Returns lookup table of a PP file, walking the headers of
+    the sequential records without reading the data.
+
+    :meta private:
+    """
+    size = os.path.getsize(path)
+    ints, reals, offsets = [], [], []
+    with open(path, "rb") as f:
+        pos = 0
+        while pos < size:
+            f.seek(pos)
+            reclen = int(np.fromfile(f, dtype=">i4", count=1)[0])
+            wsize = reclen // 64
+            header = np.fromfile(f, dtype=f">i{wsize}", count=64)
+            ints.append(header[:45])
+            reals.append(header[45:].view(f">f{wsize}"))
+            datalen = int(np.fromfile(f, dtype=">i4", count=2)[1])
+            offsets.append(pos + reclen + 12)
+            pos += reclen + datalen + 16
+    ints = np.array(ints, dtype="int64").reshape(-1, 45)
+    reals = np.array(reals, dtype="float64").reshape(-1, 19)
+    return ints, reals, np.array(offsets, dtype="int64"), wsize, None, 3
+
+
+@lru_cache(maxsize=None)
+def _read_index(path, mtime):
+    with open(path, "rb") as f:
+        ff_version = int.from_bytes(f.read(8), "big", signed=True)
+    if ff_version in (3, 20):
+        ints, reals, offsets, wsize, calendar, staggering = _ff_lookup(path)
+    else:
+        ints, reals, offsets, wsize, calendar, staggering = _pp_lookup(path)
+    index = {k: ints[:, i] for i, k in enumerate(LOOKUP_INT)}
+    index.update({k: reals[:, i] for i, k in enumerate(LOOKUP_REAL)})
+    index["offset"] = offsets
+    index["wsize"] = np.full(len(offsets), wsize)
+    if calendar is None:
+        ic = index["lbtim"] % 10
+        calendar = PP_CALENDARS.get(int(ic[0]) if ic.size else 1, "proleptic_gregorian")
+    index["calendar"] = calendar
+    index["staggering"] = staggering
+    return index
+
+
+def read_index(path):
+    """Returns index of the records of a UM fieldsfile or PP file. Only
+    the lookup headers are read, once per process unless the file is
+    modified.
+
+    Parameters
+    ----------
+    path : str
+        Path of fieldsfile or PP file
+
+    Returns
+    -------
+    index : dict
+        Dictionary of lookup header name and array of values for each
+        record, as lbuser4 (stash code), lblev, blev, plus offset (byte
+        offset of record data), wsize (word size), calendar and
+        staggering (fixed header word 9)
+    """
+    return _read_index(os.path.abspath(path), os.stat(path).st_mtime)
+
+
+def stash_name(stash):
+    """Returns variable name from stash code as in um2nc, fld_s03i236
+
+    :meta private:
+    """
+    return f"fld_s{stash // 1000:02d}i{stash % 1000:03d}"
+
+
+def _record_time(index, sel, calendar, data_time=False):
+    """Returns time of records in days from 0001-01-01, from T1 (lbyr,
+    lbmon, ...) or, if data_time, from T2 (lbyrd, lbmond, ...).
+
+    :meta private:
+    """
+    suffix = "d" if data_time else ""
+    keys = ("yr", "mon", "dat", "hr", "min", "sec")
+    t = [index[f"lb{k}{suffix}"][sel] for k in keys]
+    year, month, day = t[0], t[1], t[2]
+    days = days_from_date(year, month, day, calendar) - days_from_date(
+        1, 1, 1, calendar
+    )
+    # the 6th word is day number, not seconds, before lbrel 3
+    sec = np.where(index["lbrel"][sel] >= 3, t[5], 0)
+    return days + (t[3] * 3600 + t[4] * 60 + sec) / 86400.0
+
+
+def _staggered(first, step, offset):
+    """Returns True if the points of a grid axis are half a grid spacing
+    from the P points, as u points along longitude and v points along
+    latitude.
+
+    :meta private:
+    """
+    if step == 0:
+        return False
+    return abs((first / abs(step) - offset) % 1 - 0.5) < 0.25
+
+
+def model_level_type(heights):
+    """Returns type of UM model levels, theta or rho, whose heights
+    match best the levels height of a field, as um2nc names model
+    levels dimensions model_theta_level_number and
+    model_rho_level_number.
+
+    Parameters
+    ----------
+    heights : numpy.ndarray
+        Height of levels above sea level over flat surface (blev)
+
+    Returns
+    -------
+    levtype : str
+        Type of levels: theta or rho
+
+    :meta private:
+    """
+    errors = {}
+    for levtype in ("theta", "rho"):
+        for nlev in MODEL_LEVELS:
+            a, _ = get_level_coeffs(levtype, nlev)
+            error = np.abs(a[:, None] - heights).min(axis=0).max()
+            errors[levtype] = min(errors.get(levtype, np.inf), error)
+    return min(errors, key=errors.get)
+
+
+def _record_dtype(lbuser1, lbpack, wsize):
+    """Returns numpy dtype of record data, 32-bit if packed as such.
+    WGDOS packed fields are unpacked to reals of the file word size.
+
+    :meta private:
+    """
+    n1, n2 = lbpack % 10, (lbpack // 10) % 10
+    if n1 == 2:
+        wsize = 4
+    elif (n1 not in (0, 1) or n2 != 0) or (n1 == 1 and lbuser1 != 1):
+        raise ValueError(f"E: UM packing {lbpack} not supported, convert file first")
+    kind = {1: "f", 2: "i", 3: "i"}[lbuser1]
+    return np.dtype(f">{kind}{wsize}")
+
+
+def _ibm2ieee(words):
+    """Converts IBM 32-bit floats, stored as unsigned integers, to
+    float64.
+
+    :meta private:
+    """
+    words = np.asarray(words, dtype="uint32")
+    sign = np.where(words >> 31, -1.0, 1.0)
+    exponent = ((words >> 24) & 0x7F).astype("int64") - 64
+    fraction = (words & 0xFFFFFF) / 2.0**24
+    return sign * fraction * 16.0**exponent
+
+
+def _unpack_wgdos(packed, shape, bmdi):
+    """Unpacks a WGDOS packed field (lbpack N1 = 1, UMDP F3 appendix).
+
+    The field header is three 32-bit words: length of the packed field,
+    precision as a power of 2 and the number of columns and rows. Each
+    row has a two-word header, with its minimum (base) value as an IBM
+    float, bitmap flags, bits per value and the number of words of the
+    row data. The row data are the missing data, minimum value and zero
+    bitmaps present followed by the packed values of the other points,
+    as offsets from the base in units of the precision.
+
+    Parameters
+    ----------
+    packed : bytes
+        Packed field
+    shape : tuple
+        Number of rows and columns of field
+    bmdi : float
+        Missing data value
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Unpacked field as float64
+
+    :meta private:
+    """
+    words = np.frombuffer(packed, dtype=">u4")
+    precision = 2.0 ** int(words[1].astype("int32"))
+    ncol, nrow = int(words[2] >> 16), int(words[2] & 0xFFFF)
+    if (nrow, ncol) != tuple(shape):
+        raise ValueError(f"E: WGDOS field is {nrow}x{ncol}, expected {shape}")
+    data = np.empty(shape)
+    pos = 3
+    for row in range(nrow):
+        base = _ibm2ieee(words[pos])
+        flags, nwords = int(words[pos + 1] >> 16), int(words[pos + 1] & 0xFFFF)
+        pos += 2
+        bits = np.unpackbits(words[pos : pos + nwords].view("u1"))
+        pos += nwords
+        nbits = flags & 31
+        # bitmaps in order: missing data (32), minimum (64), zero (128)
+        # a set bit marks a missing or minimum value, a zero is unset
+        masks = {}
+        for flag in (32, 64, 128):
+            if flags & flag:
+                masks[flag], bits = bits[:ncol].astype(bool), bits[ncol:]
+        missing = masks.get(32, np.zeros(ncol, dtype=bool))
+        minimum = masks.get(64, np.zeros(ncol, dtype=bool))
+        zero = ~masks.get(128, np.ones(ncol, dtype=bool))
+        packed_pts = ~(missing | minimum | zero)
+        values = np.full(ncol, base)
+        npacked = int(packed_pts.sum())
+        if nbits > 0 and npacked > 0:
+            offsets = bits[: npacked * nbits].reshape(npacked, nbits)
+            offsets = offsets @ (1 << np.arange(nbits - 1, -1, -1, dtype="int64"))
+            values[packed_pts] = base + offsets * precision
+        values[zero] = 0.0
+        values[missing] = bmdi
+        data[row] = values
+    return data
+
+
+def _read_record(path, offset, shape, dtype, bmdi, packed=False):
+    """Reads one record, called by dask. WGDOS packed records are
+    unpacked.
+
+    :meta private:
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        if packed:
+            nwords = int(np.fromfile(f, dtype=">i4", count=1)[0])
+            f.seek(offset)
+            data = _unpack_wgdos(f.read(nwords * 4), shape, bmdi)
+        else:
+            data = np.fromfile(f, dtype=dtype, count=shape[0] * shape[1])
+    data = data.reshape(shape).astype(dtype.newbyteorder("="))
+    if dtype.kind == "f":
+        data[data == bmdi] = np.nan
+    return data
+
+
+def um_variable(path, stash, lbproc=None):
+    """Returns a field of a UM file as a lazy Dataset, only the records
+    of the field selected are read when computed.
+
+    Parameters
+    ----------
+    path : str
+        Path of fieldsfile or PP file
+    stash : int
+        Stash code as section * 1000 + item
+    lbproc : int
+        Processing code to select if field is saved with more than one,
+        e.g. 128 for time mean (default None)
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        Field with dimensions (time, [level], lat, lon) and, for time
+        means, its time bounds. Axes are named as in um2nc output:
+        lat_v and lon_u on v and u points, model_theta_level_number
+        and model_rho_level_number for model levels, with their level
+        height and sigma
+
+    Raises
+    ------
+    ValueError
+        If field is not in file, is on more than one grid, processing
+        is ambiguous or packing is not supported
+    """
+    index = read_index(path)
+    calendar = index["calendar"]
+    sel = index["lbuser4"] == stash
+    if lbproc is not None:
+        sel &= index["lbproc"] == lbproc
+    sel = np.flatnonzero(sel)
+    name = stash_name(stash)
+    if sel.size == 0:
+        raise ValueError(f"E: {name} not in {path}")
+    if np.unique(index["lbproc"][sel]).size > 1:
+        raise ValueError(
+            f"E: {name} saved with lbproc {np.unique(index['lbproc'][sel])}, "
+            + "select one with lbproc"
+        )
+    grid = [index[k][sel] for k in ("lbrow", "lbnpt", "bzy", "bdy", "bzx", "bdx")]
+    if any(np.unique(g).size > 1 for g in grid):
+        raise ValueError(f"E: {name} is defined on more than one grid")
+    nrow, npt, bzy, bdy, bzx, bdx = (g[0] for g in grid)
+    first = sel[0]
+    time = _record_time(index, sel, calendar)
+    lbvc = int(index["lbvc"][first])
+    if lbvc in (1, 2, 8):
+        level = index["blev"][sel]
+    elif np.unique(index["lbuser5"][sel]).size > 1:
+        lbvc = None
+        level = index["lbuser5"][sel]
+    else:
+        level = index["lblev"][sel]
+    times, tpos = np.unique(time, return_inverse=True)
+    levels, lpos = np.unique(level, return_inverse=True)
+    if lbvc == 8:
+        # pressure levels from the surface
+        levels, lpos = levels[::-1], levels.size - 1 - lpos
+    if times.size * levels.size != sel.size:
+        raise ValueError(f"E: {name} records do not fill the time and level axes")
+    # hybrid height terms of model levels
+    heights, sigma = np.zeros(levels.size), np.zeros(levels.size)
+    heights[lpos], sigma[lpos] = index["blev"][sel], index["bhlev"][sel]
+    # records ordered by time then level
+    sel = sel[np.lexsort((lpos, tpos))]
+    lbpack = int(index["lbpack"][first])
+    dtype = _record_dtype(int(index["lbuser1"][first]), lbpack, index["wsize"][0])
+    packed = lbpack % 10 == 1
+    read = dask.delayed(_read_record, pure=True)
+    records = [
+        da.from_delayed(
+            read(
+                path,
+                int(index["offset"][i]),
+                (nrow, npt),
+                dtype,
+                index["bmdi"][i],
+                packed,
+            ),
+            shape=(nrow, npt),
+            dtype=dtype.newbyteorder("="),
+        )
+        for i in sel
+    ]
+    data = da.stack(records).reshape(times.size, levels.size, nrow, npt)
+    tattrs = {"units": TIME_UNITS, "calendar": calendar, "axis": "T"}
+    lat = bzy + bdy * np.arange(1, nrow + 1)
+    lon = bzx + bdx * np.arange(1, npt + 1)
+    offset = P_GRID_OFFSET[index["staggering"]]
+    latdim = "lat_v" if _staggered(lat[0] + 90, bdy, offset) else "lat"
+    londim = "lon_u" if _staggered(lon[0], bdx, offset) else "lon"
+    coords = {
+        latdim: (latdim, lat, {"units": "degrees_north"}),
+        londim: (londim, lon, {"units": "degrees_east"}),
+    }
+    data_vars = {}
+    # time means (lbtim IB=2): T1 (lbyr, ...) is the start and T2 (lbyrd,
+    # ...) the end of the meaning period
+    if (index["lbtim"][first] // 10) % 10 == 2:
+        end = _record_time(index, sel[:: levels.size], calendar, data_time=True)
+        data_vars["time_bnds"] = (("time", "bnds"), np.stack([times, end], -1))
+        tattrs["bounds"] = "time_bnds"
+        times = 0.5 * (times + end)
+    coords["time"] = ("time", times, tattrs)
+    dims = ["time", "level", latdim, londim]
+    if levels.size == 1 and lbvc not in (8, None):
+        data = data[:, 0]
+        dims.remove("level")
+    elif lbvc == 65:
+        levtype = model_level_type(heights)
+        zdim = f"model_{levtype}_level_number"
+        dims[1] = zdim
+        coords[zdim] = (zdim, levels, {"positive": "up"})
+        coords[f"{levtype}_level_height"] = (zdim, heights, {"units": "m"})
+        coords[f"sigma_{levtype}"] = (zdim, sigma)
+    else:
+        zdim = LEVEL_DIMS.get(lbvc, "pseudo_level")
+        dims[1] = zdim
+        attrs = {"positive": "down" if lbvc in (2, 8) else "up"}
+        if lbvc == 8:
+            levels, attrs["units"] = levels * 100.0, "Pa"
+        coords[zdim] = (zdim, levels, attrs)
+    attrs = {"stash_code": stash, "lbproc": int(index["lbproc"][first])}
+    data_vars[name] = (dims, data, attrs)
+    return xr.Dataset(data_vars, coords=coords)
+
+
+def um_fields(index):
+    """Returns names of the fields in a UM file index, with their stash
+    code and processing code.
+
+    A field saved with more than one processing code, as a daily mean,
+    maximum and minimum, gives one variable per code: maxima and minima
+    are named with _max and _min suffix, as in um2nc output, other codes
+    with the code as suffix, except the time mean (128).
+
+    Parameters
+    ----------
+    index : dict
+        Index of file records, see `read_index`
+
+    Returns
+    -------
+    fields : dict
+        Dictionary of variable name and (stash, lbproc) tuple
+    """
+    fields = {}
+    for stash in np.unique(index["lbuser4"]):
+        procs = np.unique(index["lbproc"][index["lbuser4"] == stash])
+        plain = [p for p in procs if p not in LBPROC_SUFFIX]
+        for proc in procs:
+            suffix = LBPROC_SUFFIX.get(proc, "")
+            if not suffix and len(plain) > 1 and proc != 128:
+                suffix = f"_{proc}"
+            fields[stash_name(stash) + suffix] = (int(stash), int(proc))
+    return fields
+
+
+def open_um_dataset(paths, variables=None, lbproc=None):
+    """Opens UM fieldsfiles or PP files as a lazy Dataset, files are
+    concatenated along time.
+
+    Variables with different axes, as daily and monthly fields from
+    the same stream or fields with different pseudo levels, get their
+    own dimensions, as time_0, pseudo_level_1, ... As in um2nc output,
+    axes are numbered going through all the fields of the first file
+    in stash order, so their names do not depend on the variables
+    opened. Fields with more than one processing code are split in
+    variables, see `um_fields`.
+
+    Parameters
+    ----------
+    paths : list(str)
+        Paths of fieldsfiles or PP files, in time order
+    variables : list(str)
+        Names of variables to open, as fld_s03i236 or fld_s03i236_max,
+        by default all fields in the first file
+    lbproc : int
+        Processing code to select, see `um_variable`
+
+    Returns
+    -------
+    ds : xarray.Dataset
+
+    Raises
+    ------
+    ValueError
+        If a variable requested is not in the files or cannot be read,
+        when opening all fields these are skipped with a warning
+    """
+    all_fields = um_fields(read_index(paths[0]))
+    fields = all_fields
+    if lbproc is not None:
+        fields = {k: v for k, v in fields.items() if v[1] == lbproc}
+    if variables is not None:
+        missing = [v for v in variables if v not in fields]
+        if missing:
+            raise ValueError(f"E: {', '.join(missing)} not in {paths[0]}")
+        fields = {v: fields[v] for v in variables}
+    # name axes going through all fields of the first file, only their
+    # lookup headers are used
+    axes, renames = xr.Dataset(), {}
+    for name, (stash, proc) in all_fields.items():
+        try:
+            var = um_variable(paths[0], stash, proc)
+        except ValueError as e:
+            if name not in fields:
+                continue
+            if variables is not None:
+                raise
+            warnings.warn(f"{name} skipped: {e}")
+            continue
+        renames[name] = _axes_names(var, axes)
+        axes = axes.assign_coords(_rename_axes(var, renames[name]).coords)
+    ds = xr.Dataset()
+    for name, (stash, proc) in fields.items():
+        if name not in renames:
+            continue
+        parts = [um_variable(p, stash, proc) for p in paths]
+        var = xr.concat(parts, dim="time") if len(parts) > 1 else parts[0]
+        if name != stash_name(stash):
+            var = var.rename({stash_name(stash): name})
+        ds = ds.merge(_rename_axes(var, renames[name]), compat="no_conflicts")
+    return ds
+
+
+def _axes_names(var, axes):
+    """Returns new names of the axes of a field conflicting with the
+    axes already in dataset, reusing a renamed axis if equal, with the
+    coordinates defined on them, numbered as iris does saving um2nc
+    output: lat_v, lat_v_0, lat_v_1, ...
+
+    :meta private:
+    """
+    names = {}
+    for dim in var[[v for v in var.data_vars if v != "time_bnds"][0]].dims:
+        name, n = dim, 0
+        while name in axes.dims and not np.array_equal(var[dim], axes[name]):
+            name, n = f"{dim}_{n}", n + 1
+        if name == dim:
+            continue
+        names[dim] = name
+        for coord in var.coords:
+            if coord != dim and var[coord].dims == (dim,):
+                names[coord] = coord + name[len(dim) :]
+    if "time" in names and "time_bnds" in var:
+        names["time_bnds"] = f"{names['time']}_bnds"
+    return names
+
+
+def _rename_axes(var, names):
+    """Renames axes of a field, see `_axes_names`.
+
+    :meta private:
+    """
+    var = var.rename(names)
+    if "time_bnds" in names:
+        var[names["time"]].attrs["bounds"] = names["time_bnds"]
+    return var
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper.ocean_supergrid import R_EARTH
+
+
+@pytest.fixture
+def make_supergrid():
+    """Returns a function writing a regular MOM supergrid file, with an
+    exact area variable if area is True."""
+
+    def make(path, nx=8, ny=6, area=True):
+        x = np.linspace(0, 360, 2 * nx + 1)
+        y = np.linspace(-80, 90, 2 * ny + 1)
+        lon, lat = np.meshgrid(x, y)
+        ds = xr.Dataset({"x": (("nyp", "nxp"), lon), "y": (("nyp", "nxp"), lat)})
+        if area:
+            dlon = np.radians(np.diff(x))
+            dsin = np.diff(np.sin(np.radians(y)))
+            ds["area"] = (("ny", "nx"), R_EARTH**2 * np.outer(dsin, dlon))
+        ds.to_netcdf(path)
+        return ds
+
+    return make
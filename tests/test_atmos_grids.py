@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper import atmos_grids
+from access_mopper.atmos_grids import axis_bounds, configuration_grid, get_axis
+
+
+def test_axis_bounds():
+    bnds = axis_bounds(np.array([-90.0, -45.0, 0.0, 45.0, 90.0]), latitude=True)
+    np.testing.assert_array_equal(bnds[:, 0], [-90, -67.5, -22.5, 22.5, 67.5])
+    np.testing.assert_array_equal(bnds[:, 1], [-67.5, -22.5, 22.5, 67.5, 90])
+    bnds = axis_bounds(np.array([0.0, 10.0, 20.0]))
+    np.testing.assert_array_equal(bnds, [[-5, 5], [5, 15], [15, 25]])
+
+
+@pytest.mark.parametrize("grid", [None, "N96ND"])
+def test_get_axis_n96(grid):
+    assert configuration_grid("ACCESS-ESM1-5") == "N96ND"
+    lat = np.linspace(-90, 90, 145).astype("float32")
+    ds = xr.Dataset(coords={"lat": ("lat", lat, {"bounds": "lat_bnds"})})
+    values, bounds = get_axis(ds, "lat", "latitude", grid)
+    # bounds attribute without variable in file does not fail
+    assert bounds.shape == (145, 2)
+    assert bounds[0, 0] == -90 and bounds[-1, 1] == 90
+    assert get_axis(ds, "lat", "latitude", grid)[1] is bounds
+    assert not bounds.flags.writeable
+
+
+def test_get_axis_regional():
+    lon = 110 + 0.0198 * np.arange(50)
+    ds = xr.Dataset(coords={"lon": lon})
+    values, bounds = get_axis(ds, "lon", "longitude")
+    np.testing.assert_allclose(bounds[:, 1] - bounds[:, 0], 0.0198)
+    # registered the first time is read
+    assert any(a[1] is bounds for a in atmos_grids._AXES[("longitude", 50)])
+    assert get_axis(ds.copy(), "lon", "longitude")[1] is bounds
+    # bounds from file, with time dimension added by open_mfdataset
+    lat = np.array([-30.0, -29.0])
+    bnds = np.array([[[-30.4, -29.5], [-29.5, -28.6]]] * 3)
+    ds = xr.Dataset(
+        {"lat_bnds": (("time", "lat", "bnds"), bnds)},
+        coords={"lat": ("lat", lat, {"bounds": "lat_bnds"})},
+    )
+    np.testing.assert_array_equal(get_axis(ds, "lat", "latitude")[1], bnds[0])
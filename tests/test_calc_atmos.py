@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper.calc_atmos import (
+    get_hybrid_height,
+    get_level_coeffs,
+    get_model_levels,
+    height_gpheight,
+    level_heights,
+    level_to_height,
+    plevinterp,
+    zonal_mean,
+)
+
+
+def model_levels(nt=3, nlev=10, ny=4, nx=5):
+    rng = np.random.default_rng(0)
+    dims = ("time", "model_theta_level_number", "lat", "lon")
+    pmod = 101325 * np.exp(-np.linspace(0, 4, nlev))[None, :, None, None]
+    pmod = pmod * (1 + 0.05 * rng.standard_normal((nt, 1, ny, nx)))
+    var = rng.random((nt, nlev, ny, nx)).astype("float32")
+    pmod = xr.DataArray(pmod, dims=dims).chunk({"time": 1})
+    var = xr.DataArray(var, dims=dims, attrs={"units": "K"}).chunk({"time": 1})
+    return var, pmod
+
+
+@pytest.mark.parametrize("log", [False, True])
+def test_plevinterp(log):
+    var, pmod = model_levels()
+    plev = np.array([110000, 100000, 85000, 50000, 10000, 1000, 100], dtype=float)
+    interp = plevinterp(var, pmod, plev, log=log)
+    assert interp.dims == ("time", "plev", "lat", "lon")
+    assert interp.chunks is not None
+    assert interp.attrs["units"] == "K"
+    values = interp.values
+    for t, j, i in np.ndindex(var.shape[0], *var.shape[2:]):
+        pcol = pmod.values[t, :, j, i]
+        coord, target = (-np.log(pcol), -np.log(plev)) if log else (-pcol, -plev)
+        expected = np.interp(
+            target, coord, var.values[t, :, j, i], left=np.nan, right=np.nan
+        )
+        np.testing.assert_allclose(values[t, :, j, i], expected, rtol=1e-6)
+
+
+def test_height_gpheight():
+    var, pmod = model_levels(nlev=38)
+    orog = xr.DataArray(np.linspace(0, 3000, 20).reshape(4, 5), dims=("lat", "lon"))
+    hslv = level_heights(orog.chunk(), 38)
+    gpheight = height_gpheight(hslv)
+    # metpy.height_to_geopotential(hslv) / g_0
+    GM, Re = 6.67430e-11 * 5.9722e24, 6371008.7714
+    expected = GM * (1 / Re - 1 / (Re + hslv.values)) / 9.8067
+    np.testing.assert_allclose(gpheight.values, expected)
+    gpheight = height_gpheight(hslv, pmod=pmod, levnum=[85000.0, 50000.0])
+    assert gpheight.dims == ("time", "plev", "lat", "lon")
+    assert gpheight.chunks is not None
+
+
+@pytest.mark.parametrize("levtype", ["theta", "rho"])
+def test_hybrid_height(levtype):
+    coord = get_hybrid_height(38, levtype)
+    assert get_hybrid_height(38, levtype) is coord
+    terms = coord.formula_terms()
+    assert terms["lev_bnds"].shape == (38, 2)
+    assert np.all(terms["lev_bnds"][:, 0] < terms["lev"])
+    assert np.all(terms["lev"] < terms["lev_bnds"][:, 1])
+    np.testing.assert_array_equal(terms["lev_bnds"][1:, 0], terms["lev_bnds"][:-1, 1])
+    orog = xr.DataArray(np.linspace(0, 3000, 20).reshape(4, 5), dims=("lat", "lon"))
+    altitude = coord.altitude(orog.chunk())
+    assert coord.altitude(orog.chunk()) is altitude
+    assert altitude.chunks is not None
+    np.testing.assert_allclose(altitude.values, level_heights(orog, 38, levtype).values)
+
+
+def test_zonal_mean():
+    var, _ = model_levels()
+    var[0, 0, 0, 0] = np.nan
+    vout = zonal_mean(var)
+    assert vout.dims == ("time", "model_theta_level_number", "lat")
+    assert vout.attrs["units"] == "K"
+    np.testing.assert_allclose(vout.values, np.nanmean(var.values, axis=-1))
+
+
+@pytest.mark.parametrize("nlev, levtype", [(38, "theta"), (85, "rho")])
+def test_get_model_levels(nlev, levtype):
+    a, b = get_level_coeffs(levtype, nlev)
+    zdim = f"model_{levtype}_level_number"
+    var = xr.DataArray(
+        np.zeros((2, nlev, 3, 4)),
+        dims=("time", zdim, "lat", "lon"),
+        coords={
+            zdim: np.arange(1, nlev + 1),
+            f"{levtype}_level_height": (zdim, a.astype("float32")),
+        },
+    )
+    var = level_to_height(var.isel({zdim: slice(2, 10)}))
+    zdim, coord, index = get_model_levels(var)
+    assert zdim == f"{levtype}_level_height"
+    assert coord is get_hybrid_height(nlev, levtype)
+    np.testing.assert_array_equal(index, np.arange(2, 10))
+    terms = coord.formula_terms(index)
+    np.testing.assert_array_equal(terms["b"], b[2:10])
+    assert get_model_levels(var.isel({zdim: 0})) is None
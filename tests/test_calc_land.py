@@ -0,0 +1,67 @@
+import numpy as np
+import xarray as xr
+from access_mopper.calc_land import (
+    aggregate_tiles,
+    average_tile,
+    calc_topsoil,
+    extract_tilefrac,
+    get_tile_groups,
+    soil_integrals,
+)
+
+
+def tile_field(nt=3, ntiles=17, ny=4, nx=5):
+    rng = np.random.default_rng(0)
+    data = rng.random((nt, ntiles, ny, nx))
+    data[:, -1] = np.nan  # unused tile
+    data[0, 2, 1, 1] = np.nan
+    tilefrac = xr.DataArray(
+        data,
+        dims=("time", "pseudo_level_1", "lat", "lon"),
+        coords={"pseudo_level_1": np.arange(1, ntiles + 1)},
+    ).chunk({"time": 1})
+    landfrac = xr.DataArray(rng.random((ny, nx)), dims=("lat", "lon"))
+    return tilefrac, landfrac
+
+
+def test_aggregate_tiles():
+    tilefrac, landfrac = tile_field()
+    groups = get_tile_groups("cable")
+    vout = aggregate_tiles(tilefrac, groups, landfrac=landfrac)
+    assert list(vout.data_vars) == list(groups.keys())
+    for name, tiles in groups.items():
+        expected = tilefrac.sel(pseudo_level_1=tiles).sum("pseudo_level_1")
+        expected = (expected * landfrac).fillna(0)
+        assert vout[name].chunks is not None
+        np.testing.assert_allclose(vout[name].values, expected.values)
+    np.testing.assert_allclose(
+        extract_tilefrac(tilefrac, 7, landfrac=landfrac).values,
+        vout["c4PftFrac"].values,
+    )
+
+
+def test_average_tile():
+    tilefrac, landfrac = tile_field()
+    var = tilefrac * 2
+    vout = average_tile(var, tilefrac, landfrac=landfrac)
+    expected = (var * tilefrac).sum("pseudo_level_1") * landfrac
+    np.testing.assert_allclose(vout.values, expected.values)
+
+
+def test_soil_integrals():
+    depth = [0.022, 0.08, 0.234, 0.643, 1.728, 4.6]
+    rng = np.random.default_rng(0)
+    soilvar = xr.DataArray(
+        rng.random((3, 6, 4, 5)),
+        dims=("time", "depth", "lat", "lon"),
+        coords={"depth": depth},
+    ).chunk({"time": 1})
+    ranges = {"mrsos": (0.0, 0.1), "mrso": (0.0, None), "deep": (1.0, 2.0)}
+    vout = soil_integrals(soilvar, ranges)
+    assert vout["mrso"].chunks is not None
+    top = soilvar[:, :2].sum("depth") + soilvar[:, 2] * 0.02 / 0.154
+    np.testing.assert_allclose(vout["mrsos"].values, top.values)
+    np.testing.assert_allclose(calc_topsoil(soilvar).values, top.values)
+    np.testing.assert_allclose(vout["mrso"].values, soilvar.sum("depth").values)
+    deep = soilvar[:, 4] * 0.728 / 1.085 + soilvar[:, 5] * 0.272 / 2.872
+    np.testing.assert_allclose(vout["deep"].values, deep.values)
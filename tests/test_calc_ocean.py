@@ -0,0 +1,139 @@
+import pickle
+
+import click
+import numpy as np
+import xarray as xr
+from access_mopper import fixed_fields
+from access_mopper.calc_ocean import (
+    ZonalBins,
+    calc_global_ave_ocean,
+    calc_zonal_mean_ocean,
+    get_areacello,
+    get_ocean_weights,
+    get_zonal_bins,
+    global_ave_ocean,
+)
+from access_mopper.dataclasses import CalcSettings
+from access_mopper.ocean_supergrid import Supergrid
+
+
+def ocean_field(nt=4, nz=3, ny=5, nx=6):
+    rng = np.random.default_rng(0)
+    data = rng.random((nt, nz, ny, nx))
+    data[:, :, 0, 0] = np.nan  # land point
+    dims = ("time", "st_ocean", "yt_ocean", "xt_ocean")
+    coords = {d: np.arange(n, dtype=float) for d, n in zip(dims, data.shape)}
+    var = xr.DataArray(data, dims=dims, coords=coords).chunk({"time": 1})
+    area = xr.DataArray(rng.random((ny, nx)) + 1.0, dims=dims[2:])
+    area[0, 0] = 0.0
+    dz = xr.DataArray(rng.random(data.shape) + 1.0, dims=dims, coords=coords)
+    return var, area, dz.chunk({"time": 1})
+
+
+def test_global_ave_ocean_volume():
+    var, area, dz = ocean_field()
+    vnew = global_ave_ocean(var, area, dz=dz)
+    assert vnew.chunks is not None
+    mass = (dz * area.values).values
+    expected = np.nansum(var.values * mass, axis=(1, 2, 3)) / np.sum(
+        np.where(np.isnan(var.values), 0, mass), axis=(1, 2, 3)
+    )
+    np.testing.assert_allclose(vnew.values, expected)
+
+
+def test_global_ave_ocean_area():
+    var, area, _ = ocean_field()
+    vnew = global_ave_ocean(var, area)
+    assert vnew.dims == ("time", "st_ocean")
+    expected = np.nansum(var.values * area.values, axis=(2, 3)) / area.values.sum()
+    np.testing.assert_allclose(vnew.values, expected)
+
+
+def test_global_ave_ocean_time_dim():
+    var, area, dz = ocean_field()
+    vnew = global_ave_ocean(var, area, dz=dz)
+    moved = global_ave_ocean(
+        var.transpose("st_ocean", "time", ...),
+        area,
+        dz=dz.transpose("st_ocean", "time", ...),
+    )
+    assert moved.dims == ("time",)
+    np.testing.assert_allclose(moved.values, vnew.values)
+
+
+def test_calc_global_ave_ocean_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    var, area, _ = ocean_field()
+    # land is flagged by a 0 depth as well as by a missing one
+    depth = xr.ones_like(area).where(area > 0, 0.0)
+    grid = xr.Dataset({"area_t": area + (area == 0), "ht": depth})
+    grid.to_netcdf(tmp_path / "grid_spec.nc")
+    settings = CalcSettings(ancils_path=str(tmp_path), grid_ocean="grid_spec.nc")
+    settings = pickle.loads(pickle.dumps(settings))
+    vnew = calc_global_ave_ocean(var, settings=settings)
+    weights = get_ocean_weights(str(tmp_path / "grid_spec.nc"))
+    np.testing.assert_array_equal(weights.values, area.values)
+    areacello = get_areacello(grid.area_t, settings=settings)
+    np.testing.assert_array_equal(areacello.values, weights.values)
+    np.testing.assert_allclose(vnew.values, global_ave_ocean(var, area).values)
+    obj = {"ancil_path": str(tmp_path), "grid_ocean": "grid_spec.nc", "cmor": {}}
+    with click.Context(click.Command("mop"), obj=obj):
+        vctx = calc_global_ave_ocean(var)
+    np.testing.assert_allclose(vctx.values, vnew.values)
+
+
+def test_zonal_bins():
+    var, area, _ = ocean_field(ny=30, nx=12)
+    rng = np.random.default_rng(1)
+    lat = np.linspace(-80, 85, 30)[:, None] + rng.random((30, 12))
+    zonal = ZonalBins(lat, area.values, dlat=10.0)
+    vout = zonal(var)
+    assert vout.dims == ("time", "st_ocean", "lat")
+    assert vout.chunks is not None
+    band = np.floor((lat + 90) / 10).astype(int)
+    values = var.values
+    for b in (1, 9, 17):
+        cells = (band == b) & (area.values > 0)
+        data = values[..., cells]
+        weights = np.where(np.isnan(data), 0, area.values[cells])
+        expected = np.nansum(data * weights, axis=-1) / weights.sum(axis=-1)
+        np.testing.assert_allclose(vout.values[..., b], expected)
+    assert np.isnan(vout.values[..., 0]).all()
+
+
+def test_calc_zonal_mean_ocean_supergrid(tmp_path, monkeypatch, make_supergrid):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    get_zonal_bins.cache_clear()
+    fname = str(tmp_path / "ocean_hgrid.nc")
+    make_supergrid(fname)
+    grid = Supergrid(fname)
+    rng = np.random.default_rng(0)
+    data = rng.random((2, *grid.xt.shape))
+    data[:, 0, :3] = np.nan  # land points
+    var = xr.DataArray(data, dims=("time", "yt_ocean", "xt_ocean"))
+    vout = calc_zonal_mean_ocean(var, dlat=10.0, grid=grid)
+    assert vout.dims == ("time", "lat")
+    area = grid.cell_area("t").values
+    expected = ZonalBins(grid.yt.values, area, dlat=10.0)(var)
+    np.testing.assert_array_equal(vout.values, expected.values)
+    # land cells are skipped
+    band = vout.sel(lat=grid.yt.values[0, 0], method="nearest").values
+    row = np.where(np.isnan(data[:, 0]), 0, area[0])
+    np.testing.assert_allclose(band, np.nansum(data[:, 0] * row, 1) / row.sum(1))
+    # bins are built once per grid, cell, bands width and region
+    calc_zonal_mean_ocean(var, dlat=10.0, grid=grid)
+    assert get_zonal_bins.cache_info().hits == 1
+    # region selected in the variable
+    rows, cols = (2, 3, 4), (1, 2, 3)
+    sub = var[:, 2:5, 1:4]
+    region = calc_zonal_mean_ocean(sub, grid=grid, rows=rows, cols=cols)
+    expected = ZonalBins(grid.yt.values[2:5, 1:4], area[2:5, 1:4])(sub)
+    np.testing.assert_array_equal(region.values, expected.values)
+    # u cells are the north-east corners of t cells
+    uvar = var.rename(yt_ocean="yu_ocean", xt_ocean="xu_ocean")
+    uout = calc_zonal_mean_ocean(uvar, cell="u", dlat=10.0, grid=grid)
+    expected = ZonalBins(
+        grid.yq.values[1:, 1:], grid.cell_area("q").values[1:, 1:], dlat=10.0
+    )(uvar)
+    np.testing.assert_array_equal(uout.values, expected.values)
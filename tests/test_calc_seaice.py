@@ -0,0 +1,222 @@
+from contextlib import contextmanager
+
+import dask
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper import calc_seaice, fixed_fields
+from access_mopper.calc_seaice import (
+    IceTransportCalculations,
+    TransportSections,
+    calc_hemi_seaice,
+    find_line_segments,
+    get_hemi_weights,
+    hemi_weights,
+    load_line_segments,
+    maskSeaIce,
+    offset_streamfunction,
+    sisnconc,
+    sithick,
+)
+from access_mopper.dataclasses import CalcSettings
+
+
+class ComputeError(RuntimeError):
+    pass
+
+
+def raise_on_compute(dsk, keys, **kwargs):
+    raise ComputeError("dask graph was computed while building it")
+
+
+@contextmanager
+def no_compute():
+    """Raises ComputeError if anything is computed in the block"""
+    with dask.config.set(scheduler=raise_on_compute):
+        yield
+
+
+def ice_field(seed, nt=4, ny=6, nx=8):
+    rng = np.random.default_rng(seed)
+    data = rng.random((nt, ny, nx))
+    data[:, 0, :] = 0.0
+    data[:, -1, 0] = np.nan
+    lat = np.broadcast_to(np.linspace(-80, 80, ny)[:, None], (ny, nx))
+    return xr.DataArray(
+        data,
+        dims=("time", "nj", "ni"),
+        coords={"time": np.arange(nt, dtype=float), "TLAT": (("nj", "ni"), lat)},
+    ).chunk({"time": 1})
+
+
+def test_no_compute_harness():
+    with pytest.raises(ComputeError):
+        with no_compute():
+            ice_field(0).sum().values
+
+
+@pytest.mark.parametrize(
+    "kernel",
+    [
+        lambda aice, hi: sithick(hi, aice),
+        lambda aice, hi: maskSeaIce(hi, aice),
+        lambda aice, hi: sisnconc(hi),
+    ],
+)
+def test_kernels_lazy(kernel):
+    aice = ice_field(0)
+    hi = ice_field(1)
+    with no_compute():
+        vout = kernel(aice, hi)
+    assert vout.shape == aice.shape
+    assert vout.chunks is not None
+    vout.compute()
+
+
+def test_sithick():
+    aice = ice_field(0)
+    hi = ice_field(1)
+    vout = sithick(hi, aice).values
+    expected = hi.values / np.where(aice.values > 1e-3, aice.values, np.nan)
+    np.testing.assert_allclose(vout, expected)
+
+
+def test_hemi_seaice_lazy():
+    aice = ice_field(0)
+    carea = xr.DataArray(np.ones(aice.shape[1:]), dims=aice.dims[1:])
+    weights = hemi_weights(carea, aice["TLAT"])
+    with no_compute():
+        vout = calc_hemi_seaice(aice, hi=aice * 2, hs=aice, weights=weights)
+    north = aice.where(aice["TLAT"] >= 0).sum(dim=("nj", "ni"))
+    np.testing.assert_allclose(vout["siarean"].values, north.values)
+    np.testing.assert_allclose(vout["sivoln"].values, 2 * north.values)
+
+
+@pytest.mark.parametrize("hemi", ["n", "s"])
+def test_hemi_seaice(hemi):
+    aice = ice_field(0)
+    hs = ice_field(1)
+    rng = np.random.default_rng(2)
+    carea = xr.DataArray(rng.random(aice.shape[1:]) + 1.0, dims=aice.dims[1:])
+    vout = calc_hemi_seaice(aice, hi=aice * 2, hs=hs, carea=carea).compute()
+    north = aice["TLAT"].values >= 0
+    inside = north if hemi == "n" else ~north
+    area = np.where(inside, carea.values, 0)
+    values = np.nan_to_num(aice.values)
+    extent = (values >= 0.15) & (values <= 1.0)
+    np.testing.assert_allclose(
+        vout[f"siarea{hemi}"].values, (values * area).sum(axis=(1, 2))
+    )
+    np.testing.assert_allclose(
+        vout[f"siextent{hemi}"].values, (extent * area).sum(axis=(1, 2))
+    )
+    np.testing.assert_allclose(
+        vout[f"sivol{hemi}"].values, 2 * (values * area).sum(axis=(1, 2))
+    )
+    np.testing.assert_allclose(
+        vout[f"sisnvol{hemi}"].values,
+        (np.nan_to_num(hs.values) * area).sum(axis=(1, 2)),
+    )
+
+
+def test_get_hemi_weights(tmp_path, monkeypatch):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    aice = ice_field(0)
+    tarea = np.arange(48, dtype=float).reshape(6, 8) + 1.0
+    tlat = np.radians(aice["TLAT"].values)
+    grid = xr.Dataset(
+        {
+            "tarea": (("ny", "nx"), tarea),
+            "tlat": (("ny", "nx"), tlat, {"units": "radians"}),
+        }
+    )
+    grid.to_netcdf(tmp_path / "cice_grid.nc")
+    settings = CalcSettings(ancils_path=str(tmp_path), grid_ice="cice_grid.nc")
+    weights = get_hemi_weights(settings)
+    np.testing.assert_array_equal(weights.sel(hemi="n").values[3:], tarea[3:])
+    np.testing.assert_array_equal(weights.sel(hemi="s").values[3:], 0)
+    store = fixed_fields.get_fixed_fields("", str(tmp_path / "cice_grid.nc"))
+    assert "hemi_weights" in store
+    vout = calc_hemi_seaice(aice, settings=settings)
+    expected = calc_hemi_seaice(aice, carea=xr.DataArray(tarea, dims=aice.dims[1:]))
+    np.testing.assert_allclose(vout["siareas"].values, expected["siareas"].values)
+
+
+def test_transports_lazy():
+    sections = {
+        "line_a": [{"trans": "ty", "i": [1, 3], "j": [2, 2]}],
+        "line_b": [
+            {"trans": "tx", "i": [4, 4], "j": [1, 3], "sign": -1},
+            {"trans": "ty", "i": [5, 6], "j": [1, 1]},
+        ],
+    }
+    tx = ice_field(0)
+    ty = ice_field(1)
+    psi = ice_field(2)
+    with no_compute():
+        trans = TransportSections(sections)(tx, ty)
+        psi_out = offset_streamfunction(psi, trans.sel(line="line_a"))
+    line_b = -tx[:, 1:4, 4].sum("nj") + ty[:, 1, 5:7].sum("ni")
+    np.testing.assert_allclose(trans.sel(line="line_b").values, line_b.values)
+    np.testing.assert_allclose(psi_out.values, psi.values + trans.values[:, :1, None])
+
+
+def corner_grid():
+    lon, lat = np.meshgrid(np.arange(0.0, 360.0, 10.0), np.linspace(-60, 60, 13))
+    return lon, lat
+
+
+def test_find_line_segments():
+    lon, lat = corner_grid()
+    # west to east along the equator crosses north faces, positive north
+    segments = find_line_segments(lon, lat, 20, 0, 80, 0)
+    assert segments == [{"trans": "ty", "i": [3, 8], "j": [6, 6], "sign": 1}]
+    # south to north along a meridian crosses east faces, positive west
+    segments = find_line_segments(lon, lat, 100, -20, 100, 30)
+    assert segments == [{"trans": "tx", "i": [10, 10], "j": [5, 9], "sign": -1}]
+
+
+def test_load_line_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    lon, lat = corner_grid()
+    gridpath = tmp_path / "cice_grid.nc"
+    xr.Dataset({"ulon": (("ny", "nx"), lon)}).to_netcdf(gridpath)
+    lines = {"equator": {"lon1": 20, "lat1": 0, "lon2": 80, "lat2": 0}}
+    sections = load_line_segments(str(gridpath), lon, lat, lines)
+    assert sections["equator"] == find_line_segments(lon, lat, 20, 0, 80, 0)
+
+    # a copy of the grid elsewhere reuses the cached segments
+    fixed_fields.get_fixed_fields.cache_clear()
+    copy = tmp_path / "copy.nc"
+    copy.write_bytes(gridpath.read_bytes())
+
+    def fail(*args):
+        raise AssertionError("segments searched again")
+
+    monkeypatch.setattr(calc_seaice, "find_line_segments", fail)
+    assert load_line_segments(str(copy), lon, lat, lines) == sections
+
+
+def test_sea_lines_any_grid(tmp_path, monkeypatch):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    # global 2 degrees corners grid, not one of the grids with sections
+    lon, lat = np.meshgrid(np.arange(-279.0, 81.0, 2.0), np.arange(-77.0, 89.0, 2.0))
+    grid = xr.Dataset({"ulon": (("ny", "nx"), lon), "ulat": (("ny", "nx"), lat)})
+    grid.to_netcdf(tmp_path / "cice_grid.nc")
+    settings = CalcSettings(ancils_path=str(tmp_path), grid_ice="cice_grid.nc")
+    calc = IceTransportCalculations(settings=settings)
+    sections = calc.get_sections(calc.lines, lon.shape)
+    assert sections.names == calc.lines
+    found = calc.find_sections(calc.sea_line_ends)
+    # drake passage goes south east, eastward and northward positive
+    assert {seg["trans"] for seg in found["drake_passage"]} == {"tx", "ty"}
+    assert all(seg["sign"] == 1 for seg in found["drake_passage"])
+    euc = found["pacific_equatorial_undercurrent"]
+    assert all(seg["levels"] == [0, 25] and seg["positive"] for seg in euc)
+    # sections of the 1deg grid are still read from transport_lines.yaml
+    onedeg = calc.get_sections(["drake_passage"], (300, 360))
+    ((j, i, _),) = onedeg.groups.values()
+    assert set(i) == {212}
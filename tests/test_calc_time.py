@@ -0,0 +1,179 @@
+import cftime
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper.calc_time import (
+    Climatology,
+    date_from_days,
+    date_seconds,
+    days_from_date,
+    filter_files,
+    resample_numeric,
+    resample_time_axis,
+    stream_resample,
+    time_indexer,
+)
+
+
+def hourly_field(calendar="noleap", ndays=400):
+    rng = np.random.default_rng(0)
+    # values stamped at the end of each hour
+    time = np.arange(1, ndays * 24 + 1) / 24.0
+    attrs = {"units": "days since 2000-01-01", "calendar": calendar}
+    return xr.DataArray(
+        rng.random((time.size, 3)),
+        dims=("time", "x"),
+        coords={"time": ("time", time, attrs)},
+        attrs={"units": "K"},
+    ).chunk({"time": 500})
+
+
+@pytest.mark.parametrize(
+    "calendar",
+    ["proleptic_gregorian", "noleap", "360_day", "standard", "julian", "GREGORIAN"],
+)
+def test_calendar_dates(calendar):
+    # standard calendar dates before 1582-10-15 are Julian
+    time = np.arange(-120000, 200000, 13)
+    dates = cftime.num2date(time, "days since 1850-01-01", calendar=calendar.lower())
+    ref = days_from_date(1850, 1, 1, calendar)
+    year, month, day = date_from_days(time + ref, calendar)
+    np.testing.assert_array_equal(year, [d.year for d in dates])
+    np.testing.assert_array_equal(month, [d.month for d in dates])
+    np.testing.assert_array_equal(day, [d.day for d in dates])
+    np.testing.assert_array_equal(
+        days_from_date(year, month, day, calendar), time + ref
+    )
+
+
+@pytest.mark.parametrize(
+    "calendar", ["proleptic_gregorian", "noleap", "360_day", "Standard", "NOLEAP"]
+)
+@pytest.mark.parametrize("rfrq", ["6h", "D", "M"])
+def test_resample_numeric(calendar, rfrq):
+    var = hourly_field(calendar, ndays=100)
+    vout = resample_numeric(var, rfrq, "time", stats="max")
+    assert vout.chunks is not None
+    assert vout.attrs["units"] == "K"
+    # group decoded times moved 1s back, as intervals are closed right
+    dates = cftime.num2date(
+        var.time.values - 1 / 86400, var.time.units, calendar.lower()
+    )
+    if rfrq == "M":
+        key = [d.year * 12 + d.month for d in dates]
+    else:
+        step = 6 if rfrq == "6h" else 24
+        key = [(d.dayofyr + d.year * 1000) * 4 + d.hour // step for d in dates]
+    _, inv = np.unique(key, return_inverse=True)
+    expected = [var.values[inv == k].max(axis=0) for k in range(inv.max() + 1)]
+    np.testing.assert_allclose(vout.values, expected)
+    _, tcoord, bounds = resample_time_axis(var.time, rfrq)
+    np.testing.assert_allclose(vout.time.values, bounds.mean("bnds").values)
+    np.testing.assert_array_equal(bounds.values[1:, 0], bounds.values[:-1, 1])
+    assert vout.time.attrs["bounds"] == "time_bnds"
+
+
+def test_resample_standard_julian():
+    # monthly means across the switch from the Julian to the Gregorian
+    # calendar, October 1582 has 21 days
+    time = np.arange(0.5, 112.0)
+    attrs = {"units": "days since 1582-09-01", "calendar": "standard"}
+    var = xr.DataArray(time, dims="time", coords={"time": ("time", time, attrs)})
+    _, _, bounds = resample_time_axis(var.time, "M")
+    np.testing.assert_array_equal(
+        np.diff(bounds.values, axis=1)[:, 0], [30, 21, 30, 31]
+    )
+
+
+def test_resample_month_bounds():
+    var = hourly_field("noleap", ndays=365)
+    _, tcoord, bounds = resample_time_axis(var.time, "M")
+    ndays = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    np.testing.assert_array_equal(np.diff(bounds.values, axis=1)[:, 0], ndays)
+    assert tcoord.values[0] == 15.5
+
+
+@pytest.mark.parametrize("nsteps", [None, 7])
+@pytest.mark.parametrize("rfrq", ["6h", "D", "M"])
+def test_stream_resample(tmp_path, rfrq, nsteps):
+    var = hourly_field(ndays=100).rename("tas").load()
+    var[5:30, 0] = np.nan
+    files = []
+    # files end mid-day, at midnight, on a single value and with no value
+    edges = [0, 37, 500, 1000, 1001, 1001, 1800, 2400]
+    for n, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        files.append(tmp_path / f"tas_{n}.nc")
+        var[start:end].to_netcdf(files[-1])
+    parts = list(stream_resample(files, "tas", rfrq, nsteps=nsteps))
+    vout = xr.concat(parts, dim="time")
+    assert vout["time"].attrs["units"] == var.time.units
+    expected = resample_numeric(var, rfrq, "time")
+    _, _, bounds = resample_time_axis(var.time, rfrq)
+    np.testing.assert_allclose(vout["tas"].values, expected.values)
+    np.testing.assert_allclose(vout["time"].values, expected["time"].values)
+    np.testing.assert_allclose(vout["time_bnds"].values, bounds.values)
+
+
+@pytest.mark.parametrize("multiyear", [False, True])
+def test_climatology(tmp_path, multiyear):
+    var = hourly_field(ndays=730).rename("rlut").load()
+    dates = cftime.num2date(var.time.values - 1 / 86400, var.time.units, "noleap")
+    groups = [(d.month, d.hour) for d in dates]
+    if not multiyear:
+        groups = [(d.year,) + g for d, g in zip(dates, groups)]
+    _, inv = np.unique(groups, axis=0, return_inverse=True)
+    expected = [var.values[inv == k].mean(axis=0) for k in range(inv.max() + 1)]
+    clim = Climatology(multiyear=multiyear)
+    parts = [clim.update(var[:1000]), clim.update(var[1000:5000])]
+    # resume from saved accumulators
+    clim.save(tmp_path / "rlut_acc.nc")
+    clim = Climatology.load(tmp_path / "rlut_acc.nc")
+    parts += [clim.update(var[5000:]), clim.close()]
+    vout = xr.concat([p for p in parts if p is not None], dim="time")
+    np.testing.assert_allclose(vout["rlut"].values, expected)
+    assert vout["time"].attrs["climatology"] == "climatology_bnds"
+    bounds = vout["climatology_bnds"].values
+    # january 00-01 hour: from first day 00:00 to last day 01:00
+    np.testing.assert_allclose(bounds[0], [0.0, 30 + 1 / 24 + 365 * multiyear])
+    assert np.all((bounds[:, 0] < vout.time.values) & (vout.time.values < bounds[:, 1]))
+
+
+def test_time_range(tmp_path):
+    assert date_seconds("1859", "noleap", end=True) == date_seconds(
+        "1860-01-01", "noleap"
+    )
+    assert date_seconds("1859-12", "360_day", end=True) == date_seconds(1860, "360_day")
+    with pytest.raises(ValueError):
+        date_seconds("Jan 1859", "noleap")
+    # one file of monthly means per year, 1850-1859
+    attrs = {"units": "days since 1850-01-01", "calendar": "noleap"}
+    files = []
+    for year in range(10):
+        edges = 365 * year + np.concatenate(
+            [[0], np.cumsum([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])]
+        )
+        bnds = np.stack([edges[:-1], edges[1:]], axis=-1).astype(float)
+        ds = xr.Dataset(
+            {
+                "tas": ("time", np.full(12, year, "f4")),
+                "time_bnds": (("time", "bnds"), bnds),
+            },
+            coords={
+                "time": ("time", bnds.mean(axis=1), {**attrs, "bounds": "time_bnds"})
+            },
+        )
+        files.append(str(tmp_path / f"tas_{1850 + year}.nc"))
+        ds.to_netcdf(files[-1])
+    assert filter_files(files, ("1853", "1854")) == files[3:5]
+    assert filter_files(files, ("1855-06", None)) == files[5:]
+    assert filter_files(files, (None, "1849")) == []
+    with xr.open_dataset(files[3], decode_times=False) as ds:
+        assert time_indexer(ds, ("1853-03", "1853-05")) == {"time": slice(2, 5)}
+        assert time_indexer(ds.drop_vars("time"), ("1853", "1853")) == {}
+    # without a calendar attribute time is in the standard calendar, as
+    # when resampled, 1582-10-04 is followed by 1582-10-15
+    time = xr.DataArray(
+        np.arange(20.0), dims="time", attrs={"units": "days since 1582-10-01"}
+    )
+    ds = xr.Dataset(coords={"time": time})
+    assert time_indexer(ds, ("1582-10-15", "1582-10-15")) == {"time": slice(4, 5)}
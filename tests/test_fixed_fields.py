@@ -0,0 +1,67 @@
+import shutil
+
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper import fixed_fields
+from access_mopper.calc_utils import get_ancil_var
+from access_mopper.dataclasses import CalcSettings
+from access_mopper.fixed_fields import FixedFields
+from mopdb.utils import MopException
+
+
+@pytest.fixture
+def grid_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    area = xr.DataArray(np.arange(12.0).reshape(3, 4), dims=("yt", "xt"))
+    fname = tmp_path / "grid_spec.nc"
+    xr.Dataset({"area_t": area}).to_netcdf(fname)
+    return fname
+
+
+def test_fixed_fields(tmp_path, grid_file):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        with xr.open_dataset(grid_file) as ds:
+            return ds["area_t"] * 2
+
+    store = FixedFields("ACCESS-ESM1-5", grid_file)
+    field = store.get("areacello", compute)
+    assert store.get("areacello", compute) is field
+    # same grid at a different path, as for another experiment
+    copy = tmp_path / "grid_copy.nc"
+    shutil.copy(grid_file, copy)
+    other = FixedFields("ACCESS-ESM1-5", copy)
+    assert "areacello" in other
+    np.testing.assert_array_equal(other.get("areacello").values, field.values)
+    assert len(calls) == 1
+    FixedFields("ACCESS-CM2", copy).get("areacello", compute)
+    assert len(calls) == 2
+    with pytest.raises(KeyError):
+        other.get("sftlf")
+
+
+def test_fixed_fields_version(grid_file, monkeypatch):
+    # fields stored by a previous version of the code are not reused
+    def compute():
+        with xr.open_dataset(grid_file) as ds:
+            return ds["area_t"]
+
+    old = FixedFields("ACCESS-ESM1-5", grid_file)
+    old.get("areacello", compute)
+    monkeypatch.setattr(fixed_fields, "STORE_VERSION", fixed_fields.STORE_VERSION + 1)
+    new = FixedFields("ACCESS-ESM1-5", grid_file)
+    assert new.path != old.path
+    assert "areacello" not in new
+
+
+def test_get_ancil_var(tmp_path, grid_file):
+    fixed_fields.get_fixed_fields.cache_clear()
+    settings = CalcSettings(ancils_path=str(tmp_path), grid_ocean=grid_file.name)
+    var = get_ancil_var("grid_ocean", "area_t", settings=settings)
+    np.testing.assert_array_equal(var.values, np.arange(12.0).reshape(3, 4))
+    # settings which are not ancillary files are rejected
+    with pytest.raises(MopException, match="tpath"):
+        get_ancil_var("tpath", "area_t", settings=settings)
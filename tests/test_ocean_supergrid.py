@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from access_mopper import fixed_fields
+from access_mopper.ocean_supergrid import R_EARTH, Supergrid
+
+
+@pytest.mark.parametrize("area", [True, False])
+def test_cell_area(tmp_path, monkeypatch, make_supergrid, area):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    fname = str(tmp_path / f"ocean_hgrid_{area}.nc")
+    ds = make_supergrid(fname, area=area)
+    grid = Supergrid(fname)
+    total = R_EARTH**2 * 2 * np.pi * (1 - np.sin(np.radians(-80)))
+    # without area variable sub-cell edges are great circles, not parallels
+    rtol = 1e-10 if area else 1e-3
+    areas = {c: grid.cell_area(c).values for c in "tuvq"}
+    assert areas["t"].shape == grid.xt.shape
+    assert areas["u"].shape == grid.xu.shape
+    assert areas["v"].shape == grid.xv.shape
+    assert areas["q"].shape == grid.xq.shape
+    # every sub-cell belongs to one cell, last column repeats the first
+    for cell in "tv":
+        np.testing.assert_allclose(areas[cell].sum(), total, rtol=rtol)
+    for cell in "uq":
+        np.testing.assert_allclose(areas[cell][:, :-1].sum(), total, rtol=rtol)
+        np.testing.assert_array_equal(areas[cell][:, 0], areas[cell][:, -1])
+    if area:
+        sub = ds["area"].values
+        np.testing.assert_allclose(areas["t"][0, 0], sub[:2, :2].sum())
+        np.testing.assert_allclose(areas["q"][0, 0], sub[0, [0, -1]].sum())
+    # areas are now read from the store
+    assert "area_q" in fixed_fields.get_fixed_fields("supergrid", fname)
+    grid.t_cells()
+    np.testing.assert_array_equal(grid.area, areas["t"])
+
+
+def test_cell_bounds(tmp_path, monkeypatch, make_supergrid):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    fname = str(tmp_path / "ocean_hgrid.nc")
+    make_supergrid(fname)
+    grid = Supergrid(fname)
+    grid.t_cells()
+    assert grid.lat_bnds.shape == (*grid.xt.shape, 4)
+    # SW, SE, NE and NW vertices of the first cell
+    north = -80 + 170 / 6
+    np.testing.assert_allclose(grid.lat_bnds[0, 0], [-80, -80, north, north])
+    np.testing.assert_allclose(grid.lon_bnds[0, 0], [0, 45, 45, 0])
+    # SE and NE vertices of the last column wrap around
+    np.testing.assert_allclose(grid.lon_bnds[:, -1, [1, 2]], 0)
+    # vertices are counter-clockwise: positive signed area
+    x, y = grid.lon_bnds[:, :-1], grid.lat_bnds[:, :-1]
+    signed = np.sum(x * np.roll(y, -1, axis=-1) - np.roll(x, -1, axis=-1) * y, -1)
+    assert (signed > 0).all()
+    store = fixed_fields.get_fixed_fields("supergrid", fname)
+    assert "lat_vertices_t" in store and "lon_vertices_t" in store
+    # a new grid object reads bounds from the store
+    fixed_fields.get_fixed_fields.cache_clear()
+    lat_bnds, _ = Supergrid(fname).cell_bounds("t")
+    np.testing.assert_array_equal(lat_bnds.values, grid.lat_bnds)
+
+
+def test_mom_axes(tmp_path, make_supergrid):
+    fname = str(tmp_path / "ocean_hgrid.nc")
+    make_supergrid(fname)
+    axes = Supergrid(fname).mom_axes()
+    np.testing.assert_allclose(axes["xt_ocean"], np.arange(8) * 45 + 22.5)
+    np.testing.assert_allclose(axes["xu_ocean"], np.arange(1, 9) * 45)
+    dlat = 170 / 6
+    np.testing.assert_allclose(axes["yt_ocean"], -80 + dlat * (np.arange(6) + 0.5))
+    np.testing.assert_allclose(axes["yu_ocean"], -80 + dlat * np.arange(1, 7))
+
+
+def test_q_cell_bounds(tmp_path, monkeypatch, make_supergrid):
+    monkeypatch.setattr(fixed_fields, "CACHE_DIR", str(tmp_path / "cache"))
+    fixed_fields.get_fixed_fields.cache_clear()
+    fname = str(tmp_path / "ocean_hgrid.nc")
+    ds = make_supergrid(fname)
+    grid = Supergrid(fname)
+    for cells in (grid.t_cells, grid.q_cells):
+        cells()
+        assert grid.lat_bnds.shape == grid.lon_bnds.shape == (*grid.lat.shape, 4)
+        assert grid.lon.shape == grid.lat.shape == grid.area.shape
+    yt, xt = grid.yt.values, grid.xt.values
+    # vertices of an inner q cell are the t points around it
+    np.testing.assert_allclose(
+        grid.lat_bnds[1, 1], [yt[0, 0], yt[0, 1], yt[1, 1], yt[1, 0]]
+    )
+    np.testing.assert_allclose(
+        grid.lon_bnds[1, 1], [xt[0, 0], xt[0, 1], xt[1, 1], xt[1, 0]]
+    )
+    # half cells on the southern and northern edges, cyclic longitude
+    np.testing.assert_allclose(grid.lat_bnds[0, :, :2], -80)
+    np.testing.assert_allclose(grid.lat_bnds[-1, :, 2:], 90)
+    np.testing.assert_allclose(grid.lon_bnds[:, 0, [0, 3]], xt[0, -1])
+    np.testing.assert_allclose(grid.lon_bnds[:, -1, [1, 2]], xt[0, 0])
+    with pytest.raises(ValueError):
+        grid.cell_bounds("u")
+    # across a tripolar fold t points are mirrored
+    ds["y"][-1] = 80 + 5 * np.abs(np.linspace(-1, 1, ds.sizes["nxp"]))
+    fname = str(tmp_path / "ocean_hgrid_fold.nc")
+    ds.to_netcdf(fname)
+    grid = Supergrid(fname)
+    assert grid.is_tripolar()
+    lat_bnds, _ = grid.cell_bounds("q")
+    yt = grid.yt.values
+    np.testing.assert_allclose(lat_bnds.values[-1, 1:-1, 2], yt[-1, ::-1][1:])
@@ -0,0 +1,105 @@
+from functools import partial
+
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper.regions import (
+    coord_indexers,
+    get_region,
+    level_indexers,
+    region_indexers,
+    subset,
+)
+
+
+def test_get_region():
+    assert get_region("australia") == (-45.0, -10.0, 110.0, 155.0)
+    assert get_region([-10, 10, 350, 20]) == (-10.0, 10.0, 350.0, 20.0)
+    with pytest.raises(ValueError):
+        get_region("atlantis")
+    with pytest.raises(ValueError):
+        get_region((10, -10, 0, 20))
+
+
+def test_region_indexers():
+    lat = np.linspace(-90, 90, 145)
+    lon = np.arange(192) * 1.875
+    idx = region_indexers(lat, lon, "australia", "lat", "lon")
+    assert isinstance(idx["lat"], slice) and isinstance(idx["lon"], slice)
+    assert lat[idx["lat"]].min() >= -45 and lat[idx["lat"]].max() <= -10
+    assert lon[idx["lon"]].min() >= 110 and lon[idx["lon"]].max() <= 155
+    # across the 0 meridian indices start after the gap
+    idx = region_indexers(lat, lon, (-10, 10, -10, 10), "lat", "lon")
+    expected = np.concatenate([lon[lon >= 350], lon[lon <= 10]])
+    np.testing.assert_array_equal(lon[idx["lon"]], expected)
+    # curvilinear grid: smallest index rectangle with all points inside
+    lon2, lat2 = np.meshgrid(lon, lat)
+    lon2 = lon2 + 0.2 * lat2
+    idx = region_indexers(lat2, lon2, "australia", "y", "x")
+    inside = (lat2 >= -45) & (lat2 <= -10) & (lon2 >= 110) & (lon2 <= 155)
+    rows, cols = np.nonzero(inside)
+    assert idx["y"] == slice(rows.min(), rows.max() + 1)
+    assert idx["x"] == slice(cols.min(), cols.max() + 1)
+    with pytest.raises(ValueError):
+        region_indexers(lat, lon, (91, 92, 0, 10), "lat", "lon")
+
+
+def test_subset_open(tmp_path):
+    lat = np.linspace(-90, 90, 37)
+    lon = np.arange(0, 360, 10.0)
+    lon_bnds = np.stack([lon - 5, lon + 5], axis=-1)
+    files = []
+    for t in range(2):
+        ds = xr.Dataset(
+            {
+                "tas": (("time", "lat", "lon"), np.full((1, 37, 36), t, "f4")),
+                "lon_bnds": (("lon", "bnds"), lon_bnds),
+            },
+            coords={
+                "time": [t],
+                "lat": ("lat", lat, {"units": "degrees_north"}),
+                "lon": ("lon", lon, {"units": "degrees_east", "bounds": "lon_bnds"}),
+            },
+        )
+        files.append(tmp_path / f"f{t}.nc")
+        ds.to_netcdf(files[-1])
+    region = (-20, 20, -30, 30)
+    with xr.open_dataset(files[0]) as ds:
+        indexers = coord_indexers(ds, region)
+    ds = xr.open_mfdataset(
+        files,
+        combine="by_coords",
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+        preprocess=partial(subset, indexers=indexers),
+    )
+    assert ds["tas"].shape == (2, 9, 7)
+    np.testing.assert_array_equal(ds["lon"], np.arange(330, 400, 10))
+    np.testing.assert_array_equal(ds["lon_bnds"][:, 0], np.arange(325, 395, 10))
+    np.testing.assert_array_equal(ds["lat"], np.arange(-20, 25, 5))
+
+
+def test_level_indexers():
+    ds = xr.Dataset(
+        coords={
+            "st_ocean": ("st_ocean", np.arange(5, 500, 10.0), {"positive": "down"}),
+            "model_level_number": ("model_level_number", np.arange(1, 39)),
+        }
+    )
+    assert level_indexers(ds, (100, 0)) == {"st_ocean": slice(0, 10)}
+    idx = level_indexers(ds, (1, 10), zdims=["model_level_number"])
+    assert idx == {"model_level_number": slice(0, 10)}
+
+
+def test_level_indexers_unrelated_dims():
+    ds = xr.Dataset(
+        coords={
+            "lev": ("lev", [1, 2, 3], {"axis": "Z"}),
+            "depth": ("depth", [0.05, 0.5], {"positive": "down"}),
+        }
+    )
+    # soil depth has no levels in range and is left whole
+    assert level_indexers(ds, (1, 2)) == {"lev": slice(0, 2)}
+    with pytest.raises(ValueError):
+        level_indexers(ds, (1, 2), zdims=["depth"])
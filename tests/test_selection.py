@@ -0,0 +1,33 @@
+import numpy as np
+import xarray as xr
+from access_mopper.selection import open_selection, vertical_dims
+
+
+def test_vertical_dims():
+    mapping = {"dimensions": {"time": "time", "lev": "alevel", "lat": "latitude"}}
+    assert vertical_dims(mapping) == ["lev"]
+    mapping = {"dimensions": ["time", "st_ocean", "yt_ocean", "xt_ocean"]}
+    assert vertical_dims(mapping) == ["st_ocean"]
+    mapping = {"dimensions": ["time", "grid_yu_ocean", "grid_xt_ocean"]}
+    assert vertical_dims(mapping) is None
+    mapping = {"dimensions": ["time_0", "depth", "lat_v", "lon_u"]}
+    assert vertical_dims(mapping) == ["depth"]
+
+
+def test_open_selection_levels(tmp_path):
+    ds = xr.Dataset(
+        {
+            "ta": (("time", "lev", "lat"), np.ones((2, 3, 4))),
+            "mrsol": (("time", "depth", "lat"), np.ones((2, 2, 4))),
+        },
+        coords={
+            "time": ("time", [0.5, 1.5], {"units": "days since 2000-01-01"}),
+            "lev": ("lev", [1, 2, 3], {"axis": "Z"}),
+            "depth": ("depth", [0.05, 0.5], {"positive": "down"}),
+            "lat": np.linspace(-45, 45, 4),
+        },
+    )
+    ds.to_netcdf(tmp_path / "atm.nc")
+    out = open_selection(str(tmp_path / "atm.nc"), level_range=(1, 2))
+    assert out.sizes["lev"] == 2
+    assert out.sizes["depth"] == 2
@@ -0,0 +1,42 @@
+import numpy as np
+import xarray as xr
+from access_mopper.sites import extract_sites, get_ocean_site_index, get_site_index
+
+
+def test_extract_sites_regular():
+    lat = np.linspace(-90, 90, 145)
+    lon = np.arange(192) * 1.875
+    data = np.arange(4 * 145 * 192, dtype="float32").reshape(4, 145, 192)
+    var = xr.DataArray(
+        data,
+        dims=("time", "lat", "lon"),
+        coords={"lat": lat, "lon": lon},
+        attrs={"units": "K"},
+    ).chunk({"time": 2})
+    index = get_site_index(tuple(lat), tuple(lon))
+    assert get_site_index(tuple(lat.copy()), tuple(lon.copy())) is index
+    # sites across longitude 0 and at the pole
+    site_lat = np.array([-37.8, 0.4, 89.9, 10.0])
+    site_lon = np.array([144.9, -0.5, 20.0, 359.5])
+    vout = extract_sites(var, index, site_lat, site_lon)
+    assert vout.dims == ("time", "site")
+    assert vout.chunks is not None
+    assert vout.attrs["units"] == "K"
+    j = [np.abs(lat - y).argmin() for y in site_lat]
+    i = [np.abs(((lon - x + 180) % 360) - 180).argmin() for x in site_lon]
+    assert i[1] == 0 and i[3] == 0
+    np.testing.assert_array_equal(vout.values, data[:, j, i])
+    assert (vout["distance"] < 110e3).all()
+
+
+def test_extract_sites_ocean(tmp_path, make_supergrid):
+    fname = str(tmp_path / "ocean_hgrid.nc")
+    make_supergrid(fname, nx=36, ny=18)
+    index = get_ocean_site_index(fname)
+    assert index.shape == (18, 36)
+    var = xr.DataArray(
+        np.random.default_rng(0).random((2, 18, 36)), dims=("time", "yt", "xt")
+    )
+    j, i, _ = index.query([-30.0, 50.0], [150.0, 300.0])
+    vout = extract_sites(var, index, [-30.0, 50.0], [150.0, 300.0])
+    np.testing.assert_array_equal(vout.values, var.values[:, j, i])
@@ -0,0 +1,64 @@
+import tarfile
+
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper import tar_reader
+from access_mopper.calc_time import time_indexer
+from access_mopper.tar_reader import TarArchive, open_tar_dataset
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(tar_reader, "CACHE_DIR", str(tmp_path / "cache"))
+    tar_reader.get_archive.cache_clear()
+    tarpath = tmp_path / "output.tar"
+    with tarfile.open(tarpath, "w") as tar:
+        for year in range(3):
+            time = 365.0 * year + np.arange(12) * 30 + 15
+            ds = xr.Dataset(
+                {"tos": (("time", "x"), np.full((12, 4), year, "f4"))},
+                coords={
+                    "time": (
+                        "time",
+                        time,
+                        {"units": "days since 1850-01-01", "calendar": "noleap"},
+                    )
+                },
+            )
+            fname = tmp_path / f"ocean_month_{year}.nc"
+            # netCDF4 and netCDF3 members
+            ds.to_netcdf(fname, format="NETCDF4" if year % 2 else "NETCDF3_64BIT")
+            tar.add(fname, f"output00{year}/ocean/ocean_month.nc")
+        tar.add(fname, "output002/ocean/README")
+    return str(tarpath)
+
+
+def test_tar_archive(archive, tmp_path):
+    tar = TarArchive(archive)
+    assert tar.names("*/ocean/*.nc") == [
+        f"output00{y}/ocean/ocean_month.nc" for y in range(3)
+    ]
+    # index is read from the store the second time
+    assert list((tmp_path / "cache" / "tar").glob("*.json"))
+    assert TarArchive(archive).members == tar.members
+    ds = tar.open_dataset("output001/ocean/ocean_month.nc", decode_times=False)
+    assert ds["tos"].chunks is not None
+    assert (ds["tos"].values == 1).all()
+    with pytest.raises(ValueError):
+        TarArchive(str(tmp_path / "ocean_month_0.nc"))
+
+
+def test_open_tar_dataset(archive):
+    ds = open_tar_dataset([f"{archive}::*/ocean/*.nc"], decode_times=False)
+    assert ds["tos"].shape == (36, 4)
+    np.testing.assert_array_equal(ds["tos"][::12, 0], [0, 1, 2])
+
+    def preprocess(ds):
+        return ds.isel(time_indexer(ds, ("1851", "1851")))
+
+    ds = open_tar_dataset(
+        [f"{archive}::*/ocean/*.nc"], preprocess=preprocess, decode_times=False
+    )
+    assert ds["tos"].shape == (12, 4)
+    assert (ds["tos"].values == 1).all()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper.tile_reader import is_tile_file, open_tiled_dataset, open_tiles
+
+NY, NX, NZ = 6, 8, 2
+
+
+def global_field(t0):
+    rng = np.random.default_rng(t0)
+    return rng.random((2, NZ, NY, NX)).astype("f4")
+
+
+def write_tiles(path, t0, skip=()):
+    """Writes field on a 2x2 layout, as MOM5 tile files."""
+    data = global_field(t0)
+    xt = np.arange(NX) + 0.5
+    yt = np.linspace(-75, 75, NY)
+    files = []
+    for n, (j0, i0) in enumerate([(0, 0), (0, 4), (3, 0), (3, 4)]):
+        if n in skip:
+            continue
+        j1, i1 = j0 + 3, i0 + 4
+        ds = xr.Dataset(
+            {
+                "temp": (
+                    ("time", "st_ocean", "yt_ocean", "xt_ocean"),
+                    data[:, :, j0:j1, i0:i1],
+                ),
+                "average_DT": ("time", [31.0, 28.0]),
+            },
+            coords={
+                "time": (
+                    "time",
+                    [t0 + 15.5, t0 + 45.0],
+                    {"units": "days since 1850-01-01"},
+                ),
+                "st_ocean": ("st_ocean", [5.0, 15.0], {"positive": "down"}),
+                "yt_ocean": (
+                    "yt_ocean",
+                    yt[j0:j1],
+                    {"domain_decomposition": [1, NY, j0 + 1, j1]},
+                ),
+                "xt_ocean": (
+                    "xt_ocean",
+                    xt[i0:i1],
+                    {"domain_decomposition": [1, NX, i0 + 1, i1]},
+                ),
+            },
+            attrs={"NumFilesInSet": 4, "title": "MOM5"},
+        )
+        files.append(str(path / f"ocean_month.nc-{t0}.{n:04d}"))
+        ds.to_netcdf(files[-1])
+    return files, data
+
+
+def test_open_tiles(tmp_path):
+    files, data = write_tiles(tmp_path, 0)
+    assert all(is_tile_file(f) for f in files)
+    ds = open_tiles(files)
+    assert ds["temp"].shape == (2, NZ, NY, NX)
+    # one chunk per tile
+    assert ds["temp"].chunks[2:] == ((3, 3), (4, 4))
+    np.testing.assert_array_equal(ds["temp"].values, data)
+    np.testing.assert_array_equal(ds["xt_ocean"], np.arange(NX) + 0.5)
+    assert "domain_decomposition" not in ds["xt_ocean"].attrs
+    assert "NumFilesInSet" not in ds.attrs
+    np.testing.assert_array_equal(ds["average_DT"], [31, 28])
+
+
+def test_open_tiled_dataset(tmp_path):
+    # land only tile 1 not written, filled with missing values
+    files0, data0 = write_tiles(tmp_path, 0, skip=(1,))
+    files1, data1 = write_tiles(tmp_path, 60, skip=(1,))
+    ds = open_tiled_dataset(files1 + files0)
+    assert ds["temp"].shape == (4, NZ, NY, NX)
+    expected = np.concatenate([data0, data1])
+    expected[..., :3, 4:] = np.nan
+    np.testing.assert_array_equal(ds["temp"].values, expected)
+
+
+def test_open_tiles_missing_row(tmp_path):
+    # land only tiles 2 and 3 of the northern row not written
+    files, data = write_tiles(tmp_path, 0, skip=(2, 3))
+    with pytest.raises(ValueError, match="yt_ocean"):
+        open_tiles(files)
+    yt = np.linspace(-75, 75, NY)
+    ds = open_tiles(files, axes={"yt_ocean": yt})
+    assert ds["temp"].shape == (2, NZ, NY, NX)
+    assert ds["temp"].chunks[2:] == ((3, 3), (4, 4))
+    np.testing.assert_array_equal(ds["yt_ocean"], yt)
+    expected = data.copy()
+    expected[..., 3:, :] = np.nan
+    np.testing.assert_array_equal(ds["temp"].values, expected)
@@ -0,0 +1,348 @@
+import importlib.resources as resources
+import json
+
+import cftime
+import numpy as np
+import pytest
+import xarray as xr
+from access_mopper.calc_atmos import get_level_coeffs, get_model_levels
+from access_mopper.selection import open_selection
+from access_mopper.um_reader import (
+    LOOKUP_INT,
+    LOOKUP_REAL,
+    TIME_UNITS,
+    is_um_file,
+    open_um_dataset,
+    read_index,
+    um_fields,
+    um_variable,
+)
+
+NROW, NPT = 4, 6
+THETA, _ = get_level_coeffs("theta", 38)
+RHO, _ = get_level_coeffs("rho", 38)
+
+
+def lookup(
+    stash,
+    year,
+    month,
+    lblev=1,
+    lbvc=65,
+    blev=None,
+    lbproc=128,
+    lbpack=0,
+    lbuser5=0,
+    shift=(0.0, 0.0),
+):
+    """Returns lookup of a record, on model theta levels by default, with
+    grid origin moved by shift (rows, columns) in grid spacings."""
+    if blev is None:
+        blev = THETA[lblev - 1] if lbvc == 65 else 0.0
+    ints = dict.fromkeys(LOOKUP_INT, 0)
+    reals = dict.fromkeys(LOOKUP_REAL, 0.0)
+    # monthly mean from start of month to start of next month
+    ints.update(lbyr=year, lbmon=month, lbdat=1, lbtim=21, lbrel=3)
+    ints.update(lbyrd=year + month // 12, lbmond=month % 12 + 1, lbdatd=1)
+    ints.update(lbrow=NROW, lbnpt=NPT, lbproc=lbproc, lbvc=lbvc, lblev=lblev)
+    ints.update(lbuser1=1, lbuser4=stash, lbpack=lbpack, lbuser5=lbuser5)
+    bzy, bzx = -90 - 30.0 * (1 - shift[0]), -60.0 * (1 - shift[1])
+    reals.update(blev=blev, bzy=bzy, bdy=30.0, bzx=bzx, bdx=60.0)
+    reals.update(bmdi=-1.0e30)
+    return ints, reals
+
+
+def record_data(stash, month, level):
+    data = np.full((NROW, NPT), stash + 100 * month + level, dtype="float64")
+    data[0, 0] = -1.0e30
+    return data
+
+
+def records(year=1850, extra=False):
+    recs = []
+    for month in (1, 2, 3):
+        for lev in (1, 2, 3):
+            recs.append(
+                (lookup(3236, year, month, lblev=lev), record_data(3236, month, lev))
+            )
+        recs.append(
+            (lookup(16222, year, month, lbvc=129), record_data(16222, month, 0))
+        )
+        if not extra:
+            continue
+        # maximum and minimum of a field also saved as mean
+        for lbproc in (8192, 4096):
+            recs.append(
+                (
+                    lookup(3236, year, month, lbvc=129, lbproc=lbproc),
+                    record_data(3236, month, lbproc),
+                )
+            )
+        # field missing a level in the last month
+        for lev in (1, 2) if month == 3 else (1, 2, 3):
+            recs.append((lookup(30, year, month, lblev=lev), record_data(30, month, 0)))
+    return recs
+
+
+def write_ff(path, recs=None, staggering=3):
+    recs = records() if recs is None else recs
+    nlook = len(recs) + 2
+    fixed = np.full(256, -32768, dtype=">i8")
+    fixed[0], fixed[7], fixed[8] = 20, 1, staggering
+    fixed[149:152] = 257, 64, nlook
+    start = 256 + 64 * nlook
+    table = np.full((nlook, 64), -99, dtype=">i8")
+    data = []
+    for k, ((ints, reals), values) in enumerate(recs):
+        # packed records are given as bytes, padded to 64-bit words
+        if not isinstance(values, bytes):
+            values = values.astype(">f8").tobytes()
+        values += bytes(-len(values) % 8)
+        ints["lbegin"] = start
+        start += len(values) // 8
+        table[k, :45] = [ints[n] for n in LOOKUP_INT]
+        table[k, 45:] = np.array([reals[n] for n in LOOKUP_REAL], ">f8").view(">i8")
+        data.append(values)
+    with open(path, "wb") as f:
+        f.write(fixed.tobytes() + table.tobytes())
+        for values in data:
+            f.write(values)
+
+
+def write_pp(path, year=1850, extra=False, recs=None):
+    recs = records(year, extra) if recs is None else recs
+    with open(path, "wb") as f:
+        for (ints, reals), values in recs:
+            header = np.array([ints[n] for n in LOOKUP_INT], ">i4").tobytes()
+            header += np.array([reals[n] for n in LOOKUP_REAL], ">f4").tobytes()
+            data = (
+                values if isinstance(values, bytes) else values.astype(">f4").tobytes()
+            )
+            for block in (header, data):
+                size = np.array([len(block)], ">i4").tobytes()
+                f.write(size + block + size)
+
+
+def ibm_float(value):
+    """Returns IBM 32-bit float of value, exact for the test values."""
+    if value == 0:
+        return 0
+    exponent = int(np.floor(np.log(abs(value)) / np.log(16))) + 1
+    fraction = int(abs(value) / 16.0**exponent * 2**24)
+    return (value < 0) << 31 | (exponent + 64) << 24 | fraction
+
+
+def wgdos_pack(data, acc, mdi):
+    """Returns data packed with WGDOS, using the minimum value, zero and
+    missing data bitmaps where needed."""
+    nrow, ncol = data.shape
+    words = [0, acc & 0xFFFFFFFF, ncol << 16 | nrow]
+    for row in data:
+        missing, zero = row == mdi, row == 0
+        valid = row[~(missing | zero)]
+        base = valid.min() if valid.size else 0.0
+        minimum = ~(missing | zero) & (row == base)
+        packed = ~(missing | zero | minimum)
+        offsets = np.rint((row[packed] - base) / 2.0**acc).astype(int)
+        nbits = int(offsets.max()).bit_length() if offsets.size else 0
+        flags, bits = nbits, []
+        for flag, mask in ((32, missing), (64, minimum), (128, ~zero)):
+            if (mask if flag != 128 else zero).any():
+                flags |= flag
+                bits.extend(mask.astype(int))
+        for offset in offsets:
+            bits.extend(int(b) for b in np.binary_repr(offset, nbits)[:nbits])
+        bits += [0] * (-len(bits) % 32)
+        rowdata = np.packbits(np.array(bits, dtype="u1")).view(">u4")
+        words += [ibm_float(base), flags << 16 | rowdata.size, *rowdata]
+    words[0] = len(words)
+    return np.array(words, dtype=">u4").tobytes()
+
+
+@pytest.mark.parametrize("writer", [write_ff, write_pp])
+def test_um_variable_wgdos(tmp_path, writer):
+    mdi = -1.0e30
+    data = np.array(
+        [
+            [mdi, 0.0, -2.5, 3.75, -2.5, 10.0],
+            [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+            [1.5, 1.5, 1.5, 1.5, 1.5, 1.5],
+            [0.25, 0.5, 0.75, 1.0, 1.25, 100.0],
+        ]
+    )
+    ints, reals = lookup(16222, 1850, 1, lbvc=129, lbpack=1)
+    reals["bacc"] = -2.0
+    fname = str(tmp_path / "packed")
+    writer(fname, recs=[((ints, reals), wgdos_pack(data, -2, mdi))])
+    values = um_variable(fname, 16222)["fld_s16i222"].values[0]
+    expected = np.where(data == mdi, np.nan, data)
+    np.testing.assert_array_equal(values, expected)
+    # only WGDOS packing of reals is read
+    ints["lbpack"] = 4
+    fname = str(tmp_path / "packed4")
+    writer(fname, recs=[((ints, reals), wgdos_pack(data, -2, mdi))])
+    with pytest.raises(ValueError, match="packing 4"):
+        um_variable(fname, 16222)
+
+
+@pytest.mark.parametrize("writer", [write_ff, write_pp])
+def test_um_variable(tmp_path, writer):
+    fname = str(tmp_path / "aiihca.pa1850")
+    writer(fname)
+    assert is_um_file(fname)
+    index = read_index(fname)
+    assert read_index(fname) is index
+    assert index["lbuser4"].size == 12
+    ds = um_variable(fname, 3236)
+    var = ds["fld_s03i236"]
+    assert var.dims == ("time", "model_theta_level_number", "lat", "lon")
+    assert var.chunks is not None
+    np.testing.assert_array_equal(var["model_theta_level_number"], [1, 2, 3])
+    np.testing.assert_allclose(var["theta_level_height"], THETA[:3])
+    np.testing.assert_array_equal(var["lat"], [-90, -60, -30, 0])
+    bnds = ds["time_bnds"].values
+    np.testing.assert_array_equal(bnds[:, 1] - bnds[:, 0], [31, 28, 31])
+    # mean of January starts on 1850-01-01
+    start = cftime.date2num(
+        cftime.datetime(1850, 1, 1, calendar=index["calendar"]), TIME_UNITS
+    )
+    assert bnds[0, 0] == start
+    np.testing.assert_array_equal(ds["time"], bnds.mean(axis=1))
+    values = var.values
+    assert np.isnan(values[:, :, 0, 0]).all()
+    assert values[1, 2, 1, 1] == 3236 + 200 + 3
+    surface = um_variable(fname, 16222)["fld_s16i222"]
+    assert surface.dims == ("time", "lat", "lon")
+    with pytest.raises(ValueError):
+        um_variable(fname, 24)
+
+
+def test_open_um_dataset(tmp_path):
+    files = [str(tmp_path / "a.pp"), str(tmp_path / "b.pp")]
+    write_pp(files[0])
+    write_pp(files[1], year=1851)
+    ds = open_um_dataset(files, variables=["fld_s03i236", "fld_s16i222"])
+    assert ds["fld_s03i236"].shape == (6, 3, NROW, NPT)
+    assert ds["fld_s16i222"].dims == ("time", "lat", "lon")
+    assert ds["time"].attrs["bounds"] == "time_bnds"
+    assert (np.diff(ds["time"].values) > 0).all()
+    assert ds["time_bnds"].shape == (6, 2)
+    nc = tmp_path / "c.nc"
+    xr.Dataset({"a": ("x", [1])}).to_netcdf(nc)
+    assert not is_um_file(nc)
+
+
+def test_open_um_dataset_fields(tmp_path):
+    fname = str(tmp_path / "a.pp")
+    write_pp(fname, extra=True)
+    fields = um_fields(read_index(fname))
+    assert fields["fld_s03i236"] == (3236, 128)
+    assert fields["fld_s03i236_max"] == (3236, 8192)
+    assert fields["fld_s03i236_min"] == (3236, 4096)
+    with pytest.warns(UserWarning, match="fld_s00i030"):
+        ds = open_um_dataset([fname])
+    assert "fld_s00i030" not in ds
+    assert ds["fld_s03i236_max"].dims == ("time", "lat", "lon")
+    assert ds["fld_s03i236_min"].values[1, 1, 1] == 3236 + 200 + 4096
+    # a field requested is never skipped
+    with pytest.raises(ValueError):
+        open_um_dataset([fname], variables=["fld_s00i030"])
+
+
+def test_open_selection_um(tmp_path):
+    files = [str(tmp_path / "a.pp"), str(tmp_path / "b.pp")]
+    write_pp(files[0], extra=True)
+    write_pp(files[1], year=1851, extra=True)
+    ds = open_selection(
+        files,
+        variables=["fld_s03i236_max"],
+        time_range=("1850-02", "1851-01"),
+        region=(-60, 0, 0, 180),
+    )
+    assert set(ds.data_vars) == {"fld_s03i236_max", "time_bnds"}
+    var = ds["fld_s03i236_max"]
+    assert var.shape == (3, 3, 4)
+    np.testing.assert_array_equal(
+        var.values[:, 1, 1], [3236 + m * 100 + 8192 for m in (2, 3, 1)]
+    )
+
+
+def test_um_axes_names(tmp_path):
+    recs = []
+    for month in (1, 2):
+        rec = [
+            lookup(3236, 1850, month, lbvc=129),
+            lookup(3209, 1850, month, lbvc=129, shift=(0, 0.5)),
+            lookup(3210, 1850, month, lbvc=129, shift=(0.5, 0)),
+        ]
+        rec += [lookup(150, 1850, month, lblev=k, blev=RHO[k - 1]) for k in (1, 2)]
+        # three fields on different pseudo levels
+        for stash, npseudo in ((3317, 4), (3318, 3), (3319, 2)):
+            rec += [
+                lookup(stash, 1850, month, lbvc=129, lbuser5=k)
+                for k in range(1, npseudo + 1)
+            ]
+        recs += [(r, record_data(r[0]["lbuser4"], month, 0)) for r in rec]
+    fname = str(tmp_path / "a.pp")
+    write_pp(fname, recs=recs)
+    ds = open_um_dataset([fname])
+    assert ds["fld_s03i236"].dims == ("time", "lat", "lon")
+    assert ds["fld_s03i209"].dims == ("time", "lat", "lon_u")
+    assert ds["fld_s03i210"].dims == ("time", "lat_v", "lon")
+    np.testing.assert_array_equal(ds["lat_v"], [-75, -45, -15, 15])
+    assert ds["fld_s00i150"].dims[1] == "model_rho_level_number"
+    np.testing.assert_allclose(ds["rho_level_height"], RHO[:2])
+    assert ds["fld_s03i317"].dims[1] == "pseudo_level"
+    assert ds["fld_s03i318"].dims[1] == "pseudo_level_0"
+    assert ds["fld_s03i319"].dims[1] == "pseudo_level_1"
+    # names do not depend on the variables opened
+    ds = open_um_dataset([fname], variables=["fld_s03i319"])
+    assert ds["fld_s03i319"].dims == ("time", "pseudo_level_1", "lat", "lon")
+    # on an ENDGame grid P points are at the cells centre
+    fname = str(tmp_path / "a.ff")
+    write_ff(fname, recs=recs, staggering=6)
+    ds = open_um_dataset([fname], variables=["fld_s03i236", "fld_s03i210"])
+    assert ds["fld_s03i236"].dims == ("time", "lat_v", "lon_u")
+    assert ds["fld_s03i210"].dims == ("time", "lat", "lon_u")
+
+
+@pytest.mark.parametrize("cmor_name", ["tas", "uas", "vas", "ta", "cl"])
+def test_open_selection_um_mapping(tmp_path, cmor_name):
+    with (
+        resources.files("access_mopper.mappings")
+        .joinpath("Mappings_CMIP6_Amon.json")
+        .open() as f
+    ):
+        mapping = json.load(f)[cmor_name]
+    # fields on P, u, v points, pressure levels on the B-grid u/v points
+    # and model theta levels
+    fields = [
+        (3236, 129, [1], (0, 0)),
+        (3209, 129, [1], (0, 0.5)),
+        (3210, 129, [1], (0.5, 0)),
+        (30204, 8, [1000.0, 850.0, 500.0], (0.5, 0.5)),
+        (2261, 65, [1, 2, 3], (0, 0)),
+    ]
+    recs = []
+    for month in (1, 2):
+        for stash, lbvc, levels, shift in fields:
+            for k, lev in enumerate(levels, 1):
+                rec = lookup(
+                    stash,
+                    1850,
+                    month,
+                    lblev=k,
+                    lbvc=lbvc,
+                    blev=lev if lbvc == 8 else None,
+                    shift=shift,
+                )
+                recs.append((rec, record_data(stash, month, k)))
+    fname = str(tmp_path / "a.pp")
+    write_pp(fname, recs=recs)
+    ds = open_selection(fname, variables=mapping["model_variables"])
+    for name in mapping["model_variables"]:
+        assert set(ds[name].dims) == set(mapping["dimensions"])
+    if cmor_name == "cl":
+        zdim, _, index = get_model_levels(ds["fld_s02i261"])
+        assert zdim == "model_theta_level_number"
+        np.testing.assert_array_equal(index, [0, 1, 2])